@@ -1,38 +1,169 @@
 # app.py
 import os
+import copy
+import importlib
+import functools
+from collections import namedtuple
+from types import MappingProxyType
 import chainlit as cl
-from autogen import ConversableAgent, UserProxyAgent, GroupChat, GroupChatManager
-from tyokalut import hae_kayttajat_tool, stock_price_autogen_tool, distance_autogen_tool, get_stock_price, calculate_distance, hae_kayttajat
-from wordpress_tyokalut import wp_luo_ymparisto_tool, wp_poista_ymparisto_tool, wp_listaa_ymparistot_tool, wp_muuta_ymparisto_tool, wp_sammuta_ymparisto_tool, wp_kaynnista_ymparisto_tool, wp_listaa_kaikki_ymparistot_tool, wp_luo_ymparisto, wp_poista_ymparisto, wp_listaa_ymparistot, wp_muuta_ymparisto, wp_sammuta_ymparisto, wp_kaynnista_ymparisto, wp_listaa_kaikki_ymparistot
+
+# Työkalut: (funktio, moduuli, FunctionTool-muuttuja, agenttiryhmä). Työkalumoduulit (autogen_core,
+# psycopg, WordPress/Docker-apurit) tuodaan vasta ensimmäisessä istunnossa, ei app.py:n importissa,
+# joten Chainlitin uudelleenlataus ja workerin käynnistys eivät maksa niistä. Sama koskee omia
+# apumoduuleja (mittarit, välimuistit, puhujavalinta, historia, työkalusuoritus): ne tuodaan
+# funktioissa, joissa niitä käytetään. Ks. bench_import.py.
+TYOKALUT = (
+    ("get_stock_price", "tyokalut", "stock_price_autogen_tool", "yleiset"),
+    ("get_stock_prices", "tyokalut", "stock_prices_autogen_tool", "yleiset"),
+    ("calculate_distance", "tyokalut", "distance_autogen_tool", "yleiset"),
+    ("calculate_distances", "tyokalut", "distance_batch_autogen_tool", "yleiset"),
+    ("hae_kayttajat", "tyokalut", "hae_kayttajat_tool", "yleiset"),
+    ("wp_luo_ymparisto", "wordpress_tyokalut", "wp_luo_ymparisto_tool", "wp"),
+    ("wp_poista_ymparisto", "wordpress_tyokalut", "wp_poista_ymparisto_tool", "wp"),
+    ("wp_listaa_ymparistot", "wordpress_tyokalut", "wp_listaa_ymparistot_tool", "wp"),
+    ("wp_muuta_ymparisto", "wordpress_tyokalut", "wp_muuta_ymparisto_tool", "wp"),
+    ("wp_sammuta_ymparisto", "wordpress_tyokalut", "wp_sammuta_ymparisto_tool", "wp"),
+    ("wp_kaynnista_ymparisto", "wordpress_tyokalut", "wp_kaynnista_ymparisto_tool", "wp"),
+    ("wp_listaa_kaikki_ymparistot", "wordpress_tyokalut", "wp_listaa_kaikki_ymparistot_tool", "wp"),
+    ("wp_sammuta_ymparistot", "wordpress_tyokalut", "wp_sammuta_ymparistot_tool", "wp"),
+    ("wp_kaynnista_ymparistot", "wordpress_tyokalut", "wp_kaynnista_ymparistot_tool", "wp"),
+    ("wp_poista_ymparistot", "wordpress_tyokalut", "wp_poista_ymparistot_tool", "wp"),
+    ("wp_pooli_tila", "wordpress_tyokalut", "wp_pooli_tila_tool", "wp"),
+    ("wp_lepotila_tila", "wordpress_tyokalut", "wp_lepotila_tila_tool", "wp"),
+    ("wp_tilannekuva", "wordpress_tyokalut", "wp_tilannekuva_tool", "wp"),
+    ("wp_kloonaa_ymparisto", "wordpress_tyokalut", "wp_kloonaa_ymparisto_tool", "wp"),
+    ("wp_listaa_tilannekuvat", "wordpress_tyokalut", "wp_listaa_tilannekuvat_tool", "wp"),
+    ("wp_poista_tilannekuva", "wordpress_tyokalut", "wp_poista_tilannekuva_tool", "wp"),
+)
+
+# Puhtaat työkalut: identtiset kutsut GroupChat-kierrosten välillä palautetaan muistista,
+# ja samanaikaiset samat kutsut jakavat yhden suorituksen. Etäisyydet säilyvät myös levyllä.
+MUISTIIN = {
+    "get_stock_price": dict(ttl=300, maksimi=512),
+    "calculate_distance": dict(ttl=24 * 3600, maksimi=4096, levy=True),
+}
+
+# Työkalukohtaiset aikarajat (s) rinnakkaiselle suoritukselle; muille TOOL_TIMEOUT
+AIKARAJAT = {
+    "wp_luo_ymparisto": 1800,
+    "wp_sammuta_ymparistot": 1800,
+    "wp_kaynnista_ymparistot": 1800,
+    "wp_poista_ymparistot": 1800,
+    "wp_tilannekuva": 1800,
+    "wp_kloonaa_ymparisto": 1800,
+    "get_stock_price": 30,
+    "get_stock_prices": 60,
+    "calculate_distance": 30,
+    "calculate_distances": 60,
+}
+
+@functools.lru_cache(maxsize=None)
+def lataa_moduuli(nimi: str):
+    """Tuo työkalumoduuli ensimmäisellä käyttökerralla ja aja sen eksplisiittinen alustus (alusta())."""
+    moduuli = importlib.import_module(nimi)
+    alusta = getattr(moduuli, "alusta", None)
+    if alusta is not None:
+        alusta()
+    return moduuli
+
+def _kasittelija(nimi: str):
+    """mittarit.kasittelija ilman mittarit-importtia app.py:n latauksessa (kääritään ensimmäisellä kutsulla)."""
+    def koristin(func):
+        @functools.lru_cache(maxsize=None)
+        def mitattu():
+            import mittarit
+            return mittarit.kasittelija(nimi)(func)
+
+        @functools.wraps(func)
+        async def kaare(*args, **kwargs):
+            return await mitattu()(*args, **kwargs)
+        return kaare
+    return koristin
 
 async def custom_human_input_handler(recipient, messages, sender, config):
     last_msg = messages[-1]
     if "tool_calls" in last_msg and last_msg["tool_calls"]:
         return False, None
-    if last_msg.get("content"):
+    from striimaus import aktiivinen_virta
+    virta = aktiivinen_virta()
+    if virta is not None:
+        await virta.tyhjenna()
+    # Striimattu vastaus on jo näkyvissä; muuten (esim. välimuistiosuma) lähetetään kokonaisena
+    if last_msg.get("content") and not (virta is not None and virta.on_striimattu(last_msg["content"])):
         await cl.Message(content=last_msg["content"], author=sender.name).send()
     res = await cl.AskUserMessage(content="", timeout=600).send()
     return True, res['output'] if res else "exit"
 
-def get_agents():
+# Prosessin yhteiset, muuttumattomat osat: skeemat ja suoritettavat funktiot rakennetaan kerran.
+# Istuntokohtaisia ovat agentit, niiden llm_config ja LLM-asiakkaat (käyttölaskurit).
+Tyokalurekisteri = namedtuple("Tyokalurekisteri", ["yleiset", "wp", "funktiot"])
+
+def _sarjallistava(func):
+    """Sama paluuarvon sarjallistus kuin register_for_execution tekee, mutta vain kerran prosessissa."""
+    from autogen.function_utils import serialize_to_str
+
+    @functools.wraps(func)
+    async def kaare(*args, **kwargs):
+        return serialize_to_str(await func(*args, **kwargs))
+    return kaare
+
+@functools.lru_cache(maxsize=None)
+def tyokalurekisteri() -> Tyokalurekisteri:
+    import mittarit
+    from valimuisti import muistiin
+    ryhmat = {"yleiset": [], "wp": []}
+    funktiot = {}
+    for nimi, moduulin_nimi, tyokalu, ryhma in TYOKALUT:
+        moduuli = lataa_moduuli(moduulin_nimi)
+        ryhmat[ryhma].append({"type": "function", "function": getattr(moduuli, tyokalu).schema})
+        func = getattr(moduuli, nimi)
+        if nimi in MUISTIIN:
+            func = muistiin(**MUISTIIN[nimi])(func)
+        # Kesto ja tulos työkaluittain (myös välimuistiosumat), ks. mittarit.py
+        funktiot[nimi] = mittarit.tyokalu(nimi)(_sarjallistava(func))
+    return Tyokalurekisteri(
+        yleiset=tuple(ryhmat["yleiset"]),
+        wp=tuple(ryhmat["wp"]),
+        funktiot=MappingProxyType(funktiot),
+    )
+
+def llm_config_roolille(rooli: str) -> dict:
+    """Roolin llm_config uutena sanakirjana: konstruktori validoi sen ja luo agentille oman asiakkaan.
+
+    Asiakasta ei jaeta istuntojen kesken, koska sen käyttölaskurit (ja mittaa_llm) ovat istuntokohtaisia.
+    """
+    from striimaus import LLM_STREAM
     api_key = os.environ.get("OPENAI_API_KEY", "")
     config_list = [{"model": "gpt-4o-mini", "api_key": api_key}]
+    # LLM_BASE_URL ohjaa pyynnöt esim. paikalliselle toistopalvelimelle (mock_openai.py)
+    if os.environ.get("LLM_BASE_URL"):
+        config_list[0]["base_url"] = os.environ["LLM_BASE_URL"]
+    tools = {"assistant": tyokalurekisteri().yleiset, "wp_expert": tyokalurekisteri().wp}.get(rooli)
+    # Välimuisti annetaan keskustelulle (llm_valimuisti), ei autogenin omaa cache_seed-levyvälimuistia
+    llm_config = {"config_list": config_list, "cache_seed": None}
+    if tools:
+        # Skeemat kopioidaan: autogen saa muokata agentin omaa llm_configia
+        llm_config["tools"] = copy.deepcopy(list(tools))
+    # Agenttien vastaukset striimataan tokeneittain käyttöliittymään (ei puhujavalintaa)
+    if LLM_STREAM and rooli != "manager":
+        llm_config["stream"] = True
+    return llm_config
 
-    general_tools = [
-        {"type": "function", "function": stock_price_autogen_tool.schema},
-        {"type": "function", "function": distance_autogen_tool.schema},
-        {"type": "function", "function": hae_kayttajat_tool.schema},
-    ]
-    
-    wp_tools = [
-        {"type": "function", "function": wp_luo_ymparisto_tool.schema},
-        {"type": "function", "function": wp_poista_ymparisto_tool.schema},
-        {"type": "function", "function": wp_listaa_ymparistot_tool.schema},
-        {"type": "function", "function": wp_muuta_ymparisto_tool.schema},
-        {"type": "function", "function": wp_sammuta_ymparisto_tool.schema},
-        {"type": "function", "function": wp_kaynnista_ymparisto_tool.schema},
-        {"type": "function", "function": wp_listaa_kaikki_ymparistot_tool.schema}
-    ]
+def _mittaa(agentti, rooli: str):
+    """Kesto ja tokenit rooleittain agentin omasta asiakkaasta (ks. mittarit.mittaa_llm)."""
+    import mittarit
+    if getattr(agentti, "client", None) is not None:
+        mittarit.mittaa_llm(agentti.client, rooli)
+    return agentti
+
+def get_agents():
+    from autogen import Agent, ConversableAgent, UserProxyAgent, GroupChat, GroupChatManager
+    import mittarit
+    from striimaus import aloita_vastaus
+    from puhujavalinta import speaker_selection_method
+    from historia import kayta_historiaa
+    from tyokalusuoritus import rinnakkainen_suoritus
+    rekisteri = tyokalurekisteri()
 
     # Agentit
     assistant = ConversableAgent(
@@ -40,70 +171,106 @@ def get_agents():
         system_message="""Olet pääagentti. Tehtäväsi on auttaa käyttäjää ja ohjata 
         WordPress-tekniset kysymykset WordPress_Expert-agentille. 
         Käytä omia työkalujasi etäisyyksiin ja käyttäjähakuun.""",
-        llm_config={"config_list": config_list, "tools": general_tools},
+        llm_config=llm_config_roolille("assistant"),
     )
+    _mittaa(assistant, "assistant")
     
     wp_expert = ConversableAgent(
         name="WordPress_Expert",
         system_message="""Olet WordPress-asiantuntija. Hallinnoit Docker-pohjaisia 
         WordPress-ympäristöjä työkaluillasi. Raportoi tulokset selkeästi.""",
-        llm_config={"config_list": config_list, "tools": wp_tools},
+        llm_config=llm_config_roolille("wp_expert"),
     )
+    _mittaa(wp_expert, "wp_expert")
+
+    # Striimaus: merkitään vastaava agentti ennen LLM-kutsua, jotta tokenit näkyvät oikealla nimellä
+    for agentti in (assistant, wp_expert):
+        agentti.register_reply(trigger=[Agent, None], reply_func=aloita_vastaus, position=0)
+        # LLM:lle lähtevä historia tiivistetään tokenibudjettiin (HISTORY_TOKEN_BUDGET)
+        kayta_historiaa(agentti)
     
     user_proxy = UserProxyAgent(
         name="User",
         human_input_mode="NEVER",
         code_execution_config=False,
+        function_map=rekisteri.funktiot,
     )
-
-    all_tools = [
-        (get_stock_price, "get_stock_price"),
-        (calculate_distance, "calculate_distance"),
-        (hae_kayttajat, "hae_kayttajat"),
-        (wp_luo_ymparisto, "wp_luo_ymparisto"),
-        (wp_poista_ymparisto, "wp_poista_ymparisto"),
-        (wp_listaa_ymparistot, "wp_listaa_ymparistot"),
-        (wp_muuta_ymparisto, "wp_muuta_ymparisto"),
-        (wp_sammuta_ymparisto, "wp_sammuta_ymparisto"),
-        (wp_kaynnista_ymparisto, "wp_kaynnista_ymparisto"),
-        (wp_listaa_kaikki_ymparistot, "wp_listaa_kaikki_ymparistot"),
-    ]
-    for func, name in all_tools:
-        user_proxy.register_for_execution(name=name)(func)
     
+    # Puhujan valinta säännöillä; LLM vain monitulkintaisissa tilanteissa (SPEAKER_SELECTION)
     groupchat = GroupChat(
         agents=[user_proxy, assistant, wp_expert], 
         messages=[], 
-        max_round=15
+        max_round=15,
+        speaker_selection_method=speaker_selection_method(
+            kayttaja=user_proxy.name, yleinen=assistant.name, wp=wp_expert.name
+        ),
     )
     
+    mittarit.mittaa_puhujavalinta(groupchat)
+    
     manager = GroupChatManager(
         groupchat=groupchat, 
-        llm_config={"config_list": config_list}
+        llm_config=llm_config_roolille("manager"),
     )
+    _mittaa(manager, "manager")
     
     user_proxy.register_reply(
         trigger=[manager, None],
         reply_func=custom_human_input_handler,
         position=0
     )
+    # Saman viestin tool_calls-kutsut rinnakkain (TOOL_MAX_CONCURRENCY), tulokset kutsujärjestyksessä
+    user_proxy.register_reply(
+        trigger=[manager, None],
+        reply_func=rinnakkainen_suoritus(rekisteri.funktiot, aikarajat=AIKARAJAT),
+        position=0
+    )
     
     return user_proxy, manager
 
 @cl.on_chat_start
+@_kasittelija("on_chat_start")
 async def start():
+    import mittarit
+    # Prometheus-histogrammit paikallisesti (METRICS_PORT), JSONL-jälki TRACE_FILE-asetuksella
+    mittarit.kaynnista_palvelin()
+    # Ensimmäinen istunto tuo ja alustaa työkalumoduulit (myöhemmillä kerroilla välimuistista)
+    tyokalurekisteri()
+    # Valmiiden ympäristöjen pooli täydentyy taustalla (WP_POOL_SIZE)
+    lataa_moduuli("ymparistopooli").pooli.kaynnista()
+    # Käyttämättömät ympäristöt lepotilaan (WP_IDLE_SUSPEND_AFTER), herätys työkalukutsusta
+    lataa_moduuli("lepotila").lepotila.kaynnista()
+    # Jaettu tietokantapooli avataan kerran prosessissa (idempotentti)
+    try:
+        await lataa_moduuli("tietokanta").avaa_pooli()
+    except Exception as e:
+        print(f"Varoitus: tietokantapoolin avaus epäonnistui: {e}")
     user_proxy, manager = get_agents()
     cl.user_session.set("user_proxy", user_proxy)
     cl.user_session.set("manager", manager)
     await cl.Message(content="Tervetuloa! Olen orkestroija apulaisineen. Miten voin auttaa?").send()
 
 @cl.on_message
+@_kasittelija("on_message")
 async def main(message: cl.Message):
+    from autogen.io import IOStream
+    from striimaus import ChainlitIOStream
+    from komennot import komentotuloste
+    from llm_valimuisti import llm_valimuisti
     user_proxy = cl.user_session.get("user_proxy")
     manager = cl.user_session.get("manager")
     
-    await user_proxy.a_initiate_chat(
-        manager,
-        message=message.content,
-        summary_method="last_msg"
-    )
\ No newline at end of file
+    # Tokenit ja työkalujen komentotuloste näkyvät käyttäjälle sitä mukaa kun niitä syntyy
+    virta = ChainlitIOStream()
+    tuloste = komentotuloste.set(virta.komentotuloste)
+    try:
+        with IOStream.set_default(virta):
+            await user_proxy.a_initiate_chat(
+                manager,
+                message=message.content,
+                summary_method="last_msg",
+                cache=llm_valimuisti(),
+            )
+    finally:
+        komentotuloste.reset(tuloste)
+        await virta.lopeta()
\ No newline at end of file
@@ -0,0 +1,484 @@
+# bench_e2e.py
+# Päästä päähän -suorituskykymittaus ilman verkkoa, Dockeria ja OpenAI:ta:
+#   - docker: vale_docker.py PATHissa (säädettävä viive, tila tiedostossa); --docker-api
+#     käynnistää lisäksi sen Engine API -palvelimen ja ohjaa DOCKER_HOSTin siihen
+#   - PostgreSQL: kertakäyttöinen instanssi väliaikaishakemistossa (initdb/pg_ctl), jos saatavilla
+#   - LLM: mock_openai.py käsikirjoitetulla vastaajalla (työkalukutsut skenaarion mukaan)
+#
+# Mittaa jokaisen TYOKALUT-työkalun viiveen sekä app.get_agents-keskustelut N rinnakkaisella
+# istunnolla: p50/p95, läpimeno ja aliprosessien määrä. Tulokset voi tallentaa ja verrata:
+#
+#   python bench_e2e.py                                   # työkalut + 4 istuntoa x 3 keskustelua
+#   python bench_e2e.py --istunnot 16 --docker-viive-ms 100
+#   python bench_e2e.py --json tulos.json --vertaa edellinen.json --raja-pct 20
+#   python bench_e2e.py --docker-api --vertaa cli.json     # API-asiakas vs. docker CLI
+
+import os
+import re
+import sys
+import json
+import time
+import glob
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import threading
+import contextlib
+import subprocess
+
+HAKEMISTO = os.path.dirname(os.path.abspath(__file__))
+
+TICKERIT = ("AAPL", "MSFT", "NOKIA")
+KAYTTAJIA = 500
+
+# Keskusteluskenaariot: aloitusviesti (avainsanat ohjaavat puhujavalinnan) ja työkalukierrokset.
+# Kierros on lista (työkalu, argumentit); saman kierroksen kutsut tulevat yhdessä viestissä.
+SKENAARIOT = {
+    "osakkeet": "Hae osakkeiden hinnat: AAPL, MSFT ja NOKIA.",
+    "etaisyys": "Laske etäisyys Helsingistä Tampereelle ja Turkuun.",
+    "kayttajat": "Listaa käyttäjät tietokannasta.",
+    "ymparisto": "Luo WordPress-ympäristö, sammuta ja käynnistä se ja poista lopuksi.",
+}
+
+
+def _kierrokset(skenaario: str, tunniste: str) -> list:
+    if skenaario == "osakkeet":
+        return [[
+            ("get_stock_price", {"ticker": "AAPL", "date": "2024/03/15"}),
+            ("get_stock_price", {"ticker": "MSFT", "date": "2024/03/15"}),
+            ("get_stock_prices", {"tickers": list(TICKERIT), "start_date": "2024/01/01", "end_date": "2024/06/30"}),
+        ]]
+    if skenaario == "etaisyys":
+        return [[
+            ("calculate_distance", {"lat1": 60.1699, "lon1": 24.9384, "lat2": 61.4978, "lon2": 23.7610}),
+            ("calculate_distance", {"lat1": 60.1699, "lon1": 24.9384, "lat2": 60.4518, "lon2": 22.2666}),
+        ], [
+            ("calculate_distances", {"origins": [[60.1699, 24.9384]], "destinations": [[61.4978, 23.7610], [60.4518, 22.2666]]}),
+        ]]
+    if skenaario == "kayttajat":
+        return [[("hae_kayttajat", {"raja": 50})]]
+    if skenaario == "ymparisto":
+        nimi = f"bench-{tunniste}"
+        istunto, keskustelu = (int(x) for x in tunniste.split("-"))
+        return [
+            [("wp_luo_ymparisto", {"nimi": nimi, "tyyppi": "wordpress", "portti": 20000 + istunto * 100 + keskustelu})],
+            [("wp_listaa_ymparistot", {})],
+            [("wp_sammuta_ymparisto", {"nimi": nimi})],
+            [("wp_kaynnista_ymparisto", {"nimi": nimi})],
+            [("wp_poista_ymparisto", {"nimi": nimi})],
+        ]
+    return []
+
+
+def _tyokalujen_argumentit(i: int) -> dict:
+    """Suorat työkalukutsut (ilman LLM:ää) järjestyksessä: luonti ennen käyttöä, poisto viimeisenä."""
+    nimi = f"bench-t{i}"
+    return {
+        "get_stock_price": {"ticker": "AAPL", "date": "2024/03/15"},
+        "get_stock_prices": {"tickers": list(TICKERIT), "start_date": "2024/01/01", "end_date": "2024/06/30"},
+        "calculate_distance": {"lat1": 60.1699, "lon1": 24.9384, "lat2": 61.4978, "lon2": 23.7610},
+        "calculate_distances": {"pairs": [[60.0 + k / 100, 24.0, 61.0, 23.0 + k / 100] for k in range(100)]},
+        "hae_kayttajat": {"raja": 100, "siirtyma": i % 3 * 100},
+        "wp_luo_ymparisto": {"nimi": nimi, "tyyppi": "wordpress", "portti": 30000 + i},
+        "wp_listaa_ymparistot": {},
+        "wp_listaa_kaikki_ymparistot": {},
+        "wp_muuta_ymparisto": {"nimi": nimi, "asetukset": json.dumps({"portti": 31000 + i})},
+        "wp_sammuta_ymparisto": {"nimi": nimi},
+        "wp_kaynnista_ymparisto": {"nimi": nimi},
+        "wp_pooli_tila": {},
+        "wp_poista_ymparisto": {"nimi": nimi},
+    }
+
+
+def persentiili(arvot, p: float):
+    if not arvot:
+        return None
+    jarjestetty = sorted(arvot)
+    k = (len(jarjestetty) - 1) * p / 100
+    ala = int(k)
+    yla = min(ala + 1, len(jarjestetty) - 1)
+    return jarjestetty[ala] + (jarjestetty[yla] - jarjestetty[ala]) * (k - ala)
+
+
+def _yhteenveto(kestot_s) -> dict:
+    ms = [k * 1000 for k in kestot_s]
+    return {
+        "n": len(ms),
+        "p50_ms": round(persentiili(ms, 50), 1) if ms else None,
+        "p95_ms": round(persentiili(ms, 95), 1) if ms else None,
+        "max_ms": round(max(ms), 1) if ms else None,
+    }
+
+
+# --- Paikalliset korvikkeet ---
+
+class Alikutsut:
+    """vale_docker.py:n kutsuloki: docker-kutsujen määrä komennoittain (API-pyynnöt alkavat 'api ')."""
+
+    def __init__(self, tila_dir: str):
+        self.polku = os.path.join(tila_dir, "kutsut.log")
+
+    def rivit(self) -> list:
+        try:
+            with open(self.polku) as f:
+                return [r.rstrip("\n").split("\t", 1)[1] for r in f if "\t" in r]
+        except OSError:
+            return []
+
+    def maara(self) -> int:
+        return len(self.rivit())
+
+    def komennoittain(self, alku: int = 0) -> dict:
+        laskurit = {}
+        for komento in self.rivit()[alku:]:
+            laskurit[komento] = laskurit.get(komento, 0) + 1
+        return dict(sorted(laskurit.items(), key=lambda x: -x[1]))
+
+
+def valmistele_docker(tmp: str, viive_ms: float, up_ms: float) -> Alikutsut:
+    """Luo `docker`-skriptin väliaikaishakemistoon ja lisää sen PATHin alkuun."""
+    bin_dir = os.path.join(tmp, "bin")
+    tila_dir = os.path.join(tmp, "docker")
+    os.makedirs(bin_dir)
+    os.makedirs(tila_dir)
+    skripti = os.path.join(bin_dir, "docker")
+    with open(skripti, "w") as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.join(HAKEMISTO, "vale_docker.py")}" "$@"\n')
+    os.chmod(skripti, 0o755)
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+    os.environ["VALE_DOCKER_TILA"] = tila_dir
+    os.environ["VALE_DOCKER_VIIVE_MS"] = str(viive_ms)
+    os.environ["VALE_DOCKER_UP_MS"] = str(up_ms)
+    return Alikutsut(tila_dir)
+
+
+@contextlib.contextmanager
+def docker_api_palvelin(tmp: str, kaytossa: bool):
+    """vale_docker.py:n Engine API -palvelin unix-socketiin; muuten API pois (vain CLI)."""
+    if not kaytossa:
+        os.environ["DOCKER_API"] = "0"
+        yield
+        return
+    socket_polku = os.path.join(tmp, "docker.sock")
+    proc = subprocess.Popen([sys.executable, os.path.join(HAKEMISTO, "vale_docker.py"), "palvele", socket_polku])
+    try:
+        raja = time.monotonic() + 10
+        while not os.path.exists(socket_polku):
+            if proc.poll() is not None or time.monotonic() > raja:
+                raise RuntimeError("vale_docker.py palvele ei käynnistynyt")
+            time.sleep(0.05)
+        os.environ["DOCKER_API"] = "1"
+        os.environ["DOCKER_HOST"] = f"unix://{socket_polku}"
+        yield
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def valmistele_hinnat(tmp: str):
+    """Synteettinen hintahistoria (arkipäivät 2020-2024) väliaikaiseen hintavarastoon."""
+    import numpy as np
+    hakemisto = os.path.join(tmp, "hinnat")
+    os.environ["PRICE_STORE_DIR"] = hakemisto
+    from hintavarasto import Hintavarasto
+    paivat = np.arange(np.datetime64("2020-01-01"), np.datetime64("2025-01-01"))
+    paivat = paivat[np.is_busday(paivat)]
+    csv_polku = os.path.join(tmp, "hinnat.csv")
+    satunnainen = np.random.default_rng(0)
+    with open(csv_polku, "w") as f:
+        f.write("ticker,date,open,high,low,close,volume\n")
+        for ticker in TICKERIT:
+            hinnat = 100 * np.exp(np.cumsum(satunnainen.normal(0, 0.01, len(paivat))))
+            for paiva, hinta in zip(paivat, hinnat):
+                f.write(f"{ticker},{paiva},{hinta:.4f},{hinta * 1.01:.4f},{hinta * 0.99:.4f},{hinta:.4f},1000000\n")
+    Hintavarasto(hakemisto).tuo(csv_polku)
+
+
+def _etsi_postgres():
+    polut = [os.path.dirname(shutil.which("initdb") or "")]
+    polut += sorted(glob.glob("/usr/lib/postgresql/*/bin"), reverse=True)
+    for polku in polut:
+        if polku and os.path.exists(os.path.join(polku, "pg_ctl")):
+            return polku
+    return None
+
+
+def _vapaa_portti() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def kertakayttoinen_postgres(tmp: str):
+    """Käynnistä PostgreSQL väliaikaishakemistoon ja täytä kayttajat-taulu. Tuottaa False, jos ei saatavilla."""
+    bin_dir = _etsi_postgres()
+    if bin_dir is None:
+        print("PostgreSQL (initdb/pg_ctl) ei ole saatavilla: tietokantatyökalut ohitetaan.")
+        yield False
+        return
+    data = os.path.join(tmp, "pg")
+    portti = _vapaa_portti()
+    subprocess.run([os.path.join(bin_dir, "initdb"), "-D", data, "-U", "postgres", "-A", "trust"],
+                   check=True, capture_output=True)
+    subprocess.run([os.path.join(bin_dir, "pg_ctl"), "-D", data, "-l", os.path.join(tmp, "pg.log"), "-w",
+                    "-o", f"-p {portti} -k {tmp} -c listen_addresses=127.0.0.1", "start"],
+                   check=True, capture_output=True)
+    try:
+        os.environ.update({"DB_NAME": "postgres", "DB_USER": "postgres", "DB_PASS": "",
+                           "DB_HOST": "127.0.0.1", "DB_PORT": str(portti)})
+        import psycopg
+        with psycopg.connect(f"host=127.0.0.1 port={portti} user=postgres dbname=postgres", autocommit=True) as conn:
+            conn.execute("CREATE TABLE kayttajat (id serial PRIMARY KEY, kayttajanimi text NOT NULL)")
+            with conn.cursor() as cur:
+                cur.executemany("INSERT INTO kayttajat (kayttajanimi) VALUES (%s)",
+                                [(f"kayttaja{i:04d}",) for i in range(KAYTTAJIA)])
+        yield True
+    finally:
+        subprocess.run([os.path.join(bin_dir, "pg_ctl"), "-D", data, "-m", "immediate", "stop"], capture_output=True)
+
+
+# --- Käsikirjoitettu LLM ---
+
+_TAGI = re.compile(r"\[bench:(\w+):([\w-]+)\]")
+
+
+class Kasikirjoitus:
+    """mock_openai-vastaaja: työkalukutsut skenaarion mukaan, lopuksi tekstivastaus."""
+
+    def __init__(self):
+        self.pyynnot = 0
+        self._lukko = threading.Lock()
+
+    def __call__(self, pyynto: dict) -> dict:
+        with self._lukko:
+            self.pyynnot += 1
+        viestit = pyynto.get("messages", [])
+        tyokalut = {t.get("function", {}).get("name") for t in pyynto.get("tools") or []}
+        tagi = next((_TAGI.search(m["content"]) for m in viestit
+                     if isinstance(m.get("content"), str) and _TAGI.search(m["content"])), None)
+        if not tyokalut:
+            # Puhujavalinta (manager) tai muu työkaluton kutsu
+            viesti = {"role": "assistant", "content": "Orkestroija"}
+            return self._vastaus(pyynto, viesti, "stop")
+        kierrokset = _kierrokset(*tagi.groups()) if tagi else []
+        tehdyt = sum(1 for m in viestit if m.get("tool_calls"))
+        if tehdyt < len(kierrokset) and all(nimi in tyokalut for nimi, _ in kierrokset[tehdyt]):
+            kutsut = [
+                {"id": f"call_{tehdyt}_{i}", "type": "function",
+                 "function": {"name": nimi, "arguments": json.dumps(argumentit, ensure_ascii=False)}}
+                for i, (nimi, argumentit) in enumerate(kierrokset[tehdyt])
+            ]
+            return self._vastaus(pyynto, {"role": "assistant", "content": None, "tool_calls": kutsut}, "tool_calls")
+        viimeinen = viestit[-1].get("content") if viestit else ""
+        teksti = f"Valmis. {str(viimeinen or '')[:200]}"
+        return self._vastaus(pyynto, {"role": "assistant", "content": teksti}, "stop")
+
+    @staticmethod
+    def _vastaus(pyynto, viesti, syy) -> dict:
+        return {
+            "id": f"chatcmpl-bench-{time.monotonic_ns()}", "object": "chat.completion", "created": int(time.time()),
+            "model": pyynto.get("model", "mock"),
+            "choices": [{"index": 0, "message": viesti, "finish_reason": syy}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+
+@contextlib.contextmanager
+def mock_llm(tmp: str, kasikirjoitus: Kasikirjoitus, viive_ms: float):
+    from mock_openai import palvelin
+    from llm_valimuisti import LLMValimuisti
+    srv = palvelin(0, LLMValimuisti(os.path.join(tmp, "llm.sqlite3")), viive=viive_ms / 1000, vastaaja=kasikirjoitus)
+    saie = threading.Thread(target=srv.serve_forever, daemon=True)
+    saie.start()
+    os.environ["LLM_BASE_URL"] = f"http://127.0.0.1:{srv.server_address[1]}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    try:
+        yield srv
+    finally:
+        srv.shutdown()
+        srv.server_close()
+
+
+# --- Mittaukset ---
+
+async def mittaa_tyokalut(kierrokset: int, alikutsut: Alikutsut, tietokanta: bool) -> dict:
+    """Aja jokainen TYOKALUT-työkalu suoraan `kierrokset` kertaa (ilman välimuistikäärettä)."""
+    import app
+    tulokset = {}
+    for i in range(kierrokset):
+        argumentit = _tyokalujen_argumentit(i)
+        for nimi, moduuli, _, _ in app.TYOKALUT:
+            if nimi == "hae_kayttajat" and not tietokanta:
+                continue
+            func = getattr(app.lataa_moduuli(moduuli), nimi)
+            t = tulokset.setdefault(nimi, {"kestot": [], "alikutsut": 0, "virheet": 0})
+            ennen = alikutsut.maara()
+            alku = time.perf_counter()
+            try:
+                tulos = await func(**argumentit.get(nimi, {}))
+                if isinstance(tulos, str) and re.search(r"Virhe|epäonnistui", tulos):
+                    t["virheet"] += 1
+                    t["viimeisin_virhe"] = tulos[:200]
+            except Exception as e:
+                t["virheet"] += 1
+                t["viimeisin_virhe"] = str(e)[:200]
+            t["kestot"].append(time.perf_counter() - alku)
+            t["alikutsut"] += alikutsut.maara() - ennen
+    return {
+        nimi: {**_yhteenveto(t.pop("kestot")), "alikutsut_per_kutsu": round(t.pop("alikutsut") / kierrokset, 2), **t}
+        for nimi, t in tulokset.items()
+    }
+
+
+async def _lopeta_keskustelu(recipient, messages, sender, config):
+    """Korvaa Chainlitin ihmissyötteen: käyttäjän vuoro päättää keskustelun."""
+    if messages and messages[-1].get("tool_calls"):
+        return False, None
+    return True, None
+
+
+async def mittaa_keskustelut(istunnot: int, keskustelut: int, alikutsut: Alikutsut, tietokanta: bool,
+                             kasikirjoitus: Kasikirjoitus) -> dict:
+    import app
+    app.custom_human_input_handler = _lopeta_keskustelu
+    app.tyokalurekisteri()
+    if tietokanta:
+        await app.lataa_moduuli("tietokanta").avaa_pooli()
+    skenaariot = [s for s in SKENAARIOT if tietokanta or s != "kayttajat"]
+    kestot, virheet = [], []
+
+    async def istunto(s: int):
+        user_proxy, manager = app.get_agents()
+        for k in range(keskustelut):
+            skenaario = skenaariot[(s + k) % len(skenaariot)]
+            viesti = f"[bench:{skenaario}:{s}-{k}] {SKENAARIOT[skenaario]}"
+            alku = time.perf_counter()
+            try:
+                await user_proxy.a_initiate_chat(manager, message=viesti, summary_method="last_msg",
+                                                 clear_history=True)
+                kestot.append(time.perf_counter() - alku)
+            except Exception as e:
+                virheet.append(f"{skenaario}: {e}")
+
+    ennen_alikutsut = alikutsut.maara()
+    ennen_pyynnot = kasikirjoitus.pyynnot
+    alku = time.perf_counter()
+    await asyncio.gather(*(istunto(s) for s in range(istunnot)))
+    kesto = time.perf_counter() - alku
+    yhteensa = len(kestot)
+    return {
+        **_yhteenveto(kestot),
+        "istunnot": istunnot,
+        "kesto_s": round(kesto, 2),
+        "lapimeno_per_s": round(yhteensa / kesto, 3) if kesto else None,
+        "llm_pyynnot": kasikirjoitus.pyynnot - ennen_pyynnot,
+        "alikutsut": alikutsut.maara() - ennen_alikutsut,
+        "alikutsut_per_keskustelu": round((alikutsut.maara() - ennen_alikutsut) / yhteensa, 2) if yhteensa else None,
+        "alikutsut_komennoittain": alikutsut.komennoittain(ennen_alikutsut),
+        "virheet": virheet[:20],
+    }
+
+
+def vertaa(vanha: dict, uusi: dict, raja_pct: float) -> list:
+    """Tulosta p50/p95-muutokset ja palauta rajan ylittäneet mittarit."""
+    ylitykset = []
+    parit = [("keskustelut", vanha.get("keskustelut") or {}, uusi.get("keskustelut") or {})]
+    parit += [(f"tyokalu {n}", (vanha.get("tyokalut") or {}).get(n, {}), t) for n, t in (uusi.get("tyokalut") or {}).items()]
+    print(f"\nVertailu (raja +{raja_pct:g} %):")
+    for nimi, v, u in parit:
+        for mittari in ("p50_ms", "p95_ms"):
+            if not v.get(mittari) or u.get(mittari) is None:
+                continue
+            muutos = 100.0 * (u[mittari] - v[mittari]) / v[mittari]
+            merkki = " <-- REGRESSIO" if muutos > raja_pct else ""
+            print(f"  {nimi:<36} {mittari}: {v[mittari]:>9.1f} -> {u[mittari]:>9.1f} ms ({muutos:+.1f} %){merkki}")
+            if merkki:
+                ylitykset.append(f"{nimi} {mittari}")
+    return ylitykset
+
+
+def tulosta(tulokset: dict):
+    if tulokset.get("tyokalut"):
+        print(f"\n{'työkalu':<30} {'n':>4} {'p50 ms':>9} {'p95 ms':>9} {'aliprosessit':>13} {'virheet':>8}")
+        for nimi, t in tulokset["tyokalut"].items():
+            print(f"{nimi:<30} {t['n']:>4} {t['p50_ms']:>9.1f} {t['p95_ms']:>9.1f} "
+                  f"{t['alikutsut_per_kutsu']:>13} {t['virheet']:>8}")
+    k = tulokset.get("keskustelut")
+    if k:
+        print(f"\nKeskustelut: {k['n']} kpl, {k['istunnot']} rinnakkaista istuntoa, {k['kesto_s']} s")
+        if k["n"]:
+            print(f"  p50 {k['p50_ms']} ms, p95 {k['p95_ms']} ms, läpimeno {k['lapimeno_per_s']} keskustelua/s")
+            print(f"  LLM-pyyntöjä {k['llm_pyynnot']}, aliprosesseja {k['alikutsut']} "
+                  f"({k['alikutsut_per_keskustelu']} / keskustelu): {k['alikutsut_komennoittain']}")
+        for virhe in k["virheet"]:
+            print(f"  VIRHE: {virhe}")
+
+
+def main():
+    jasennin = argparse.ArgumentParser(description="Päästä päähän -mittaus paikallisilla korvikkeilla.")
+    jasennin.add_argument("--istunnot", type=int, default=4, help="rinnakkaiset keskusteluistunnot")
+    jasennin.add_argument("--keskustelut", type=int, default=3, help="keskusteluja per istunto")
+    jasennin.add_argument("--kierrokset", type=int, default=5, help="suorien työkalukutsujen toistot")
+    jasennin.add_argument("--docker-viive-ms", type=float, default=50)
+    jasennin.add_argument("--docker-up-ms", type=float, default=500)
+    jasennin.add_argument("--llm-viive-ms", type=float, default=0)
+    jasennin.add_argument("--docker-api", action="store_true", help="Docker Engine API unix-socketissa (oletus: vain CLI)")
+    jasennin.add_argument("--vain", choices=["tyokalut", "keskustelut"], default=None)
+    jasennin.add_argument("--json", default=None, help="tallenna tulokset tiedostoon")
+    jasennin.add_argument("--vertaa", default=None, help="aiempi --json-tulos vertailuun")
+    jasennin.add_argument("--raja-pct", type=float, default=20.0, help="virhekoodi 1, jos p50/p95 kasvaa yli rajan")
+    jasennin.add_argument("--nayta-tuloste", action="store_true", help="älä ohjaa agenttien tulostetta lokiin")
+    jasennin.add_argument("--sailyta", action="store_true", help="älä poista väliaikaishakemistoa")
+    args = jasennin.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_e2e_")
+    # Kaikki tila väliaikaishakemistoon; asetukset luetaan moduulien importissa, joten ennen app-importtia
+    os.environ.update({
+        "DOCKER_ENV_DIR": os.path.join(tmp, "environments"),
+        "TOOL_CACHE_PATH": os.path.join(tmp, "tyokalut.sqlite3"),
+        "LLM_CACHE": "0",
+        "WP_POOL_SIZE": "0",
+        "WP_PLUGIN_OFFLINE": "1",
+        "DOCKER_EVENTS_RETRY": "1",
+    })
+    alikutsut = valmistele_docker(tmp, args.docker_viive_ms, args.docker_up_ms)
+    valmistele_hinnat(tmp)
+    kasikirjoitus = Kasikirjoitus()
+    loki = os.path.join(tmp, "tuloste.log")
+    tulokset = {"aika": time.strftime("%Y-%m-%dT%H:%M:%S"), "asetukset": vars(args)}
+
+    try:
+        with docker_api_palvelin(tmp, args.docker_api), kertakayttoinen_postgres(tmp) as tietokanta, \
+                mock_llm(tmp, kasikirjoitus, args.llm_viive_ms):
+            async def aja():
+                with open(loki, "w") as f, (contextlib.nullcontext() if args.nayta_tuloste
+                                            else contextlib.redirect_stdout(f)):
+                    if args.vain != "keskustelut":
+                        tulokset["tyokalut"] = await mittaa_tyokalut(args.kierrokset, alikutsut, tietokanta)
+                    if args.vain != "tyokalut":
+                        tulokset["keskustelut"] = await mittaa_keskustelut(
+                            args.istunnot, args.keskustelut, alikutsut, tietokanta, kasikirjoitus)
+                    if tietokanta:
+                        await sys.modules["app"].lataa_moduuli("tietokanta").sulje_pooli()
+            asyncio.run(aja())
+    finally:
+        if not args.sailyta:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    tulosta(tulokset)
+    if args.sailyta:
+        print(f"\nVäliaikaistiedostot ja agenttien tuloste: {tmp}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(tulokset, f, indent=2, ensure_ascii=False)
+    if args.vertaa:
+        with open(args.vertaa) as f:
+            if vertaa(json.load(f), tulokset, args.raja_pct):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
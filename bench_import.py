@@ -0,0 +1,101 @@
+# bench_import.py
+# Importtiajan mittaus: ajaa jokaisen moduulin importin omassa, tuoreessa tulkissa
+# (python -X importtime) ja raportoi moduulikohtaisen kumulatiivisen ajan sekä
+# raskaimmat riippuvuudet. Käytä regressioiden kiinni ottamiseen:
+#
+#   python bench_import.py                       # oletusmoduulit
+#   python bench_import.py app --raja-ms 800     # virhekoodi 1, jos app ylittää rajan
+#   python bench_import.py --json tulos.json     # tallenna tulokset vertailua varten
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+OLETUSMODUULIT = [
+    "app",
+    "tyokalut",
+    "wordpress_tyokalut",
+    "tietokanta",
+    "geodesia",
+    "hintavarasto",
+    "valimuisti",
+    "komennot",
+]
+
+
+def mittaa(moduuli: str, toistot: int = 3) -> dict:
+    """Importtaa moduulin `toistot` kertaa tuoreessa tulkissa; palauttaa nopeimman ajon erittelyn."""
+    paras = None
+    for _ in range(toistot):
+        ajo = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {moduuli}"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+        )
+        rivit = {}
+        virhe = None
+        for rivi in ajo.stderr.splitlines():
+            if not rivi.startswith("import time:"):
+                if rivi.strip():
+                    virhe = rivi.strip()
+                continue
+            osat = rivi[len("import time:"):].split("|")
+            if len(osat) != 3 or not osat[0].strip().isdigit():
+                continue  # otsikkorivi
+            oma, kumulatiivinen, nimi = int(osat[0]), int(osat[1]), osat[2].strip()
+            rivit[nimi] = (oma, kumulatiivinen)
+        if ajo.returncode != 0:
+            return {"moduuli": moduuli, "virhe": virhe or f"paluukoodi {ajo.returncode}"}
+        yhteensa = rivit.get(moduuli, (0, 0))[1]
+        if paras is None or yhteensa < paras["kumulatiivinen_ms"] * 1000:
+            # Raskaimmat ylimmän tason paketit (oma aika summattuna paketin kaikista moduuleista)
+            paketit = {}
+            for nimi, (oma, _) in rivit.items():
+                juuri = nimi.split(".")[0]
+                paketit[juuri] = paketit.get(juuri, 0) + oma
+            raskaimmat = sorted(paketit.items(), key=lambda x: -x[1])[:10]
+            paras = {
+                "moduuli": moduuli,
+                "kumulatiivinen_ms": round(yhteensa / 1000, 1),
+                "moduuleja": len(rivit),
+                "raskaimmat_paketit_ms": {k: round(v / 1000, 1) for k, v in raskaimmat},
+            }
+    return paras
+
+
+def main():
+    jasennin = argparse.ArgumentParser(description="Mittaa moduulien importtiajat (python -X importtime).")
+    jasennin.add_argument("moduulit", nargs="*", default=OLETUSMODUULIT)
+    jasennin.add_argument("--toistot", type=int, default=3, help="ajot per moduuli (nopein raportoidaan)")
+    jasennin.add_argument("--raja-ms", type=float, default=None, help="virhekoodi 1, jos jokin moduuli ylittää rajan")
+    jasennin.add_argument("--json", default=None, help="tallenna tulokset tiedostoon")
+    args = jasennin.parse_args()
+
+    tulokset = [mittaa(m, args.toistot) for m in args.moduulit]
+    ylitykset = []
+    virheet = []
+    for t in tulokset:
+        if "virhe" in t:
+            print(f"{t['moduuli']:<22} VIRHE: {t['virhe']}")
+            virheet.append(t["moduuli"])
+            continue
+        print(f"{t['moduuli']:<22} {t['kumulatiivinen_ms']:>9.1f} ms  ({t['moduuleja']} moduulia)")
+        for paketti, ms in t["raskaimmat_paketit_ms"].items():
+            print(f"    {paketti:<26} {ms:>9.1f} ms")
+        if args.raja_ms is not None and t["kumulatiivinen_ms"] > args.raja_ms:
+            ylitykset.append(t["moduuli"])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(tulokset, f, indent=2, ensure_ascii=False)
+    if ylitykset:
+        print(f"Raja {args.raja_ms:g} ms ylittyi: {', '.join(ylitykset)}")
+    if ylitykset or virheet:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
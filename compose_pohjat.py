@@ -0,0 +1,144 @@
+# compose_pohjat.py
+# docker-compose.yml -pohjat ympäristöille. Yhteinen wp_luo_ymparisto-työkalulle
+# ja valmiiden ympäristöjen poolille (ymparistopooli).
+
+import os
+import re
+import json
+from docker_tila import projektin_nimi
+from wp_pluginit import KONTTI_CACHE_DIR, compose_volyymit
+
+# Ympäristön tietokantasalasanat (0600); compose-tiedostot viittaavat siihen env_filellä
+DB_ENV = "db.env"
+
+
+def volyymi_nimet(volyymi_prefix: str) -> dict:
+    """Ympäristön volyymien Docker-nimet: {'db_data': ..., 'wordpress_data': ...}."""
+    return {
+        "db_data": f"{volyymi_prefix}_db_data",
+        "wordpress_data": f"{volyymi_prefix}_wordpress_data",
+    }
+
+
+def wordpress_compose(portti=None, volyymi_prefix=None, slug=None, jaettu_db=None) -> str:
+    """docker-compose.yml WordPress-ympäristölle (db + wordpress + wpcli).
+
+    - `portti=None` jättää wordpress-palvelun julkaisematta (poolin ympäristöt).
+    - Volyymeilla on eksplisiittiset nimet (`<volyymi_prefix>_db_data` jne.), jotta
+      ympäristön voi siirtää toiseen hakemistoon/projektiin datan säilyessä.
+      Oletuksena prefix on projektin nimi, eli sama kuin compose käyttäisi itse.
+    - `jaettu_db` (jaettu_tietokanta.luo_tietokanta-tunnukset): ei omaa db-palvelua,
+      vaan wordpress ja wpcli liittyvät jaetun tietokannan verkkoon.
+    - wpcli-palvelu liittää jaetun plugin-välimuistin (ja mahdollisen peilin), ks. wp_pluginit.
+    - Salasanat luetaan hakemiston DB_ENV-tiedostosta, ks. kirjoita_db_env.
+    """
+    from jaettu_tietokanta import VERKKO as JAETTU_VERKKO
+    if volyymi_prefix is None:
+        volyymi_prefix = projektin_nimi(slug or "")
+    volyymit = volyymi_nimet(volyymi_prefix)
+    wpcli_liitokset = "\n".join(f"      - {l}" for l in compose_volyymit())
+    portit = f"""
+    ports:
+      - \"{portti}:80\"""" if portti is not None else ""
+
+    if jaettu_db:
+        db_asetukset = (jaettu_db["host"], jaettu_db["user"], jaettu_db["name"])
+        db_palvelu = ""
+        riippuvuus = ""
+        verkot = f"""
+    networks:
+      - default
+      - {JAETTU_VERKKO}"""
+        db_volyymi = ""
+        verkko_maarittely = f"""
+networks:
+  {JAETTU_VERKKO}:
+    external: true
+"""
+    else:
+        db_asetukset = ("db:3306", "wordpress", "wordpress")
+        db_palvelu = f"""
+  db:
+    image: mysql:5.7
+    restart: always
+    env_file:
+      - {DB_ENV}
+    environment:
+      MYSQL_DATABASE: wordpress
+      MYSQL_USER: wordpress
+      MYSQL_RANDOM_ROOT_PASSWORD: '1'
+    volumes:
+      - db_data:/var/lib/mysql
+"""
+        riippuvuus = """
+    depends_on:
+      - db"""
+        verkot = ""
+        db_volyymi = f"""
+  db_data:
+    name: {volyymit['db_data']}"""
+        verkko_maarittely = ""
+
+    db_ymparisto = """
+      WORDPRESS_DB_HOST: {}
+      WORDPRESS_DB_USER: {}
+      WORDPRESS_DB_NAME: {}""".format(*db_asetukset)
+    env_tiedosto = f"""
+    env_file:
+      - {DB_ENV}"""
+
+    return f"""
+services:{db_palvelu}
+  wordpress:
+    image: wordpress:latest{riippuvuus}{portit}{env_tiedosto}
+    environment:{db_ymparisto}
+    volumes:
+      - wordpress_data:/var/www/html{verkot}
+
+  wpcli:
+    image: wordpress:cli
+    depends_on:
+      - wordpress
+    volumes:
+      - wordpress_data:/var/www/html
+{wpcli_liitokset}{env_tiedosto}
+    environment:{db_ymparisto}
+      WP_CLI_CACHE_DIR: {KONTTI_CACHE_DIR}
+    command: tail -f /dev/null
+    restart: unless-stopped{verkot}
+
+volumes:{db_volyymi}
+  wordpress_data:
+    name: {volyymit['wordpress_data']}
+{verkko_maarittely}"""
+
+
+def kirjoita_db_env(env_path: str, jaettu_db=None):
+    """Kirjoita ympäristön tietokantasalasanat DB_ENV-tiedostoon (0600).
+
+    Ilman `jaettu_db`:tä oman db-kontin oletustunnus. Jaetun tietokannan tunnuksista ilman
+    salasanaa (poolista lunastettu ympäristö) ei kirjoiteta mitään: tiedosto siirtyi hakemiston mukana.
+    """
+    if jaettu_db is None:
+        muuttujat = {"MYSQL_PASSWORD": "wordpress", "WORDPRESS_DB_PASSWORD": "wordpress"}
+    elif "password" in jaettu_db:
+        muuttujat = {"WORDPRESS_DB_PASSWORD": jaettu_db["password"]}
+    else:
+        return
+    from jaettu_tietokanta import kirjoita_env_tiedosto
+    kirjoita_env_tiedosto(os.path.join(env_path, DB_ENV), muuttujat)
+
+
+def lue_volyymi_prefix(compose: str, slug: str) -> str:
+    """Päättele volyymiprefix olemassa olevasta compose-tiedostosta (vanhoissa ei ole nimiä)."""
+    m = re.search(r"^\s+name:\s*(\S+)_wordpress_data\s*$", compose, re.MULTILINE)
+    return m.group(1) if m else projektin_nimi(slug)
+
+
+def lue_meta(env_path) -> dict:
+    """Lue ympäristön (tai poolin ympäristön) meta.json (tyhjä dict, jos puuttuu tai on rikki)."""
+    try:
+        with open(os.path.join(env_path, "meta.json")) as mf:
+            return json.load(mf)
+    except (OSError, ValueError):
+        return {}
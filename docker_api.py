@@ -0,0 +1,418 @@
+# docker_api.py
+# Docker Engine API -asiakas unix-socketin yli. Jokainen `docker compose ...` -kutsu
+# käynnistää Go-binäärin, joka jäsentää compose-tiedoston ja avaa uuden yhteyden
+# daemoniin (100-300 ms ennen varsinaista työtä). Tila, käynnistys, pysäytys, tauotus,
+# tilastot ja exec tehdään tässä suoraan HTTP:llä pysyvien keep-alive-yhteyksien yli; compose-projektin
+# kontit löytyvät com.docker.compose.project-nimikkeellä.
+#
+# CLI on varapolku: jos socketia ei ole tai API-kutsu epäonnistuu yhteystasolla, sama
+# toiminto tehdään `docker compose` -komennolla. Projektin luonti ja konfiguraation
+# muutokset (up -d, down) menevät aina CLI:n kautta; käynnistys käyttää `up -d`:tä myös,
+# jos compose-tiedosto on muuttunut konttien luonnin jälkeen.
+#
+# Paikallinen testipalvelin: python vale_docker.py palvele SOCKET (ks. bench_e2e.py --docker-api)
+#
+# Asetukset: DOCKER_API (auto = käytä, jos socket on olemassa; 0 = vain CLI),
+# DOCKER_HOST (unix:///var/run/docker.sock), DOCKER_API_CONNECTIONS, DOCKER_API_RETRY
+
+import os
+import json
+import time
+import struct
+import asyncio
+import urllib.parse
+import mittarit
+from komennot import aja_komento, KomentoVirhe, KomentoAikakatkaisu, CMD_TIMEOUT
+
+DOCKER_API = os.getenv("DOCKER_API", "auto").lower()
+DOCKER_HOST = os.getenv("DOCKER_HOST", "unix:///var/run/docker.sock")
+DOCKER_API_CONNECTIONS = int(os.getenv("DOCKER_API_CONNECTIONS", "8"))
+# Kuinka pitkään API:a ei yritetä yhteysvirheen jälkeen (sekuntia)
+DOCKER_API_RETRY = float(os.getenv("DOCKER_API_RETRY", "30"))
+
+PROJEKTI_LABEL = "com.docker.compose.project"
+PALVELU_LABEL = "com.docker.compose.service"
+# Compose kirjaa palvelun depends_on-listan kontille: "db:service_started:false,..."
+RIIPPUVUUS_LABEL = "com.docker.compose.depends_on"
+
+_RIVIN_MAKSIMI = 1024 * 1024
+
+
+class DockerAPIVirhe(RuntimeError):
+    """API vastasi virhekoodilla (status) tai yhteys epäonnistui (status None)."""
+
+    def __init__(self, viesti, status=None):
+        self.status = status
+        super().__init__(viesti)
+
+
+def _kaynnistysvaiheet(kontit) -> list:
+    """Kontit riippuvuusjärjestyksessä vaiheittain, esim. [[db], [wordpress], [wpcli]].
+
+    Vaiheen kontit voi käynnistää rinnakkain. Projektin ulkopuoliset riippuvuudet ohitetaan;
+    kehän muodostavat palvelut tulevat samaan (viimeiseen) vaiheeseen.
+    """
+    palvelut = {}
+    for k in kontit:
+        palvelut.setdefault((k.get("Labels") or {}).get(PALVELU_LABEL), []).append(k)
+    riippuu = {}
+    for palvelu, ryhma in palvelut.items():
+        arvo = (ryhma[0].get("Labels") or {}).get(RIIPPUVUUS_LABEL) or ""
+        riippuu[palvelu] = {osa.split(":")[0] for osa in arvo.split(",") if osa} & (set(palvelut) - {palvelu})
+    vaiheet, valmiit = [], set()
+    while riippuu:
+        vaihe = [p for p, r in riippuu.items() if r <= valmiit] or list(riippuu)
+        vaiheet.append([k for p in vaihe for k in palvelut[p]])
+        valmiit.update(vaihe)
+        for p in vaihe:
+            del riippuu[p]
+    return vaiheet
+
+
+def _socket_polku(host: str):
+    if host.startswith("unix://"):
+        return host[len("unix://"):]
+    return None  # tcp://-yhteyksiä ei tueta; käytetään CLI:tä
+
+
+class DockerAPI:
+    """HTTP/1.1 unix-socketin yli: vapaat yhteydet käytetään uudelleen (keep-alive)."""
+
+    def __init__(self, socket_polku: str, yhteyksia: int = DOCKER_API_CONNECTIONS):
+        self.socket_polku = socket_polku
+        self.yhteyksia = max(1, yhteyksia)
+        self._vapaat = []
+        self._semafori = None
+
+    async def _avaa(self):
+        return await asyncio.open_unix_connection(self.socket_polku, limit=_RIVIN_MAKSIMI)
+
+    @staticmethod
+    def _pyyntorivit(metodi, polku, kysely, runko, lisaotsakkeet=()) -> bytes:
+        if kysely:
+            polku += "?" + urllib.parse.urlencode(kysely)
+        data = json.dumps(runko).encode() if runko is not None else b""
+        otsakkeet = [f"{metodi} {polku} HTTP/1.1", "Host: docker", f"Content-Length: {len(data)}", *lisaotsakkeet]
+        if runko is not None:
+            otsakkeet.append("Content-Type: application/json")
+        return ("\r\n".join(otsakkeet) + "\r\n\r\n").encode() + data
+
+    @staticmethod
+    async def _lue_otsakkeet(lukija):
+        tilarivi = await lukija.readline()
+        if not tilarivi:
+            raise ConnectionResetError("yhteys suljettiin ennen vastausta")
+        status = int(tilarivi.split()[1])
+        otsakkeet = {}
+        while True:
+            rivi = await lukija.readline()
+            if rivi in (b"\r\n", b"\n", b""):
+                break
+            avain, _, arvo = rivi.decode("latin-1").partition(":")
+            otsakkeet[avain.strip().lower()] = arvo.strip()
+        return status, otsakkeet
+
+    @staticmethod
+    async def _lue_runko(lukija, status, otsakkeet):
+        """Palauttaa (runko, voiko yhteyden käyttää uudelleen)."""
+        if otsakkeet.get("transfer-encoding", "").lower() == "chunked":
+            osat = []
+            while True:
+                koko = int((await lukija.readline()).split(b";")[0].strip() or b"0", 16)
+                if koko == 0:
+                    await lukija.readline()
+                    break
+                osat.append(await lukija.readexactly(koko))
+                await lukija.readline()
+            return b"".join(osat), True
+        if "content-length" in otsakkeet:
+            return await lukija.readexactly(int(otsakkeet["content-length"])), True
+        if status in (204, 304) or 100 <= status < 200:
+            return b"", True
+        return await lukija.read(), False
+
+    async def pyynto(self, metodi: str, polku: str, kysely=None, runko=None):
+        """Lähetä pyyntö; palauttaa (status, JSON tai None). Vanhentunut keep-alive-yhteys yritetään kerran uudelleen."""
+        if self._semafori is None:
+            self._semafori = asyncio.Semaphore(self.yhteyksia)
+        data = self._pyyntorivit(metodi, polku, kysely, runko)
+        async with self._semafori:
+            for yritys in range(2):
+                uudelleenkaytetty = bool(self._vapaat)
+                lukija, kirjoittaja = self._vapaat.pop() if uudelleenkaytetty else await self._avaa()
+                try:
+                    kirjoittaja.write(data)
+                    await kirjoittaja.drain()
+                    status, otsakkeet = await self._lue_otsakkeet(lukija)
+                    runko_data, sailyta = await self._lue_runko(lukija, status, otsakkeet)
+                except (ConnectionError, asyncio.IncompleteReadError, OSError):
+                    kirjoittaja.close()
+                    if uudelleenkaytetty and yritys == 0:
+                        continue
+                    raise
+                except BaseException:
+                    kirjoittaja.close()
+                    raise
+                if sailyta and otsakkeet.get("connection", "").lower() != "close":
+                    self._vapaat.append((lukija, kirjoittaja))
+                else:
+                    kirjoittaja.close()
+                break
+        tulos = None
+        if runko_data and "json" in otsakkeet.get("content-type", ""):
+            tulos = json.loads(runko_data)
+        if status >= 400:
+            viesti = tulos.get("message") if isinstance(tulos, dict) else runko_data.decode(errors="replace")
+            raise DockerAPIVirhe(f"Docker API {metodi} {polku}: {status} {viesti}", status)
+        return status, tulos
+
+    async def exec_virta(self, exec_id: str, rivi_callback=None):
+        """Käynnistä exec ja lue multipleksattu stdout/stderr-virta loppuun omalla yhteydellä."""
+        lukija, kirjoittaja = await self._avaa()
+        try:
+            kirjoittaja.write(self._pyyntorivit(
+                "POST", f"/exec/{exec_id}/start", None, {"Detach": False, "Tty": False},
+                ("Connection: Upgrade", "Upgrade: tcp"),
+            ))
+            await kirjoittaja.drain()
+            status, otsakkeet = await self._lue_otsakkeet(lukija)
+            if status >= 400:
+                runko, _ = await self._lue_runko(lukija, status, otsakkeet)
+                raise DockerAPIVirhe(f"Docker API exec start: {status} {runko[:300]!r}", status)
+            virrat = {1: [], 2: []}
+            kesken = {1: b"", 2: b""}
+            while True:
+                try:
+                    otsake = await lukija.readexactly(8)
+                except asyncio.IncompleteReadError:
+                    break
+                tyyppi, koko = otsake[0], struct.unpack(">I", otsake[4:])[0]
+                data = kesken.get(tyyppi, b"") + await lukija.readexactly(koko)
+                *rivit, kesken[tyyppi] = data.split(b"\n")
+                for raaka in rivit:
+                    await self._rivi(virrat, tyyppi, raaka, rivi_callback)
+            for tyyppi, raaka in kesken.items():
+                if raaka:
+                    await self._rivi(virrat, tyyppi, raaka, rivi_callback)
+            return "\n".join(virrat[1]), "\n".join(virrat[2])
+        finally:
+            kirjoittaja.close()
+
+    @staticmethod
+    async def _rivi(virrat, tyyppi, raaka, rivi_callback):
+        rivi = raaka.decode(errors="replace").rstrip("\r")
+        virrat.setdefault(tyyppi, []).append(rivi)
+        if rivi_callback is not None:
+            tulos = rivi_callback("stderr" if tyyppi == 2 else "stdout", rivi)
+            if asyncio.iscoroutine(tulos):
+                await tulos
+
+    def sulje(self):
+        while self._vapaat:
+            self._vapaat.pop()[1].close()
+
+    # --- Compose-projektit ---
+
+    async def kontit(self, projekti: str = None, palvelu: str = None) -> list:
+        nimikkeet = [f"{PROJEKTI_LABEL}={projekti}" if projekti else PROJEKTI_LABEL]
+        if palvelu:
+            nimikkeet.append(f"{PALVELU_LABEL}={palvelu}")
+        _, kontit = await self.pyynto("GET", "/containers/json",
+                                      {"all": "1", "filters": json.dumps({"label": nimikkeet})})
+        return kontit or []
+
+    async def projektien_tilat(self) -> dict:
+        """Sama muoto kuin docker_tila.hae_projektien_tilat: {projekti: {palvelu: tila}}."""
+        tilat = {}
+        for kontti in await self.kontit():
+            nimikkeet = kontti.get("Labels") or {}
+            projekti, palvelu = nimikkeet.get(PROJEKTI_LABEL), nimikkeet.get(PALVELU_LABEL)
+            if projekti and palvelu:
+                tilat.setdefault(projekti, {})[palvelu] = kontti.get("State", "")
+        return tilat
+
+    async def kaynnista_projekti(self, projekti: str, muutettu: float = None) -> int:
+        """Käynnistä projektin olemassa olevat kontit depends_on-järjestyksessä (tauotetut jatketaan).
+
+        Palauttaa konttien määrän. 0 = ei kontteja, tai jokin kontti on luotu ennen `muutettu`-hetkeä
+        (compose-tiedosto muuttunut): mitään ei käynnistetä, vaan kutsuja luo kontit `up -d`:llä.
+        """
+        kontit = await self.kontit(projekti)
+        # Created on sekunteina (alaspäin pyöristetty); saman sekunnin muutos ei riitä uudelleenluontiin
+        if muutettu is not None and any(k.get("Created", muutettu) < int(muutettu) for k in kontit):
+            return 0
+        for vaihe in _kaynnistysvaiheet(kontit):
+            await asyncio.gather(*(
+                self.pyynto("POST", f"/containers/{k['Id']}/{'unpause' if k.get('State') == 'paused' else 'start'}")
+                for k in vaihe if k.get("State") != "running"
+            ))
+        return len(kontit)
+
+    async def tauota_palvelu(self, projekti: str, palvelu: str, tauota: bool = True) -> int:
+        """Tauota (pause) tai jatka (unpause) palvelun kontit. Palauttaa muutettujen konttien määrän."""
+        lahto, toiminto = ("running", "pause") if tauota else ("paused", "unpause")
+        kontit = [k for k in await self.kontit(projekti, palvelu) if k.get("State") == lahto]
+        await asyncio.gather(*(self.pyynto("POST", f"/containers/{k['Id']}/{toiminto}") for k in kontit))
+        return len(kontit)
+
+    async def tilastot(self, projektit) -> dict:
+        """Käynnissä olevien konttien kumulatiiviset laskurit: {projekti: {"verkko": tavuja, "cpu_ns": ns}}."""
+        kontit = [k for k in await self.kontit() if k.get("State") == "running"
+                  and (k.get("Labels") or {}).get(PROJEKTI_LABEL) in projektit]
+
+        async def yksi(kontti):
+            _, s = await self.pyynto("GET", f"/containers/{kontti['Id']}/stats", {"stream": "false", "one-shot": "true"})
+            return kontti["Labels"][PROJEKTI_LABEL], s or {}
+
+        tulos = {}
+        for projekti, s in await asyncio.gather(*(yksi(k) for k in kontit)):
+            summa = tulos.setdefault(projekti, {"verkko": 0, "cpu_ns": 0})
+            summa["verkko"] += sum(v.get("rx_bytes", 0) + v.get("tx_bytes", 0) for v in (s.get("networks") or {}).values())
+            summa["cpu_ns"] += ((s.get("cpu_stats") or {}).get("cpu_usage") or {}).get("total_usage", 0)
+        return tulos
+
+    async def pysayta_projekti(self, projekti: str, aikaraja: int = 10) -> int:
+        kontit = await self.kontit(projekti)
+        await asyncio.gather(*(self.pyynto("POST", f"/containers/{k['Id']}/stop", {"t": str(aikaraja)})
+                               for k in kontit if k.get("State") in ("running", "paused", "restarting")))
+        return len(kontit)
+
+    async def suorita(self, projekti: str, palvelu: str, cmd, rivi_callback=None) -> str:
+        """docker compose exec -T vastine: stdout tai KomentoVirhe (paluukoodi ja stderr kuten CLI:llä)."""
+        kontit = [k for k in await self.kontit(projekti, palvelu) if k.get("State") == "running"]
+        if not kontit:
+            raise KomentoVirhe(["exec", palvelu, *cmd], 1, f'service "{palvelu}" is not running')
+        _, luotu = await self.pyynto("POST", f"/containers/{kontit[0]['Id']}/exec", runko={
+            "AttachStdout": True, "AttachStderr": True, "Tty": False, "Cmd": list(cmd),
+        })
+        stdout, stderr = await self.exec_virta(luotu["Id"], rivi_callback)
+        _, tiedot = await self.pyynto("GET", f"/exec/{luotu['Id']}/json")
+        paluukoodi = (tiedot or {}).get("ExitCode")
+        # None = prosessi ei ole päättynyt tai daemon ei tiedä tulosta: ei onnistuminen
+        if paluukoodi is None:
+            raise KomentoVirhe(["exec", palvelu, *cmd], None, stderr.strip() or "exec päättyi ilman paluukoodia")
+        if paluukoodi:
+            raise KomentoVirhe(["exec", palvelu, *cmd], paluukoodi, stderr.strip())
+        return stdout.strip()
+
+
+_asiakas = None
+_ei_ennen = 0.0
+
+
+def asiakas():
+    """Prosessin yhteinen asiakas tai None (API pois, socket puuttuu tai edellinen yhteysvirhe tuore)."""
+    global _asiakas
+    if DOCKER_API in ("0", "false", "no", "cli") or time.monotonic() < _ei_ennen:
+        return None
+    polku = _socket_polku(DOCKER_HOST)
+    if polku is None or not os.path.exists(polku):
+        return None
+    if _asiakas is None or _asiakas.socket_polku != polku:
+        _asiakas = DockerAPI(polku)
+    return _asiakas
+
+
+def _yhteysvirhe(e):
+    """Yhteystason virhe: siirrytään CLI:hin DOCKER_API_RETRY sekunniksi."""
+    global _ei_ennen
+    _ei_ennen = time.monotonic() + DOCKER_API_RETRY
+    if _asiakas is not None:
+        _asiakas.sulje()
+    print(f"Varoitus: Docker API ei vastaa ({e}); käytetään docker CLI:tä {DOCKER_API_RETRY:g} s.")
+
+
+async def _api(nimi: str, kutsu):
+    """Aja API-toiminto mitattuna. Palauttaa (onnistui, tulos); yhteys- ja API-virheillä (False, None).
+
+    Aikakatkaisu nousee kutsujalle: toiminto voi olla yhä kesken daemonissa, joten sitä ei saa
+    toistaa CLI:llä (TimeoutError on Python 3.11+:ssa OSError:n aliluokka, siksi ensin).
+    """
+    api = asiakas()
+    if api is None:
+        return False, None
+    try:
+        with mittarit.jakso("docker_api", mittarit.komennot, komento=f"api {nimi}", paluukoodi=0) as jakso:
+            try:
+                return True, await kutsu(api)
+            except DockerAPIVirhe as e:
+                jakso["paluukoodi"] = e.status
+                raise
+            except (asyncio.TimeoutError, TimeoutError):
+                jakso["paluukoodi"] = "aikakatkaisu"
+                raise
+    except (asyncio.TimeoutError, TimeoutError):
+        raise
+    except (ConnectionError, OSError, asyncio.IncompleteReadError) as e:
+        _yhteysvirhe(e)
+    except DockerAPIVirhe as e:
+        print(f"Varoitus: {e}; käytetään docker CLI:tä.")
+    return False, None
+
+
+def _projekti(env_path: str) -> str:
+    from docker_tila import projektin_nimi
+    return projektin_nimi(os.path.basename(os.path.abspath(env_path)))
+
+
+# --- Toiminnot CLI-varapolulla ---
+
+async def projektien_tilat():
+    """{projekti: {palvelu: tila}} API:lla, tai None jos API ei ole käytettävissä (kutsuja käyttää CLI:tä)."""
+    onnistui, tilat = await _api("ps", lambda api: api.projektien_tilat())
+    return tilat if onnistui else None
+
+
+async def kaynnista(env_path: str, rivi_callback=None) -> str:
+    """Käynnistä ympäristön olemassa olevat kontit; jos kontteja ei ole tai compose-tiedosto on
+    muuttunut niiden luonnin jälkeen (esim. portti vaihdettu), `docker compose up -d`."""
+    try:
+        muutettu = os.path.getmtime(os.path.join(env_path, "docker-compose.yml"))
+    except OSError:
+        muutettu = None
+    onnistui, maara = await _api("start", lambda api: api.kaynnista_projekti(_projekti(env_path), muutettu))
+    if onnistui and maara:
+        return ""
+    return await aja_komento(["docker", "compose", "-f", "docker-compose.yml", "up", "-d"],
+                             cwd=env_path, rivi_callback=rivi_callback)
+
+
+async def pysayta(env_path: str, rivi_callback=None) -> str:
+    onnistui, _ = await _api("stop", lambda api: api.pysayta_projekti(_projekti(env_path)))
+    if onnistui:
+        return ""
+    return await aja_komento(["docker", "compose", "-f", "docker-compose.yml", "stop"],
+                             cwd=env_path, rivi_callback=rivi_callback)
+
+
+async def tauota(env_path: str, palvelu: str, tauota: bool = True) -> str:
+    """`docker compose pause|unpause palvelu` API:lla tai CLI:llä."""
+    onnistui, _ = await _api("pause" if tauota else "unpause",
+                             lambda api: api.tauota_palvelu(_projekti(env_path), palvelu, tauota))
+    if onnistui:
+        return ""
+    return await aja_komento(["docker", "compose", "-f", "docker-compose.yml", "pause" if tauota else "unpause", palvelu],
+                             cwd=env_path)
+
+
+async def tilastot(projektit):
+    """{projekti: {"verkko": tavuja, "cpu_ns": ns}} API:lla, tai None jos API ei ole käytettävissä."""
+    onnistui, tulos = await _api("stats", lambda api: api.tilastot(set(projektit)))
+    return tulos if onnistui else None
+
+
+async def suorita(env_path: str, palvelu: str, cmd, aikaraja=None, rivi_callback=None) -> str:
+    """`docker compose exec -T palvelu cmd` API:lla (KomentoVirhe kuten CLI:llä) tai CLI:llä."""
+    api = asiakas()
+    if api is not None:
+        aikaraja = CMD_TIMEOUT if aikaraja is None else aikaraja
+        kutsu = lambda api: asyncio.wait_for(api.suorita(_projekti(env_path), palvelu, cmd, rivi_callback),
+                                             timeout=aikaraja or None)
+        try:
+            onnistui, tulos = await _api("exec", kutsu)
+        except asyncio.TimeoutError:
+            raise KomentoAikakatkaisu(["docker", "exec", palvelu, *cmd], aikaraja)
+        if onnistui:
+            return tulos
+    return await aja_komento(["docker", "compose", "-f", "docker-compose.yml", "exec", "-T", palvelu, *cmd],
+                             cwd=env_path, aikaraja=aikaraja, rivi_callback=rivi_callback)
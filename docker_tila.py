@@ -0,0 +1,57 @@
+# docker_tila.py
+# Kaikkien compose-projektien tila yhdellä `docker ps` -kutsulla.
+# Korvaa ympäristökohtaiset `docker compose ps` -kutsut listauksissa (O(1) prosessia O(N):n sijaan).
+# Docker API -socketin ollessa käytettävissä sama haetaan ilman aliprosessia (docker_api.py).
+
+import re
+from komennot import aja_komento
+
+PROJEKTI_LABEL = "com.docker.compose.project"
+PALVELU_LABEL = "com.docker.compose.service"
+
+KAYNNISSA = "käynnissä"
+PYSAHDYKSISSA = "pysähdyksissä"
+
+
+def projektin_nimi(hakemisto: str) -> str:
+    """Compose-projektin oletusnimi hakemiston nimestä (sama normalisointi kuin docker compose)."""
+    s = "".join(re.findall(r"[a-z0-9_-]", hakemisto.lower()))
+    return s.lstrip("_-")
+
+
+async def hae_projektien_tilat() -> dict:
+    """Palauttaa {projekti: {palvelu: tila}} kaikista compose-konteista (myös pysäytetyistä).
+
+    Tila on Dockerin State-kenttä, esim. 'running', 'exited', 'paused'.
+    Docker API:n kautta, jos socket on käytettävissä; muuten `docker ps`.
+    """
+    import docker_api  # docker_api tuo projektin_nimi-funktion tästä moduulista
+    tilat = await docker_api.projektien_tilat()
+    if tilat is not None:
+        return tilat
+    out = await aja_komento([
+        "docker", "ps", "-a",
+        "--filter", f"label={PROJEKTI_LABEL}",
+        "--format", f'{{{{.Label "{PROJEKTI_LABEL}"}}}}\t{{{{.Label "{PALVELU_LABEL}"}}}}\t{{{{.State}}}}',
+    ])
+    tilat = {}
+    for rivi in out.splitlines():
+        osat = rivi.split("\t")
+        if len(osat) != 3 or not osat[0]:
+            continue
+        projekti, palvelu, tila = osat
+        tilat.setdefault(projekti, {})[palvelu] = tila
+    return tilat
+
+
+def tila_teksti(palvelut) -> str:
+    """Muunna projektin palvelutilat listauksen tekstiksi (käynnissä jos jokin palvelu on käynnissä)."""
+    if palvelut and any(t == "running" for t in palvelut.values()):
+        return KAYNNISSA
+    return PYSAHDYKSISSA
+
+
+async def hae_tilat_slugeille(slugit) -> dict:
+    """Hae tila usealle ympäristölle kerralla: {slug: 'käynnissä'/'pysähdyksissä'}."""
+    projektit = await hae_projektien_tilat()
+    return {slug: tila_teksti(projektit.get(projektin_nimi(slug))) for slug in slugit}
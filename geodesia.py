@@ -0,0 +1,129 @@
+# geodesia.py
+# Vektoroitu etäisyyslaskenta (NumPy): haversine pallomallilla ja Vincentyn
+# käänteinen ratkaisu WGS84-ellipsoidilla. Kaikki funktiot ottavat skalaareja tai
+# taulukoita, jotka NumPy-broadcastataan, joten tuhannet parit lasketaan yhdellä kutsulla.
+
+import numpy as np
+
+# Keskimääräinen maapallon säde (IUGG), km
+MAAN_SADE_KM = 6371.0088
+
+# WGS84-ellipsoidi, km
+WGS84_A = 6378.137
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+
+MENETELMAT = ("haversine", "vincenty")
+
+
+def tarkista_koordinaatit(lat, lon):
+    """Muunna float-taulukoiksi ja tarkista arvoalueet. Nostaa ValueError virheellisille arvoille."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    if not (np.all(np.isfinite(lat)) and np.all(np.isfinite(lon))):
+        raise ValueError("koordinaateissa on puuttuvia tai äärettömiä arvoja")
+    if np.any(np.abs(lat) > 90):
+        raise ValueError("leveysasteen on oltava välillä -90...90")
+    if np.any(np.abs(lon) > 180):
+        raise ValueError("pituusasteen on oltava välillä -180...180")
+    return lat, lon
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Isoympyräetäisyys kilometreinä (pallomalli, virhe enintään ~0,5 %)."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=np.float64)) for x in (lat1, lon1, lat2, lon2))
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * MAAN_SADE_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def vincenty(lat1, lon1, lat2, lon2, iteraatiot: int = 200, toleranssi: float = 1e-12):
+    """Ellipsoidinen etäisyys kilometreinä (Vincentyn käänteinen ratkaisu, millimetritarkkuus).
+
+    Iteroidaan taulukolle kerralla; jokaisella kierroksella lasketaan vain vielä
+    suppenemattomat alkiot. Lähes antipodisille pisteille, joille menetelmä ei
+    suppene, palautetaan haversine-arvo.
+    """
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64) for x in (lat1, lon1, lat2, lon2)))
+    muoto = lat1.shape
+    lat1, lon1, lat2, lon2 = (x.ravel() for x in (lat1, lon1, lat2, lon2))
+    a, b, f = WGS84_A, WGS84_B, WGS84_F
+
+    L = np.radians(lon2 - lon1)
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    sinU1, cosU1 = np.sin(U1), np.cos(U1)
+    sinU2, cosU2 = np.sin(U2), np.cos(U2)
+
+    def kierros(lam, i):
+        sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+        sin_sigma = np.hypot(cosU2[i] * sin_lam, cosU1[i] * sinU2[i] - sinU1[i] * cosU2[i] * cos_lam)
+        cos_sigma = sinU1[i] * sinU2[i] + cosU1[i] * cosU2[i] * cos_lam
+        sigma = np.arctan2(sin_sigma, cos_sigma)
+        sin_alpha = np.where(sin_sigma == 0, 0.0, cosU1[i] * cosU2[i] * sin_lam / sin_sigma)
+        cos2_alpha = 1 - sin_alpha ** 2
+        # Päiväntasaajan suuntaisilla viivoilla cos2_alpha = 0
+        cos_2sm = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sinU1[i] * sinU2[i] / cos2_alpha)
+        C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+        uusi = L[i] + (1 - C) * f * sin_alpha * (
+            sigma + C * sin_sigma * (cos_2sm + C * cos_sigma * (-1 + 2 * cos_2sm ** 2))
+        )
+        return uusi, (sin_sigma, cos_sigma, sigma, cos2_alpha, cos_2sm)
+
+    lam = L.copy()
+    aktiiviset = np.arange(L.size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for _ in range(iteraatiot):
+            uusi, _ = kierros(lam[aktiiviset], aktiiviset)
+            muuttui = ~(np.abs(uusi - lam[aktiiviset]) <= toleranssi)
+            lam[aktiiviset] = uusi
+            aktiiviset = aktiiviset[muuttui]
+            if aktiiviset.size == 0:
+                break
+        kesken = np.zeros(L.size, dtype=bool)
+        kesken[aktiiviset] = True
+
+        # Lopulliset apusuureet supenneella lambdalla
+        _, (sin_sigma, cos_sigma, sigma, cos2_alpha, cos_2sm) = kierros(lam, slice(None))
+        u2 = cos2_alpha * (a ** 2 - b ** 2) / b ** 2
+        A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+        B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+        delta_sigma = B * sin_sigma * (cos_2sm + B / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sm ** 2) - B / 6 * cos_2sm * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sm ** 2)
+        ))
+        s = b * A * (sigma - delta_sigma)
+
+    # Samat pisteet -> 0; suppenematta jääneet tai NaN -> haversine
+    s = np.where(sin_sigma == 0, 0.0, s)
+    varalle = kesken | ~np.isfinite(s)
+    if varalle.any():
+        s[varalle] = haversine(lat1[varalle], lon1[varalle], lat2[varalle], lon2[varalle])
+    return s.reshape(muoto)
+
+
+def _laske(menetelma: str):
+    if menetelma not in MENETELMAT:
+        raise ValueError(f"tuntematon menetelmä '{menetelma}' (sallitut: {', '.join(MENETELMAT)})")
+    return haversine if menetelma == "haversine" else vincenty
+
+
+def etaisyydet(parit, menetelma: str = "haversine") -> np.ndarray:
+    """Parikohtaiset etäisyydet: `parit` muotoa [[lat1, lon1, lat2, lon2], ...] -> taulukko (N,)."""
+    p = np.asarray(parit, dtype=np.float64)
+    if p.ndim != 2 or p.shape[1] != 4:
+        raise ValueError("parien muoto on [[lat1, lon1, lat2, lon2], ...]")
+    lat1, lon1 = tarkista_koordinaatit(p[:, 0], p[:, 1])
+    lat2, lon2 = tarkista_koordinaatit(p[:, 2], p[:, 3])
+    return _laske(menetelma)(lat1, lon1, lat2, lon2)
+
+
+def etaisyysmatriisi(lahteet, kohteet, menetelma: str = "haversine") -> np.ndarray:
+    """N×M-etäisyysmatriisi: `lahteet` ja `kohteet` muotoa [[lat, lon], ...]."""
+    l = np.asarray(lahteet, dtype=np.float64)
+    k = np.asarray(kohteet, dtype=np.float64)
+    if l.ndim != 2 or l.shape[1] != 2 or k.ndim != 2 or k.shape[1] != 2:
+        raise ValueError("lähteiden ja kohteiden muoto on [[lat, lon], ...]")
+    lat1, lon1 = tarkista_koordinaatit(l[:, 0], l[:, 1])
+    lat2, lon2 = tarkista_koordinaatit(k[:, 0], k[:, 1])
+    return _laske(menetelma)(lat1[:, None], lon1[:, None], lat2[None, :], lon2[None, :])
@@ -0,0 +1,238 @@
+# hintavarasto.py
+# Paikallinen sarakepohjainen osakekurssivarasto. CSV- (ja valinnainen Parquet-) tuonti
+# kirjoittaa jokaiselle tickerille omat .npy-sarakkeet (päivä, open, high, low, close, volume),
+# jotka luetaan muistikartoitettuina (mmap). Päivät ovat järjestyksessä, joten piste- ja
+# välihaut ovat binäärihakuja ja koosteet (min/max/keskiarvo) vektoroituja NumPy-operaatioita.
+#
+# Tuonti komentoriviltä: python hintavarasto.py tuo hinnat.csv [AAPL.csv ...]
+
+import os
+import sys
+import csv
+import threading
+import numpy as np
+
+PRICE_STORE_DIR = os.getenv("PRICE_STORE_DIR", os.path.join("data", "hinnat"))
+
+PAIVA = "date"
+SARAKKEET = ("open", "high", "low", "close", "volume")
+
+# Tunnistettavat sarakeotsikot (pienillä kirjaimilla)
+_OTSIKOT = {
+    "ticker": ("ticker", "symbol", "tunnus"),
+    "date": ("date", "paiva", "päivä", "timestamp"),
+    "open": ("open",),
+    "high": ("high",),
+    "low": ("low",),
+    "close": ("close", "adj close", "adj_close", "price", "hinta"),
+    "volume": ("volume", "vaihto"),
+}
+
+
+def parsi_paiva(teksti: str) -> np.datetime64:
+    """'VVVV/KK/PP', 'VVVV-KK-PP' tai ISO-aikaleima -> datetime64[D]. Nostaa ValueError."""
+    teksti = str(teksti).strip().replace("/", "-")[:10]
+    return np.datetime64(teksti, "D")
+
+
+def _normalisoi_ticker(ticker: str) -> str:
+    ticker = ticker.strip().upper()
+    if not ticker or not all(c.isalnum() or c in ".-_^=" for c in ticker):
+        raise ValueError(f"virheellinen ticker '{ticker}'")
+    return ticker
+
+
+def _lue_csv(polku: str, ticker=None) -> dict:
+    """Lue CSV -> {ticker: {sarake: list}}. Ilman ticker-saraketta ticker on tiedoston nimi."""
+    data = {}
+    with open(polku, newline="", encoding="utf-8-sig") as f:
+        lukija = csv.reader(f)
+        otsikko = [o.strip().lower() for o in next(lukija)]
+        indeksit = {}
+        for sarake, nimet in _OTSIKOT.items():
+            for nimi in nimet:
+                if nimi in otsikko:
+                    indeksit[sarake] = otsikko.index(nimi)
+                    break
+        if PAIVA not in indeksit or "close" not in indeksit:
+            raise ValueError(f"{polku}: tarvitaan vähintään sarakkeet date ja close")
+        oletus = ticker or os.path.splitext(os.path.basename(polku))[0]
+        for rivi in lukija:
+            if not rivi:
+                continue
+            t = rivi[indeksit["ticker"]] if "ticker" in indeksit else oletus
+            sarakkeet = data.setdefault(_normalisoi_ticker(t), {s: [] for s in (PAIVA, *SARAKKEET)})
+            sarakkeet[PAIVA].append(rivi[indeksit[PAIVA]].strip().replace("/", "-")[:10])
+            for s in SARAKKEET:
+                arvo = rivi[indeksit[s]].strip() if s in indeksit else ""
+                sarakkeet[s].append(float(arvo) if arvo else np.nan)
+    return data
+
+
+def _lue_parquet(polku: str, ticker=None) -> dict:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet-tuonti vaatii pyarrow-paketin (pip install pyarrow)")
+    taulu = pq.read_table(polku)
+    nimet = {n.lower(): n for n in taulu.column_names}
+
+    def sarake(avain):
+        for nimi in _OTSIKOT[avain]:
+            if nimi in nimet:
+                return taulu.column(nimet[nimi]).to_numpy(zero_copy_only=False)
+        return None
+
+    paivat = sarake(PAIVA)
+    if paivat is None or sarake("close") is None:
+        raise ValueError(f"{polku}: tarvitaan vähintään sarakkeet date ja close")
+    paivat = np.asarray(paivat).astype("datetime64[D]")
+    tickerit = sarake("ticker")
+    if tickerit is None:
+        tickerit = np.full(len(paivat), ticker or os.path.splitext(os.path.basename(polku))[0], dtype=object)
+    arvot = {}
+    for s in SARAKKEET:
+        a = sarake(s)
+        arvot[s] = np.full(len(paivat), np.nan) if a is None else np.asarray(a, dtype=np.float64)
+    data = {}
+    for t in np.unique(tickerit.astype(str)):
+        maski = tickerit.astype(str) == t
+        data[_normalisoi_ticker(t)] = {PAIVA: paivat[maski], **{s: arvot[s][maski] for s in SARAKKEET}}
+    return data
+
+
+class Hintavarasto:
+    """Tickerikohtaiset muistikartoitetut sarakkeet hakemistossa `hakemisto/<TICKER>/<sarake>.npy`."""
+
+    def __init__(self, hakemisto: str = PRICE_STORE_DIR):
+        self.hakemisto = hakemisto
+        self._avoimet = {}
+        self._lukko = threading.Lock()
+
+    def _polku(self, ticker: str, sarake: str) -> str:
+        return os.path.join(self.hakemisto, ticker, f"{sarake}.npy")
+
+    def tickerit(self) -> list:
+        if not os.path.isdir(self.hakemisto):
+            return []
+        return sorted(d for d in os.listdir(self.hakemisto) if os.path.exists(self._polku(d, PAIVA)))
+
+    def sarakkeet(self, ticker: str):
+        """Tickerin sarakkeet mmap-taulukkoina tai None. Avataan uudelleen, jos tuonti on päivittänyt ne."""
+        ticker = _normalisoi_ticker(ticker)
+        try:
+            muutettu = os.path.getmtime(self._polku(ticker, PAIVA))
+        except OSError:
+            return None
+        with self._lukko:
+            avoin = self._avoimet.get(ticker)
+            if avoin is None or avoin[0] != muutettu:
+                sarakkeet = {s: np.load(self._polku(ticker, s), mmap_mode="r") for s in (PAIVA, *SARAKKEET)}
+                avoin = (muutettu, sarakkeet)
+                self._avoimet[ticker] = avoin
+        return avoin[1]
+
+    def tuo(self, polku: str, ticker=None) -> dict:
+        """Tuo CSV- tai Parquet-tiedosto ja yhdistä olemassa olevaan dataan (sama päivä: uusi arvo voittaa).
+
+        Palauttaa {ticker: rivimäärä tuonnin jälkeen}.
+        """
+        if polku.lower().endswith((".parquet", ".pq")):
+            uudet = _lue_parquet(polku, ticker)
+        else:
+            uudet = _lue_csv(polku, ticker)
+        tulos = {}
+        for t, sarakkeet in uudet.items():
+            paivat = np.asarray(sarakkeet[PAIVA], dtype="datetime64[D]")
+            arvot = {s: np.asarray(sarakkeet[s], dtype=np.float64) for s in SARAKKEET}
+            vanhat = self.sarakkeet(t)
+            if vanhat is not None:
+                paivat = np.concatenate([np.asarray(vanhat[PAIVA]), paivat])
+                arvot = {s: np.concatenate([np.asarray(vanhat[s]), arvot[s]]) for s in SARAKKEET}
+            # Uusin rivi kullekin päivälle: käännetään, jolloin unique poimii viimeisen esiintymän
+            _, indeksit = np.unique(paivat[::-1], return_index=True)
+            indeksit = len(paivat) - 1 - indeksit
+            self._kirjoita(t, paivat[indeksit], {s: a[indeksit] for s, a in arvot.items()})
+            tulos[t] = len(indeksit)
+        return tulos
+
+    def _kirjoita(self, ticker: str, paivat, arvot: dict):
+        hakemisto = os.path.join(self.hakemisto, ticker)
+        os.makedirs(hakemisto, exist_ok=True)
+        # Päiväsarake kirjoitetaan viimeisenä: sen mtime kertoo lukijoille, että data on vaihtunut
+        for sarake, taulukko in [*arvot.items(), (PAIVA, paivat)]:
+            valiaikainen = self._polku(ticker, sarake) + ".tmp.npy"
+            np.save(valiaikainen, taulukko)
+            os.replace(valiaikainen, self._polku(ticker, sarake))
+
+    def hinta(self, ticker: str, paiva):
+        """Päätöskurssi annettuna päivänä tai sitä edeltävänä kaupankäyntipäivänä.
+
+        Puuttuva kurssi (NaN) ohitetaan kuten puuttuva päivä. Palauttaa (päivä, hinta)
+        tai None, jos tickeriä tai aiempaa dataa ei ole.
+        """
+        sarakkeet = self.sarakkeet(ticker)
+        if sarakkeet is None:
+            return None
+        sulkeet = sarakkeet["close"]
+        i = int(np.searchsorted(sarakkeet[PAIVA], parsi_paiva(paiva), side="right")) - 1
+        while i >= 0 and np.isnan(sulkeet[i]):
+            i -= 1
+        if i < 0:
+            return None
+        return str(sarakkeet[PAIVA][i]), float(sulkeet[i])
+
+    def vali(self, ticker: str, alku, loppu, sarake: str = "close"):
+        """(päivät, arvot) väliltä [alku, loppu] nollakopiona mmap-taulukosta, tai None."""
+        sarakkeet = self.sarakkeet(ticker)
+        if sarakkeet is None:
+            return None
+        paivat = sarakkeet[PAIVA]
+        a = np.searchsorted(paivat, parsi_paiva(alku), side="left")
+        b = np.searchsorted(paivat, parsi_paiva(loppu), side="right")
+        return paivat[a:b], sarakkeet[sarake][a:b]
+
+    def koosteet(self, tickerit, alku, loppu, sarake: str = "close") -> dict:
+        """{ticker: {lkm, min, max, keskiarvo, ensimmainen, viimeinen, muutos_pros}} (None, jos ei dataa).
+
+        Puuttuvat arvot (NaN) jätetään pois; väli, jolla ei ole yhtään arvoa, on None.
+        """
+        tulos = {}
+        for ticker in map(_normalisoi_ticker, tickerit):
+            vali = self.vali(ticker, alku, loppu, sarake)
+            if vali is None:
+                tulos[ticker] = None
+                continue
+            paivat, arvot = vali
+            kelvolliset = ~np.isnan(arvot)
+            if not kelvolliset.all():
+                paivat, arvot = paivat[kelvolliset], arvot[kelvolliset]
+            if len(arvot) == 0:
+                tulos[ticker] = None
+                continue
+            ensimmainen, viimeinen = float(arvot[0]), float(arvot[-1])
+            tulos[ticker] = {
+                "lkm": int(len(arvot)),
+                "alku": str(paivat[0]),
+                "loppu": str(paivat[-1]),
+                "min": float(np.min(arvot)),
+                "max": float(np.max(arvot)),
+                "keskiarvo": float(np.mean(arvot)),
+                "ensimmainen": ensimmainen,
+                "viimeinen": viimeinen,
+                "muutos_pros": round(100.0 * (viimeinen - ensimmainen) / ensimmainen, 3) if ensimmainen else None,
+            }
+        return tulos
+
+
+# Prosessin yhteinen varasto
+hintavarasto = Hintavarasto()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "tuo":
+        print("Käyttö: python hintavarasto.py tuo TIEDOSTO.csv|TIEDOSTO.parquet [...]")
+        sys.exit(1)
+    for tiedosto in sys.argv[2:]:
+        for t, maara in hintavarasto.tuo(tiedosto).items():
+            print(f"{t}: {maara} päivää ({os.path.join(hintavarasto.hakemisto, t)})")
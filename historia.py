@@ -0,0 +1,225 @@
+# historia.py
+# Keskusteluhistorian tiivistys tokenibudjetilla. GroupChat lähettää jokaisella kierroksella
+# koko kasvavan keskustelun (myös suuret työkalutulokset, kuten ympäristö- ja käyttäjälistaukset),
+# jolloin kehotteen koko ja viive kasvavat istunnon mittaan. Agentin
+# `process_all_messages_before_reply`-koukku muokkaa vain LLM:lle lähtevää kopiota;
+# tallennettu historia säilyy ennallaan.
+#
+# Vaiheet (vanhat = kaikki paitsi HISTORY_KEEP_LAST viimeisintä viestiä):
+#   1. Toistuvat listaukset: vanha työkalutulos korvataan viittauksella, jos sama työkalu
+#      on myöhemmin ajettu samoilla argumenteilla tai tulos on sama.
+#   2. Jos budjetti ylittyy: vanhat työkalutulokset lyhennetään HISTORY_TOOL_MAX_CHARS-mittaisiksi.
+#   3. Jos budjetti ylittyy yhä: vanhimmat viestit korvataan juoksevalla tiivistelmällä
+#      (rivi per viesti, ilman ylimääräistä LLM-kutsua).
+#
+# Asetukset: HISTORY_TOKEN_BUDGET (0 = pois), HISTORY_KEEP_LAST, HISTORY_TOOL_MAX_CHARS,
+# HISTORY_SUMMARY_MAX_CHARS
+
+import os
+import json
+import functools
+import mittarit
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "6000"))
+HISTORY_KEEP_LAST = int(os.getenv("HISTORY_KEEP_LAST", "6"))
+HISTORY_TOOL_MAX_CHARS = int(os.getenv("HISTORY_TOOL_MAX_CHARS", "1200"))
+HISTORY_SUMMARY_MAX_CHARS = int(os.getenv("HISTORY_SUMMARY_MAX_CHARS", "4000"))
+
+TIIVISTELMA_OTSIKKO = "Tiivistelmä aiemmasta keskustelusta (vanhat viestit poistettu tokenibudjetin vuoksi):"
+
+# Kierroskohtaiset kehotetokenit ennen ja jälkeen tiivistyksen seurantaan (prosessin summat;
+# kierroskohtaiset jakaumat ovat /metrics-päätepisteessä, ks. mittarit.historia_tokenit)
+tilastot = {"kierrokset": 0, "tokenit_ennen": 0, "tokenit_jalkeen": 0, "tiivistetyt": 0}
+
+
+@functools.lru_cache(maxsize=1)
+def _koodain():
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def _teksti(sisalto) -> str:
+    if sisalto is None:
+        return ""
+    if isinstance(sisalto, str):
+        return sisalto
+    return json.dumps(sisalto, ensure_ascii=False)
+
+
+def laske_tokenit(teksti: str) -> int:
+    koodain = _koodain()
+    if koodain is None:
+        return len(teksti) // 4 + 1  # karkea arvio ilman tiktokenia
+    return len(koodain.encode(teksti, disallowed_special=()))
+
+
+def viestin_tokenit(viesti: dict) -> int:
+    tokenit = 4 + laske_tokenit(_teksti(viesti.get("content")))
+    if viesti.get("tool_calls"):
+        tokenit += laske_tokenit(json.dumps(viesti["tool_calls"], ensure_ascii=False))
+    for vastaus in viesti.get("tool_responses") or []:
+        tokenit += laske_tokenit(_teksti(vastaus.get("content")))
+    return tokenit
+
+
+def _tyokalukutsut(viestit) -> dict:
+    """tool_call_id -> (työkalun nimi, argumentit) kaikista viestien tool_calls-kentistä."""
+    kutsut = {}
+    for viesti in viestit:
+        for kutsu in viesti.get("tool_calls") or []:
+            funktio = kutsu.get("function", {})
+            kutsut[kutsu.get("id")] = (funktio.get("name", ""), funktio.get("arguments", ""))
+    return kutsut
+
+
+def _tulokset(viesti: dict):
+    """Viestin työkalutulokset: (tool_call_id, sisältö). Yksittäinen tool-viesti tai tool_responses."""
+    if viesti.get("tool_responses"):
+        return [(v.get("tool_call_id"), _teksti(v.get("content"))) for v in viesti["tool_responses"]]
+    if viesti.get("role") == "tool":
+        return [(viesti.get("tool_call_id"), _teksti(viesti.get("content")))]
+    return []
+
+
+def _korvaa_tulokset(viesti: dict, korvaa) -> dict:
+    """Kopio viestistä, jonka työkalutulosten sisältö on ajettu funktion korvaa(id, sisältö) läpi."""
+    if viesti.get("tool_responses"):
+        vastaukset = [dict(v, content=korvaa(v.get("tool_call_id"), _teksti(v.get("content"))))
+                      for v in viesti["tool_responses"]]
+        uusi = dict(viesti, tool_responses=vastaukset)
+        if isinstance(viesti.get("content"), str):
+            uusi["content"] = "\n\n".join(v["content"] for v in vastaukset)
+        return uusi
+    return dict(viesti, content=korvaa(viesti.get("tool_call_id"), _teksti(viesti.get("content"))))
+
+
+def _poista_toistot(viestit, raja: int, kutsut: dict):
+    """Vaihe 1: vanha tulos, jonka sama kutsu tai sama sisältö toistuu myöhemmin, korvataan viittauksella."""
+    myohemmat_kutsut, myohemmat_sisallot = set(), set()
+    tulos = list(viestit)
+    for i in range(len(viestit) - 1, -1, -1):
+        parit = _tulokset(viestit[i])
+        if not parit:
+            continue
+        if i < raja:
+            def korvaa(kutsu_id, sisalto):
+                nimi, argumentit = kutsut.get(kutsu_id, ("", ""))
+                if nimi and (nimi, argumentit) in myohemmat_kutsut:
+                    return f"[Vanhentunut tulos: {nimi} ajettiin myöhemmin uudelleen samoilla argumenteilla.]"
+                if len(sisalto) > 200 and sisalto in myohemmat_sisallot:
+                    return f"[Sama tulos kuin myöhemmässä {nimi or 'työkalun'} kutsussa.]"
+                return sisalto
+            tulos[i] = _korvaa_tulokset(viestit[i], korvaa)
+        for kutsu_id, sisalto in parit:
+            if kutsu_id in kutsut:
+                myohemmat_kutsut.add(kutsut[kutsu_id])
+            myohemmat_sisallot.add(sisalto)
+    return tulos
+
+
+def _lyhenna_tulokset(viestit, raja: int):
+    """Vaihe 2: vanhat työkalutulokset alkuosaan."""
+    def korvaa(kutsu_id, sisalto):
+        if len(sisalto) <= HISTORY_TOOL_MAX_CHARS:
+            return sisalto
+        return sisalto[:HISTORY_TOOL_MAX_CHARS] + f"\n… [lyhennetty, {len(sisalto) - HISTORY_TOOL_MAX_CHARS} merkkiä pois]"
+    return [_korvaa_tulokset(v, korvaa) if i < raja and _tulokset(v) else v for i, v in enumerate(viestit)]
+
+
+def _tiivistelmarivi(viesti: dict, kutsut: dict) -> str:
+    kuka = viesti.get("name") or viesti.get("role", "?")
+    if viesti.get("tool_calls"):
+        osat = []
+        for kutsu in viesti["tool_calls"]:
+            funktio = kutsu.get("function", {})
+            osat.append(f"{funktio.get('name', '?')}({_teksti(funktio.get('arguments'))[:80]})")
+        return f"- {kuka} kutsui: {', '.join(osat)}"
+    parit = _tulokset(viesti)
+    if parit:
+        return "\n".join(
+            f"  {kutsut.get(kutsu_id, ('työkalu', ''))[0]} -> {' '.join(sisalto.split())[:120]}"
+            for kutsu_id, sisalto in parit
+        )
+    return f"- {kuka}: {' '.join(_teksti(viesti.get('content')).split())[:200]}"
+
+
+def _tiivista_alku(viestit, raja: int, budjetti: int, kutsut: dict):
+    """Vaihe 3: korvaa vanhimmat viestit tiivistelmällä, kunnes budjetti riittää tai vanhat loppuvat."""
+    if viestit and _teksti(viestit[0].get("content")).startswith(TIIVISTELMA_OTSIKKO):
+        viestit = viestit[1:]  # aiempi tiivistelmä (esim. toisen agentin koukusta) korvataan
+        raja -= 1
+    tokenit = [viestin_tokenit(v) for v in viestit]
+    yhteensa = sum(tokenit)
+    leikkaus = 0
+    while leikkaus < raja and yhteensa > budjetti:
+        yhteensa -= tokenit[leikkaus]
+        leikkaus += 1
+    # Työkalun tulos ei saa jäädä ilman sitä edeltävää kutsua
+    while leikkaus < len(viestit) and _tulokset(viestit[leikkaus]):
+        leikkaus += 1
+    if leikkaus == 0:
+        return viestit
+    rivit = [_tiivistelmarivi(v, kutsut) for v in viestit[:leikkaus]]
+    teksti = "\n".join(rivit)
+    if len(teksti) > HISTORY_SUMMARY_MAX_CHARS:
+        # Juokseva tiivistelmä: uusimmat rivit säilyvät, vanhimmat putoavat pois
+        teksti = "… (vanhimmat rivit poistettu)\n" + teksti[-HISTORY_SUMMARY_MAX_CHARS:].split("\n", 1)[-1]
+    tiivistelma = {"role": "system", "content": f"{TIIVISTELMA_OTSIKKO}\n{teksti}"}
+    return [tiivistelma] + list(viestit[leikkaus:])
+
+
+def tiivista(viestit, budjetti: int = None, sailyta: int = None):
+    """Palauta LLM:lle lähetettävä, budjettiin mahtuva kopio viesteistä (alkuperäistä ei muuteta)."""
+    budjetti = HISTORY_TOKEN_BUDGET if budjetti is None else budjetti
+    sailyta = HISTORY_KEEP_LAST if sailyta is None else sailyta
+    if budjetti <= 0 or len(viestit) <= sailyta:
+        return viestit
+    raja = len(viestit) - sailyta
+    # Säilytettävä loppu ei saa alkaa työkalutuloksella (kutsu jäisi tiivistelmään)
+    while 0 < raja < len(viestit) and _tulokset(viestit[raja]):
+        raja -= 1
+    kutsut = _tyokalukutsut(viestit)
+
+    tulos = _poista_toistot(viestit, raja, kutsut)
+    if sum(map(viestin_tokenit, tulos)) > budjetti:
+        tulos = _lyhenna_tulokset(tulos, raja)
+    if sum(map(viestin_tokenit, tulos)) > budjetti:
+        tulos = _tiivista_alku(tulos, raja, budjetti, kutsut)
+    return tulos
+
+
+def historiakoukku(nimi: str):
+    """process_all_messages_before_reply-koukku, joka tiivistää ja kirjaa kierroksen kehotetokenit."""
+
+    def koukku(viestit):
+        ennen = sum(map(viestin_tokenit, viestit))
+        tulos = tiivista(viestit)
+        jalkeen = sum(map(viestin_tokenit, tulos)) if tulos is not viestit else ennen
+        tilastot["kierrokset"] += 1
+        tilastot["tokenit_ennen"] += ennen
+        tilastot["tokenit_jalkeen"] += jalkeen
+        mittarit.historia_tokenit.havainto(ennen, agentti=nimi, vaihe="ennen")
+        mittarit.historia_tokenit.havainto(jalkeen, agentti=nimi, vaihe="jalkeen")
+        if jalkeen < ennen:
+            tilastot["tiivistetyt"] += 1
+            mittarit.historia_saasto.havainto(ennen - jalkeen, agentti=nimi)
+            print(f"Historia: {nimi} {ennen} -> {jalkeen} kehotetokenia "
+                  f"({len(viestit)} -> {len(tulos)} viestiä, -{100 * (ennen - jalkeen) // ennen} %)")
+        else:
+            print(f"Historia: {nimi} {ennen} kehotetokenia ({len(viestit)} viestiä)")
+        return tulos
+
+    return koukku
+
+
+def kayta_historiaa(agentti):
+    """Rekisteröi tiivistys agentille (ei mitään, jos HISTORY_TOKEN_BUDGET=0)."""
+    if HISTORY_TOKEN_BUDGET > 0:
+        agentti.register_hook("process_all_messages_before_reply", historiakoukku(agentti.name))
+    return agentti
@@ -0,0 +1,160 @@
+# jaettu_tietokanta.py
+# Jaettu monivuokralainen MariaDB-tietokanta WordPress-ympäristöille (WP_SHARED_DB=1).
+# Yksi hallittu tietokantainstanssi (ENV_DIR/.shared-db) isännöi jokaiselle ympäristölle
+# oman tietokannan ja käyttäjän, jolloin ympäristöt tarvitsevat vain wordpress + wpcli
+# -palvelut eikä jokaiselle käynnistetä omaa mysql:5.7-konttia.
+
+import os
+import re
+import time
+import asyncio
+import hashlib
+import secrets
+from komennot import aja_komento
+
+SHARED_DB = os.getenv("WP_SHARED_DB", "0").lower() in ("1", "true", "yes")
+SHARED_DB_DIR = os.path.join(os.getenv("DOCKER_ENV_DIR", "./environments"), ".shared-db")
+SHARED_DB_IMAGE = os.getenv("WP_SHARED_DB_IMAGE", "mariadb:10.11")
+SHARED_DB_BUFFER_POOL = os.getenv("WP_SHARED_DB_BUFFER_POOL", "512M")
+SHARED_DB_READY_TIMEOUT = float(os.getenv("WP_SHARED_DB_READY_TIMEOUT", "120"))
+
+# Docker-verkko ja -alias, joiden kautta ympäristöt näkevät jaetun tietokannan
+VERKKO = "wp_shared_db"
+ISANTA = "wp-shared-db"
+
+_valmis = False
+_lukko = None
+
+
+def _root_salasana() -> str:
+    """Lue (tai luo ensimmäisellä kerralla) jaetun instanssin root-salasana."""
+    polku = os.path.join(SHARED_DB_DIR, "root_password")
+    if not os.path.exists(polku):
+        os.makedirs(SHARED_DB_DIR, exist_ok=True)
+        fd = os.open(polku, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(24))
+    with open(polku) as f:
+        return f.read().strip()
+
+
+def kirjoita_env_tiedosto(polku: str, muuttujat: dict):
+    """Kirjoita salaisuudet compose-tiedoston env_file-tiedostoon vain omistajan luettavaksi (0600).
+
+    Compose lukee tiedoston isännällä, joten salasanat eivät päädy compose-tiedostoihin.
+    """
+    fd = os.open(polku, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    os.fchmod(fd, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.writelines(f"{avain}={arvo}\n" for avain, arvo in muuttujat.items())
+
+
+def ilman_salasanaa(tunnukset: dict) -> dict:
+    """Tunnukset meta.jsoniin: salasana on vain ympäristön env-tiedostossa."""
+    return {k: v for k, v in tunnukset.items() if k != "password"}
+
+
+def _compose() -> str:
+    return f"""
+services:
+  db:
+    image: {SHARED_DB_IMAGE}
+    restart: always
+    command: --innodb-buffer-pool-size={SHARED_DB_BUFFER_POOL} --max-connections=500
+    env_file:
+      - root.env
+    volumes:
+      - shared_db_data:/var/lib/mysql
+    networks:
+      {VERKKO}:
+        aliases:
+          - {ISANTA}
+
+networks:
+  {VERKKO}:
+    name: {VERKKO}
+
+volumes:
+  shared_db_data:
+    name: wp_shared_db_data
+"""
+
+
+async def _sql(lause: str, salaiset=()):
+    """Aja SQL-lause root-käyttäjänä jaetussa instanssissa.
+
+    Lause menee stdinissä ja root-salasana luetaan kontin omasta MARIADB_ROOT_PASSWORD-muuttujasta,
+    joten kumpikaan ei näy komentorivillä, lokissa tai jäljessä.
+    """
+    return await aja_komento(
+        ["docker", "compose", "-f", "docker-compose.yml", "exec", "-T", "db",
+         "sh", "-c", 'MYSQL_PWD="$MARIADB_ROOT_PASSWORD" exec mariadb -uroot'],
+        cwd=SHARED_DB_DIR,
+        syote=lause,
+        salaiset=salaiset,
+    )
+
+
+async def varmista_kaynnissa():
+    """Käynnistä jaettu tietokanta tarvittaessa ja odota, että se vastaa."""
+    global _valmis, _lukko
+    if _valmis:
+        return
+    if _lukko is None:
+        _lukko = asyncio.Lock()
+    async with _lukko:
+        if _valmis:
+            return
+        os.makedirs(SHARED_DB_DIR, exist_ok=True)
+        kirjoita_env_tiedosto(os.path.join(SHARED_DB_DIR, "root.env"), {"MARIADB_ROOT_PASSWORD": _root_salasana()})
+        with open(os.path.join(SHARED_DB_DIR, "docker-compose.yml"), "w") as f:
+            f.write(_compose())
+        await aja_komento(["docker", "compose", "-f", "docker-compose.yml", "up", "-d"], cwd=SHARED_DB_DIR)
+        raja = time.monotonic() + SHARED_DB_READY_TIMEOUT
+        while True:
+            try:
+                await _sql("SELECT 1")
+                break
+            except Exception:
+                if time.monotonic() > raja:
+                    raise TimeoutError(f"jaettu tietokanta ei vastannut {SHARED_DB_READY_TIMEOUT:g} sekunnissa")
+                await asyncio.sleep(2)
+        _valmis = True
+
+
+def tunnukset(slug: str) -> dict:
+    """Ympäristön tietokannan nimi, käyttäjä ja uusi salasana (tunnisteet ovat aina turvallisia SQL:ssä)."""
+    luettava = re.sub(r"[^a-z0-9_]", "_", slug.lower())[:20]
+    tiiviste = hashlib.sha1(slug.encode()).hexdigest()[:8]
+    nimi = f"wp_{luettava}_{tiiviste}"
+    return {
+        "host": f"{ISANTA}:3306",
+        "name": nimi,
+        "user": nimi[:32],
+        "password": secrets.token_hex(16),
+    }
+
+
+async def luo_tietokanta(slug: str) -> dict:
+    """Luo ympäristölle oma tietokanta ja käyttäjä jaettuun instanssiin. Palauttaa tunnukset."""
+    await varmista_kaynnissa()
+    t = tunnukset(slug)
+    await _sql(
+        f"CREATE DATABASE IF NOT EXISTS `{t['name']}` CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci; "
+        f"CREATE USER IF NOT EXISTS '{t['user']}'@'%' IDENTIFIED BY '{t['password']}'; "
+        f"ALTER USER '{t['user']}'@'%' IDENTIFIED BY '{t['password']}'; "
+        f"GRANT ALL PRIVILEGES ON `{t['name']}`.* TO '{t['user']}'@'%'; "
+        f"FLUSH PRIVILEGES;",
+        salaiset=(t["password"],),
+    )
+    return t
+
+
+async def poista_tietokanta(tunnukset: dict):
+    """Poista ympäristön tietokanta ja käyttäjä jaetusta instanssista."""
+    await varmista_kaynnissa()
+    nimi = re.sub(r"[^A-Za-z0-9_]", "", tunnukset.get("name", ""))
+    kayttaja = re.sub(r"[^A-Za-z0-9_]", "", tunnukset.get("user", ""))
+    if not nimi or not kayttaja:
+        return
+    await _sql(f"DROP DATABASE IF EXISTS `{nimi}`; DROP USER IF EXISTS '{kayttaja}'@'%'; FLUSH PRIVILEGES;")
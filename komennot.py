@@ -0,0 +1,175 @@
+# komennot.py
+# Asynkroninen komentojen suoritus (asyncio.create_subprocess_exec).
+# Ei blokkaa Chainlitin tapahtumasilmukkaa, joten useampi istunto voi ajaa
+# docker-komentoja yhtä aikaa samassa app.py-workerissa.
+
+import asyncio
+import inspect
+import os
+import contextvars
+import mittarit
+
+# Kuinka monta aliprosessia saa olla käynnissä yhtä aikaa koko prosessissa
+CMD_MAX_CONCURRENCY = int(os.getenv("CMD_MAX_CONCURRENCY", "8"))
+# Oletusaikaraja sekunteina yhdelle komennolle (0 = ei aikarajaa)
+CMD_TIMEOUT = float(os.getenv("CMD_TIMEOUT", "600"))
+
+# Yhden tulosterivin maksimipituus (esim. docker ps --format json -rivit)
+_RIVIN_MAKSIMI = 1024 * 1024
+
+_semafori = None
+
+# Istuntokohtainen tulosteen vastaanottaja (virta, rivi), esim. Chainlit-striimaus.
+# Asetetaan viestinkäsittelijässä; työkalut välittävät sen näkyville tarkoitetuille komennoille.
+komentotuloste = contextvars.ContextVar("komentotuloste", default=None)
+
+
+class KomentoVirhe(RuntimeError):
+    """Komento palautti nollasta poikkeavan paluukoodin."""
+
+    def __init__(self, cmd, returncode, stderr):
+        self.cmd = list(cmd)
+        self.returncode = returncode
+        self.stderr = stderr
+        super().__init__(f"Komentovirhe: {returncode}: {stderr}")
+
+
+class KomentoAikakatkaisu(KomentoVirhe):
+    """Komento ei valmistunut annetussa ajassa ja se lopetettiin."""
+
+    def __init__(self, cmd, aikaraja):
+        self.cmd = list(cmd)
+        self.returncode = None
+        self.stderr = ""
+        self.aikaraja = aikaraja
+        RuntimeError.__init__(self, f"Aikakatkaisu: komento ei valmistunut {aikaraja:g} sekunnissa: {' '.join(cmd)}")
+
+
+def _hae_semafori():
+    global _semafori
+    if _semafori is None:
+        _semafori = asyncio.Semaphore(max(1, CMD_MAX_CONCURRENCY))
+    return _semafori
+
+
+def aseta_rinnakkaisuus(maara: int):
+    """Vaihda globaalia rinnakkaisuusrajaa (vaikuttaa uusiin komentoihin)."""
+    global CMD_MAX_CONCURRENCY, _semafori
+    CMD_MAX_CONCURRENCY = max(1, int(maara))
+    _semafori = asyncio.Semaphore(CMD_MAX_CONCURRENCY)
+
+
+async def _lue_rivit(stream, kohde, nimi, rivi_callback, salaiset=()):
+    async for raaka in stream:
+        rivi = raaka.decode(errors="replace").rstrip("\r\n")
+        if salaiset:
+            rivi = peita([rivi], salaiset)[0]
+        kohde.append(rivi)
+        if rivi_callback is not None:
+            tulos = rivi_callback(nimi, rivi)
+            if inspect.isawaitable(tulos):
+                await tulos
+
+
+async def _lopeta(proc):
+    """Tapa prosessi ja odota sen päättymistä (myös peruutuksen aikana)."""
+    if proc.returncode is None:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+    try:
+        await asyncio.shield(proc.wait())
+    except asyncio.CancelledError:
+        pass
+
+
+def peita(cmd, salaiset=()) -> list:
+    """Komentorivi lokeihin ja jälkeen: salaisuudet (myös osana argumenttia) korvattu '***':lla."""
+    salaiset = [s for s in salaiset if s]
+    tulos = []
+    for arg in map(str, cmd):
+        for salainen in salaiset:
+            arg = arg.replace(salainen, "***")
+        tulos.append(arg)
+    return tulos
+
+
+async def _kirjoita_syote(stdin, syote: bytes):
+    try:
+        stdin.write(syote)
+        await stdin.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        pass  # prosessi lopetti lukemisen; paluukoodi kertoo lopun
+    finally:
+        stdin.close()
+
+
+async def aja_komento(cmd, cwd=None, aikaraja=None, rivi_callback=None, rajoita=True,
+                      syote=None, salaiset=()) -> str:
+    """Suorita komento asynkronisesti ja palauta stdout tai nosta KomentoVirhe.
+
+    - `aikaraja` sekunteina; None = CMD_TIMEOUT, 0 = ei aikarajaa.
+    - `rivi_callback(virta, rivi)` kutsutaan jokaiselle stdout/stderr-riville
+      sitä mukaa kun niitä tulee ('stdout' tai 'stderr'). Saa olla async.
+    - `rajoita=False` ohittaa globaalin rinnakkaisuusrajan (pitkäkestoiset virrat).
+    - `syote` (str/bytes) kirjoitetaan komennon stdiniin; salaisuudet kuuluvat tänne, eivät argumentteihin.
+    - `salaiset`: merkkijonot, jotka peitetään komentorivistä, jokaisesta tulosteen rivistä
+      (myös rivi_callbackille ja paluuarvosta), jäljestä ja poikkeuksista.
+    - Peruutus (CancelledError) tappaa aliprosessin ennen kuin poikkeus nousee.
+    """
+    if aikaraja is None:
+        aikaraja = CMD_TIMEOUT
+    if isinstance(syote, str):
+        syote = syote.encode()
+    salaiset = [s for s in salaiset if s]
+    naytettava = peita(cmd, salaiset)
+    print(f"Suoritetaan: {' '.join(naytettava)} (cwd={cwd})")
+
+    semafori = _hae_semafori() if rajoita else None
+    if semafori is not None:
+        await semafori.acquire()
+    try:
+        # Kesto mitataan vasta rinnakkaisuusrajan jälkeen (jonotus ei ole komennon kestoa)
+        with mittarit.jakso("komento", mittarit.komennot, komento=mittarit.komennon_nimi(naytettava),
+                            komentorivi=" ".join(naytettava)[:300], cwd=cwd) as jakso:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                cwd=cwd,
+                stdin=asyncio.subprocess.DEVNULL if syote is None else asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                limit=_RIVIN_MAKSIMI,
+            )
+            stdout_rivit, stderr_rivit = [], []
+            osat = [
+                _lue_rivit(proc.stdout, stdout_rivit, "stdout", rivi_callback, salaiset),
+                _lue_rivit(proc.stderr, stderr_rivit, "stderr", rivi_callback, salaiset),
+                proc.wait(),
+            ]
+            if syote is not None:
+                osat.append(_kirjoita_syote(proc.stdin, syote))
+            valmis = asyncio.gather(*osat)
+            # Peruutuksen jälkeen gatherin poikkeus kuitataan luetuksi
+            valmis.add_done_callback(lambda f: f.cancelled() or f.exception())
+            try:
+                await asyncio.wait_for(valmis, timeout=aikaraja or None)
+            except asyncio.TimeoutError:
+                await _lopeta(proc)
+                jakso["paluukoodi"] = "aikakatkaisu"
+                raise KomentoAikakatkaisu(naytettava, aikaraja)
+            except BaseException:
+                valmis.cancel()
+                await _lopeta(proc)
+                jakso["paluukoodi"] = "keskeytetty"
+                raise
+            jakso["paluukoodi"] = proc.returncode
+            if proc.returncode != 0:
+                jakso["tulos"] = "virhe"
+    finally:
+        if semafori is not None:
+            semafori.release()
+
+    if proc.returncode != 0:
+        raise KomentoVirhe(naytettava, proc.returncode, "\n".join(stderr_rivit).strip())
+    return "\n".join(stdout_rivit).strip()
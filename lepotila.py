@@ -0,0 +1,244 @@
+# lepotila.py
+# Käyttämättömien ympäristöjen automaattinen lepotila ja herätys tarvittaessa.
+# wp_luo_ymparisto-ympäristöt (WordPress, MySQL ja `tail -f /dev/null` -wpcli) pitävät
+# muistia ja prosessoria varattuna, vaikka niihin ei olisi koskettu viikkoihin.
+#
+# Taustatehtävä seuraa jokaisen käynnissä olevan ympäristön viimeisintä aktiivisuutta:
+# - työkalut kirjaavat kohdeympäristönsä (kirjaa/heraa),
+# - konttien verkkoliikenne ja CPU-aika (Docker API:n stats tai `docker stats`) kierroksittain.
+# Kun ympäristö on ollut käyttämättä WP_IDLE_SUSPEND_AFTER sekuntia, se sammutetaan (rekisterin
+# status 'lepotila') tai WP_IDLE_MODE=wpcli -tilassa vain wpcli-sivukontti tauotetaan.
+# wp_*-työkalu, joka kohdistuu lepäävään ympäristöön, herättää sen ensin (heraa).
+#
+# Asetukset: WP_IDLE_SUSPEND_AFTER (sekuntia, 0 = pois; esim. 3600), WP_IDLE_MODE (stop | wpcli),
+# WP_IDLE_CHECK_INTERVAL, WP_IDLE_NET_BYTES (liikenne kierroksessa, joka lasketaan käytöksi),
+# WP_IDLE_CPU_PCT (CPU-prosentti, joka lasketaan käytöksi)
+
+import os
+import re
+import time
+import asyncio
+import docker_api
+from komennot import aja_komento
+from docker_tila import projektin_nimi
+from tila_valimuisti import tila_valimuisti
+
+ENV_DIR = os.getenv("DOCKER_ENV_DIR", "./environments")
+IDLE_SUSPEND_AFTER = float(os.getenv("WP_IDLE_SUSPEND_AFTER", "0"))
+IDLE_MODE = os.getenv("WP_IDLE_MODE", "stop").lower()
+IDLE_CHECK_INTERVAL = float(os.getenv("WP_IDLE_CHECK_INTERVAL", "60"))
+IDLE_NET_BYTES = int(os.getenv("WP_IDLE_NET_BYTES", "16384"))
+IDLE_CPU_PCT = float(os.getenv("WP_IDLE_CPU_PCT", "5"))
+
+# Rekisterin status sammutetulle lepääjälle (erottaa käyttäjän sammuttamista)
+LEPOTILA = "lepotila"
+SIVUKONTTI = "wpcli"
+
+_YKSIKOT = {"b": 1, "kb": 1e3, "mb": 1e6, "gb": 1e9, "tb": 1e12, "kib": 1024, "mib": 1024 ** 2, "gib": 1024 ** 3}
+
+
+def _tavut(teksti: str) -> float:
+    """'1.45kB' -> 1450.0 (docker stats -tulosteen yksiköt)."""
+    osuma = re.match(r"\s*([\d.]+)\s*([A-Za-z]*)", teksti)
+    if not osuma:
+        return 0.0
+    return float(osuma.group(1)) * _YKSIKOT.get(osuma.group(2).lower() or "b", 1)
+
+
+async def _tilastot_cli(projektit) -> dict:
+    """`docker stats --no-stream`: {projekti: {"verkko": tavuja, "cpu_pct": prosenttia}}."""
+    out = await aja_komento(["docker", "stats", "--no-stream", "--format", "{{.Name}}\t{{.CPUPerc}}\t{{.NetIO}}"])
+    # Kontin nimi on <projekti>-<palvelu>-<n>; pisin täsmäävä projekti voittaa
+    jarjestys = sorted(projektit, key=len, reverse=True)
+    tulos = {}
+    for rivi in out.splitlines():
+        osat = rivi.split("\t")
+        if len(osat) != 3:
+            continue
+        projekti = next((p for p in jarjestys if osat[0].startswith(p + "-")), None)
+        if projekti is None:
+            continue
+        summa = tulos.setdefault(projekti, {"verkko": 0.0, "cpu_pct": 0.0})
+        summa["cpu_pct"] += _tavut(osat[1].rstrip("%"))
+        summa["verkko"] += sum(_tavut(t) for t in osat[2].split("/"))
+    return tulos
+
+
+class Lepotila:
+    """Ympäristöjen aktiivisuusseuranta, lepotilaan siirto ja herätys."""
+
+    def __init__(self, raja: float = IDLE_SUSPEND_AFTER, tila: str = IDLE_MODE, env_dir: str = ENV_DIR,
+                 rekisteri=None):
+        self.raja = raja
+        self.tila = tila if tila in ("stop", "wpcli") else "stop"
+        self.env_dir = env_dir
+        # Työkalujen jaettu Rekisteri (kayta_rekisteria): ei omaa SQLite-yhteyttä eikä erillistä lukkoa
+        self._rekisteri = rekisteri
+        self._viimeisin = {}
+        self._naytteet = {}
+        self._lukot = {}
+        self._tehtava = None
+        # Mittarit
+        self.lepuutetut = 0
+        self.heratetyt = 0
+        self.heratysajat = []
+
+    def kayta_rekisteria(self, rekisteri):
+        """Aseta ympäristörekisteri (wordpress_tyokalut.alusta antaa omansa)."""
+        self._rekisteri = rekisteri
+
+    @property
+    def rekisteri(self):
+        if self._rekisteri is None:
+            raise RuntimeError("lepotilalle ei ole asetettu rekisteriä (kayta_rekisteria)")
+        return self._rekisteri
+
+    def _lukko(self, slug) -> asyncio.Lock:
+        if slug not in self._lukot:
+            self._lukot[slug] = asyncio.Lock()
+        return self._lukot[slug]
+
+    def kaynnista(self):
+        """Käynnistä ajastin taustalle (idempotentti, ei mitään jos WP_IDLE_SUSPEND_AFTER=0)."""
+        if self.raja <= 0:
+            return
+        if self._rekisteri is None:
+            print("Varoitus: lepotilaa ei käynnistetty, rekisteriä ei ole asetettu.")
+            return
+        if self._tehtava is None or self._tehtava.done():
+            self._tehtava = asyncio.get_running_loop().create_task(self._seuraa())
+
+    async def pysayta(self):
+        if self._tehtava is not None:
+            self._tehtava.cancel()
+            try:
+                await self._tehtava
+            except asyncio.CancelledError:
+                pass
+            self._tehtava = None
+
+    def kirjaa(self, slug: str):
+        """Ympäristöä käytettiin juuri nyt (työkalukutsu)."""
+        self._viimeisin[slug] = time.monotonic()
+
+    def unohda(self, slug: str):
+        for kartta in (self._viimeisin, self._naytteet, self._lukot):
+            kartta.pop(slug, None)
+
+    async def heraa(self, slug: str, env_path: str) -> bool:
+        """Herätä lepäävä ympäristö ennen työkalun suoritusta. Palauttaa True, jos herätettiin."""
+        # Kirjaus ennen lukkoa: käynnissä oleva tarkistus ei enää lepuuta tätä ympäristöä
+        self.kirjaa(slug)
+        async with self._lukko(slug):
+            rivi = self.rekisteri.hae(slug)
+            alku = time.monotonic()
+            if rivi and rivi.get("status") == LEPOTILA:
+                await docker_api.kaynnista(env_path)
+                self.rekisteri.paivita(slug, status="käynnissä")
+                tila_valimuisti.vanhenna()
+            elif (self.raja > 0 and self.tila == "wpcli"
+                  and (await tila_valimuisti.palvelut(slug)).get(SIVUKONTTI) == "paused"):
+                await docker_api.tauota(env_path, SIVUKONTTI, tauota=False)
+                tila_valimuisti.vanhenna()
+            else:
+                return False
+            self.kirjaa(slug)
+        kesto = time.monotonic() - alku
+        self.heratetyt += 1
+        self.heratysajat = (self.heratysajat + [kesto])[-500:]
+        print(f"Lepotila: '{slug}' herätetty {kesto:.1f} s:ssa.")
+        return True
+
+    async def _seuraa(self):
+        while True:
+            try:
+                await self.kierros()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Varoitus: lepotilan tarkistus epäonnistui: {e}")
+            await asyncio.sleep(IDLE_CHECK_INTERVAL)
+
+    async def _aktiiviset(self, projektit: dict):
+        """Päivitä viimeisin aktiivisuus konttien laskureista (liikenne tai CPU edellisestä näytteestä)."""
+        nyt = time.monotonic()
+        tilastot = await docker_api.tilastot(projektit)
+        if tilastot is None:
+            tilastot = await _tilastot_cli(projektit)
+        for projekti, slug in projektit.items():
+            naute = dict(tilastot.get(projekti, {}), aika=nyt)
+            edellinen = self._naytteet.get(slug)
+            self._naytteet[slug] = naute
+            if edellinen is None:
+                continue
+            liikenne = naute.get("verkko", 0) - edellinen.get("verkko", 0)
+            if "cpu_ns" in naute and "cpu_ns" in edellinen:
+                cpu = 100.0 * (naute["cpu_ns"] - edellinen["cpu_ns"]) / max((nyt - edellinen["aika"]) * 1e9, 1.0)
+            else:
+                cpu = naute.get("cpu_pct", 0.0)
+            # Negatiivinen erotus = kontti käynnistettiin uudelleen (laskurit nollautuivat)
+            if liikenne > IDLE_NET_BYTES or liikenne < 0 or cpu > IDLE_CPU_PCT:
+                self.kirjaa(slug)
+
+    async def kierros(self):
+        """Yksi tarkistus: laskurit, ja raja-ajan ylittäneet lepotilaan."""
+        tilat = await tila_valimuisti.projektien_tilat()
+        kaynnissa = {}
+        for rivi in self.rekisteri.listaa():
+            slug = rivi["slug"]
+            palvelut = tilat.get(projektin_nimi(slug), {})
+            if not rivi["has_compose"] or not any(t == "running" for t in palvelut.values()):
+                continue
+            if self.tila == "wpcli" and palvelut.get(SIVUKONTTI) != "running":
+                continue
+            kaynnissa[projektin_nimi(slug)] = slug
+            self._viimeisin.setdefault(slug, time.monotonic())
+        if not kaynnissa:
+            return
+        await self._aktiiviset(kaynnissa)
+        nyt = time.monotonic()
+        for slug in kaynnissa.values():
+            if nyt - self._viimeisin[slug] > self.raja:
+                await self._lepuuta(slug)
+
+    async def _lepuuta(self, slug: str):
+        env_path = os.path.join(self.env_dir, slug)
+        lukko = self._lukko(slug)
+        if lukko.locked():
+            return
+        async with lukko:
+            # Työkalu on voinut käyttää ympäristöä tarkistuksen aikana
+            if time.monotonic() - self._viimeisin.get(slug, 0) <= self.raja:
+                return
+            try:
+                if self.tila == "wpcli":
+                    await docker_api.tauota(env_path, SIVUKONTTI)
+                else:
+                    await docker_api.pysayta(env_path)
+                    self.rekisteri.paivita(slug, status=LEPOTILA)
+            except Exception as e:
+                print(f"Varoitus: ympäristön '{slug}' siirto lepotilaan epäonnistui: {e}")
+                return
+            finally:
+                tila_valimuisti.vanhenna()
+        self._naytteet.pop(slug, None)
+        self.lepuutetut += 1
+        kohde = "wpcli tauotettu" if self.tila == "wpcli" else "sammutettu"
+        print(f"Lepotila: '{slug}' käyttämättä yli {self.raja:g} s, {kohde}.")
+
+    def tilastot(self) -> dict:
+        ajat = sorted(self.heratysajat)
+        nyt = time.monotonic()
+        return {
+            "raja_s": self.raja,
+            "tila": self.tila,
+            "seurattavat": len(self._viimeisin),
+            "lepuutetut": self.lepuutetut,
+            "heratetyt": self.heratetyt,
+            "heratys_p50_s": round(ajat[len(ajat) // 2], 3) if ajat else None,
+            "kayttamatta_s": {s: round(nyt - t) for s, t in sorted(self._viimeisin.items())},
+        }
+
+
+# Prosessin yhteinen ajastin
+lepotila = Lepotila()
@@ -0,0 +1,191 @@
+# llm_valimuisti.py
+# Sisältöosoitteellinen LLM-vastausvälimuisti. Avain on SHA-256 mallista, viesteistä ja
+# työkaluista (kanonisessa JSON-muodossa), joten sama kehote samoilla työkaluilla
+# palautetaan levyltä eikä sitä laskuteta uudelleen. Koko on rajattu: vähiten äskettäin
+# käytetyt vastaukset poistetaan, kun LLM_CACHE_MAX_MB ylittyy.
+#
+# Toteuttaa autogenin välimuistiprotokollan (get/set/close + with-lohko), joten sen voi
+# antaa suoraan initiate_chat(cache=...) -parametrina. Samaa tallennusta käyttää myös
+# paikallinen OpenAI-yhteensopiva toistopalvelin (mock_openai.py): vastaukset tallennetaan
+# OpenAI:n JSON-muodossa, joten kummankin nauhoitukset kelpaavat toiselle.
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+LLM_CACHE = os.getenv("LLM_CACHE", "1").lower() in ("1", "true", "yes")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm.sqlite3"))
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "200"))
+
+# Avaimeen otettavat pyynnön kentät (muut, kuten timeout tai stream, eivät muuta vastausta)
+AVAINKENTAT = ("model", "messages", "tools", "tool_choice", "functions", "response_format")
+
+
+def sisaltoavain(pyynto: dict) -> str:
+    """Pyynnön sisältöosoite: sha256(kanoninen JSON mallista, viesteistä ja työkaluista)."""
+    sisalto = {k: pyynto[k] for k in AVAINKENTAT if pyynto.get(k) is not None}
+    data = json.dumps(sisalto, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class LLMValimuisti:
+    """SQLite-pohjainen, kokorajattu vastausvälimuisti (säieturvallinen, autogen kutsuu säikeistä)."""
+
+    def __init__(self, polku: str = LLM_CACHE_PATH, maksimi_mb: float = LLM_CACHE_MAX_MB):
+        self.polku = polku
+        self.maksimi_tavut = int(maksimi_mb * 1024 * 1024)
+        self._conn = None
+        self._lukko = threading.Lock()
+        self.osumat = 0
+        self.ohitukset = 0
+
+    def _yhteys(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.polku)), exist_ok=True)
+            self._conn = sqlite3.connect(self.polku, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS vastaukset ("
+                "avain TEXT PRIMARY KEY, arvo TEXT NOT NULL, koko INTEGER NOT NULL, "
+                "luotu REAL NOT NULL, kaytetty REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_vastaukset_kaytetty ON vastaukset(kaytetty)")
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def _avain(key) -> str:
+        """autogenin avain on pyynnön JSON: poimitaan siitä sisältökentät. Muut avaimet tiivistetään sellaisenaan."""
+        if isinstance(key, dict):
+            return sisaltoavain(key)
+        try:
+            pyynto = json.loads(key)
+            if isinstance(pyynto, dict) and "messages" in pyynto:
+                return sisaltoavain(pyynto)
+        except (TypeError, ValueError):
+            pass
+        return hashlib.sha256(str(key).encode("utf-8")).hexdigest()
+
+    def hae_json(self, key):
+        """Tallennettu vastaus OpenAI:n JSON-muodossa (dict) tai None."""
+        avain = self._avain(key)
+        with self._lukko:
+            conn = self._yhteys()
+            rivi = conn.execute("SELECT arvo FROM vastaukset WHERE avain=?", (avain,)).fetchone()
+            if rivi is None:
+                self.ohitukset += 1
+                return None
+            conn.execute("UPDATE vastaukset SET kaytetty=? WHERE avain=?", (time.time(), avain))
+            conn.commit()
+        self.osumat += 1
+        return json.loads(rivi[0])
+
+    def aseta_json(self, key, vastaus: dict):
+        self._kirjoita(self._avain(key), json.dumps(vastaus, ensure_ascii=False, default=str))
+
+    def _kirjoita(self, avain: str, data: str):
+        nyt = time.time()
+        with self._lukko:
+            conn = self._yhteys()
+            conn.execute(
+                "INSERT OR REPLACE INTO vastaukset (avain, arvo, koko, luotu, kaytetty) VALUES (?, ?, ?, ?, ?)",
+                (avain, data, len(data), nyt, nyt),
+            )
+            self._karsi(conn)
+            conn.commit()
+
+    def get(self, key, default=None):
+        """autogen: palauta ChatCompletion-olio (autogen lisää siihen omat attribuuttinsa)."""
+        vastaus = self.hae_json(key)
+        if vastaus is None:
+            return default
+        from openai.types.chat import ChatCompletion
+        return ChatCompletion.model_validate(vastaus)
+
+    def set(self, key, value):
+        """autogen: tallenna vastaus JSON-muodossa (ei olion sisäisiä viittauksia asiakkaaseen)."""
+        if hasattr(value, "model_dump"):
+            vastaus = value.model_dump(mode="json", exclude={"message_retrieval_function"})
+            if getattr(value, "cost", None) is not None:
+                vastaus["cost"] = value.cost
+        elif isinstance(value, dict):
+            vastaus = value
+        else:
+            return
+        self.aseta_json(key, vastaus)
+
+    def vie(self, tiedosto: str) -> int:
+        """Vie kaikki vastaukset JSONL-tiedostoon ({"avain", "vastaus"} per rivi), esim. CI:n nauhoitukseksi."""
+        with self._lukko:
+            rivit = self._yhteys().execute("SELECT avain, arvo FROM vastaukset ORDER BY luotu").fetchall()
+        with open(tiedosto, "w", encoding="utf-8") as f:
+            for avain, arvo in rivit:
+                f.write(json.dumps({"avain": avain, "vastaus": json.loads(arvo)}, ensure_ascii=False) + "\n")
+        return len(rivit)
+
+    def tuo(self, tiedosto: str) -> int:
+        """Tuo vie()-tiedoston vastaukset (avaimet ovat jo sisältöosoitteita, joten ne säilyvät)."""
+        maara = 0
+        with open(tiedosto, encoding="utf-8") as f:
+            for rivi in f:
+                if rivi.strip():
+                    d = json.loads(rivi)
+                    self._kirjoita(d["avain"], json.dumps(d["vastaus"], ensure_ascii=False))
+                    maara += 1
+        return maara
+
+    def _karsi(self, conn):
+        """Poista vähiten äskettäin käytettyjä, kunnes koko on alle 90 % rajasta."""
+        yhteensa = conn.execute("SELECT COALESCE(SUM(koko), 0) FROM vastaukset").fetchone()[0]
+        if yhteensa <= self.maksimi_tavut:
+            return
+        tavoite = int(self.maksimi_tavut * 0.9)
+        for avain, koko in conn.execute("SELECT avain, koko FROM vastaukset ORDER BY kaytetty").fetchall():
+            if yhteensa <= tavoite:
+                break
+            conn.execute("DELETE FROM vastaukset WHERE avain=?", (avain,))
+            yhteensa -= koko
+
+    def tilastot(self) -> dict:
+        with self._lukko:
+            maara, koko = self._yhteys().execute(
+                "SELECT COUNT(*), COALESCE(SUM(koko), 0) FROM vastaukset"
+            ).fetchone()
+        yhteensa = self.osumat + self.ohitukset
+        return {
+            "vastauksia": maara,
+            "koko_mb": round(koko / 1024 / 1024, 2),
+            "maksimi_mb": round(self.maksimi_tavut / 1024 / 1024, 2),
+            "osumat": self.osumat,
+            "ohitukset": self.ohitukset,
+            "osumaprosentti": round(100.0 * self.osumat / yhteensa, 1) if yhteensa else None,
+        }
+
+    def close(self):
+        with self._lukko:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # autogen käyttää välimuistia with-lohkossa jokaisella kutsulla; yhteys pidetään auki
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_valimuisti = None
+
+
+def llm_valimuisti():
+    """Prosessin yhteinen välimuisti tai None, jos LLM_CACHE=0."""
+    global _valimuisti
+    if not LLM_CACHE:
+        return None
+    if _valimuisti is None:
+        _valimuisti = LLMValimuisti()
+    return _valimuisti
@@ -5,6 +5,7 @@ import os
 from tyokalut import stock_price_tool 
 
 from autogen import ConversableAgent, config_list_openai_aoai
+from llm_valimuisti import llm_valimuisti
 
 # --- 1. Aseta LLM-asetukset ---
 # LLM = Large Language Model (Suuri Kielimalli)
@@ -19,6 +20,11 @@ if config_list and 'model' not in config_list[0]:
         # Käytä mallin nimeä, jonka haluat:
         config["model"] = "gpt-4o-mini" # TAI "gpt-3.5-turbo"
 
+# Paikallinen toistopalvelin (mock_openai.py) tai muu OpenAI-yhteensopiva osoite
+if os.environ.get("LLM_BASE_URL"):
+    for config in config_list:
+        config["base_url"] = os.environ["LLM_BASE_URL"]
+
 # Haetaan työkalun skeema (sanahirja)
 function_details = stock_price_tool.schema
 
@@ -74,6 +80,7 @@ if __name__ == "__main__":
     user_proxy.initiate_chat(
         assistant,
         message=aloitus_viesti,
+        cache=llm_valimuisti(),  # sama kehote -> vastaus levyltä (LLM_CACHE=0 poistaa käytöstä)
     )
     
     print(f"--- Keskustelu päättyi ---")
\ No newline at end of file
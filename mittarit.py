@@ -0,0 +1,267 @@
+# mittarit.py
+# Kevyt instrumentointi: ajastetut jaksot (työkalut, aliprosessit, LLM-kutsut, puhujavalinta,
+# Chainlit-käsittelijät) ja historian tiivistyksen tokenit Prometheus-histogrammeiksi ja
+# valinnaisesti JSONL-jäljeksi.
+# Histogrammit tarjoillaan paikallisesta HTTP-päätepisteestä Prometheuksen tekstimuodossa
+# (/metrics), joten hitaan kierroksen syy näkyy ilman print-lokien kaivamista.
+#
+# Ei ulkoisia riippuvuuksia: tekstimuoto ja palvelin ovat standardikirjastolla.
+#
+# Asetukset: METRICS_PORT (oletus 9464, 0 = ei päätepistettä), METRICS_HOST (oletus 127.0.0.1),
+# TRACE_FILE (JSONL-jälki, oletus pois)
+
+import os
+import json
+import time
+import inspect
+import functools
+import threading
+import contextlib
+import contextvars
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+
+SEKUNTIRAJAT = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKENIRAJAT = (16, 64, 256, 1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072)
+
+
+class Histogrammi:
+    """Prometheus-histogrammi nimikkeillä (säieturvallinen; LLM-kutsut tulevat executor-säikeistä)."""
+
+    def __init__(self, nimi: str, kuvaus: str, nimikkeet=(), rajat=SEKUNTIRAJAT):
+        self.nimi = nimi
+        self.kuvaus = kuvaus
+        self.nimikkeet = tuple(nimikkeet)
+        self.rajat = tuple(rajat)
+        self._sarjat = {}
+        self._lukko = threading.Lock()
+
+    def havainto(self, arvo: float, **nimikkeet):
+        avain = tuple(str(nimikkeet.get(n, "")) for n in self.nimikkeet)
+        with self._lukko:
+            sarja = self._sarjat.get(avain)
+            if sarja is None:
+                sarja = self._sarjat[avain] = {"korit": [0] * len(self.rajat), "summa": 0.0, "maara": 0}
+            for i, raja in enumerate(self.rajat):
+                if arvo <= raja:
+                    sarja["korit"][i] += 1
+            sarja["summa"] += arvo
+            sarja["maara"] += 1
+
+    def teksti(self) -> str:
+        rivit = [f"# HELP {self.nimi} {self.kuvaus}", f"# TYPE {self.nimi} histogram"]
+        with self._lukko:
+            sarjat = [(avain, dict(s, korit=list(s["korit"]))) for avain, s in sorted(self._sarjat.items())]
+        for avain, sarja in sarjat:
+            nimikkeet = [f'{n}="{_pakene(v)}"' for n, v in zip(self.nimikkeet, avain)]
+            for raja, maara in zip(self.rajat, sarja["korit"]):
+                korinimikkeet = ",".join(nimikkeet + ['le="%g"' % raja])
+                rivit.append(f"{self.nimi}_bucket{{{korinimikkeet}}} {maara}")
+            korinimikkeet = ",".join(nimikkeet + ['le="+Inf"'])
+            rivit.append(f"{self.nimi}_bucket{{{korinimikkeet}}} {sarja['maara']}")
+            loppu = f"{{{','.join(nimikkeet)}}}" if nimikkeet else ""
+            rivit.append(f"{self.nimi}_sum{loppu} {sarja['summa']:.6f}")
+            rivit.append(f"{self.nimi}_count{loppu} {sarja['maara']}")
+        return "\n".join(rivit) + "\n"
+
+
+def _pakene(arvo: str) -> str:
+    return arvo.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+tyokalut = Histogrammi("autogen_tyokalu_kesto_sekunnit", "Työkalufunktioiden kesto", ("tyokalu", "tulos"))
+komennot = Histogrammi("autogen_komento_kesto_sekunnit", "Aliprosessien (docker ym.) kesto", ("komento", "paluukoodi"))
+llm = Histogrammi("autogen_llm_kesto_sekunnit", "LLM-kutsujen kesto", ("rooli", "malli"))
+llm_tokenit = Histogrammi("autogen_llm_tokenit", "LLM-kutsujen tokenit", ("rooli", "tyyppi"), TOKENIRAJAT)
+puhujavalinta = Histogrammi("autogen_puhujavalinta_kesto_sekunnit", "GroupChatin puhujavalinnan kesto", ("valittu",))
+kasittelijat = Histogrammi("chainlit_kasittelija_kesto_sekunnit", "Chainlit-käsittelijöiden kesto", ("kasittelija", "tulos"))
+historia_tokenit = Histogrammi("autogen_historia_tokenit", "Kierroksen kehotetokenit ennen ja jälkeen historian tiivistyksen",
+                               ("agentti", "vaihe"), TOKENIRAJAT)
+historia_saasto = Histogrammi("autogen_historia_saasto_tokenit", "Historian tiivistyksen säästämät tokenit (vain tiivistetyt kierrokset)",
+                              ("agentti",), TOKENIRAJAT)
+HISTOGRAMMIT = (tyokalut, komennot, llm, llm_tokenit, puhujavalinta, kasittelijat, historia_tokenit, historia_saasto)
+
+
+# --- Jäljitys ---
+
+_nykyinen_jakso = contextvars.ContextVar("nykyinen_jakso", default=None)
+_jalki = None
+_jalki_lukko = threading.Lock()
+
+
+def _kirjoita_jalki(tietue: dict):
+    global _jalki
+    if not TRACE_FILE:
+        return
+    rivi = json.dumps(tietue, ensure_ascii=False, default=str) + "\n"
+    with _jalki_lukko:
+        if _jalki is None:
+            os.makedirs(os.path.dirname(os.path.abspath(TRACE_FILE)), exist_ok=True)
+            _jalki = open(TRACE_FILE, "a", buffering=1, encoding="utf-8")
+        _jalki.write(rivi)
+
+
+@contextlib.contextmanager
+def jakso(nimi: str, histogrammi: Histogrammi = None, **attribuutit):
+    """Ajasta lohko: kesto histogrammiin (nimikkeet attribuuteista) ja JSONL-jälkeen.
+
+    Lohkon sisällä voi täydentää attribuutteja (esim. paluukoodi) muokkaamalla tuotettua dictiä.
+    Sisäkkäiset jaksot saavat vanhemman tunnisteen contextvarista (myös asyncio-tehtäviin).
+    """
+    jakso_id = os.urandom(8).hex()
+    vanhempi = _nykyinen_jakso.get()
+    merkki = _nykyinen_jakso.set(jakso_id)
+    alku = time.perf_counter()
+    seinakello = time.time()
+    try:
+        yield attribuutit
+    except BaseException as e:
+        attribuutit.setdefault("tulos", "virhe")
+        attribuutit.setdefault("virhe", f"{type(e).__name__}: {e}"[:300])
+        raise
+    finally:
+        kesto = time.perf_counter() - alku
+        _nykyinen_jakso.reset(merkki)
+        attribuutit.setdefault("tulos", "ok")
+        if histogrammi is not None:
+            histogrammi.havainto(kesto, **attribuutit)
+        _kirjoita_jalki({
+            "aika": seinakello, "nimi": nimi, "kesto_ms": round(kesto * 1000, 3),
+            "jakso": jakso_id, "vanhempi": vanhempi, **attribuutit,
+        })
+
+
+def ajastettu(nimi: str, histogrammi: Histogrammi, **attribuutit):
+    """Koristin jakso()-ajastukselle; toimii sekä tavallisille että async-funktioille.
+
+    Merkkijonopaluuarvo, joka alkaa 'Virhe', kirjataan tulokseksi 'virhe' (työkalut palauttavat virheensä).
+    """
+    def koristin(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def kaare(*args, **kwargs):
+                with jakso(nimi, histogrammi, **attribuutit) as a:
+                    tulos = await func(*args, **kwargs)
+                    if isinstance(tulos, str) and tulos.startswith("Virhe"):
+                        a["tulos"] = "virhe"
+                    return tulos
+        else:
+            @functools.wraps(func)
+            def kaare(*args, **kwargs):
+                with jakso(nimi, histogrammi, **attribuutit) as a:
+                    tulos = func(*args, **kwargs)
+                    if isinstance(tulos, str) and tulos.startswith("Virhe"):
+                        a["tulos"] = "virhe"
+                    return tulos
+        return kaare
+    return koristin
+
+
+def tyokalu(nimi: str):
+    return ajastettu(f"tyokalu:{nimi}", tyokalut, tyokalu=nimi)
+
+
+def kasittelija(nimi: str):
+    return ajastettu(f"chainlit:{nimi}", kasittelijat, kasittelija=nimi)
+
+
+def komennon_nimi(cmd) -> str:
+    """Matalan kardinaliteetin nimike komennolle: ohjelma ja alikomennot ilman lippuja ja tiedostoja."""
+    osat = [os.path.basename(str(cmd[0]))] if cmd else []
+    ohita = False
+    for osa in map(str, cmd[1:]):
+        if ohita:
+            ohita = False
+            continue
+        if osa in ("-f", "--file", "-p", "--project-name", "--filter", "--format", "--since"):
+            ohita = True
+            continue
+        if osa.startswith("-") or "/" in osa or "." in osa:
+            continue
+        osat.append(osa)
+        if len(osat) == 3:
+            break
+    return " ".join(osat)
+
+
+def mittaa_llm(client, rooli: str):
+    """Kääri OpenAIWrapper-olion create(): kesto ja tokenit rooleittain (ja JSONL-jälkeen)."""
+    alkuperainen = client.create
+
+    @functools.wraps(alkuperainen)
+    def create(**config):
+        malli = config.get("model") or ""
+        with jakso(f"llm:{rooli}", llm, rooli=rooli, malli=malli) as a:
+            vastaus = alkuperainen(**config)
+            a["malli"] = getattr(vastaus, "model", None) or malli
+            kaytto = getattr(vastaus, "usage", None)
+            if kaytto is not None:
+                for tyyppi in ("prompt_tokens", "completion_tokens"):
+                    maara = getattr(kaytto, tyyppi, None)
+                    if maara is not None:
+                        a[tyyppi] = maara
+                        llm_tokenit.havainto(maara, rooli=rooli, tyyppi=tyyppi.split("_")[0])
+            return vastaus
+
+    client.create = create
+    return client
+
+
+def mittaa_puhujavalinta(groupchat):
+    """Ajasta GroupChat.a_select_speaker (säännöt ja mahdollinen LLM-valinta yhdessä)."""
+    alkuperainen = groupchat.a_select_speaker
+
+    @functools.wraps(alkuperainen)
+    async def a_select_speaker(*args, **kwargs):
+        with jakso("puhujavalinta", puhujavalinta) as a:
+            valittu = await alkuperainen(*args, **kwargs)
+            a["valittu"] = getattr(valittu, "name", str(valittu))
+            return valittu
+
+    groupchat.a_select_speaker = a_select_speaker
+    return groupchat
+
+
+# --- HTTP-päätepiste ---
+
+def teksti() -> str:
+    return "".join(h.teksti() for h in HISTOGRAMMIT)
+
+
+_palvelin = None
+
+
+def kaynnista_palvelin(portti: int = None, isanta: str = None):
+    """Käynnistä /metrics-päätepiste taustasäikeeseen (idempotentti; METRICS_PORT=0 = pois)."""
+    global _palvelin
+    portti = METRICS_PORT if portti is None else portti
+    if _palvelin is not None or not portti:
+        return _palvelin
+    # http.server tuodaan vasta tässä: komennot.py (ja vale_docker.py) tuovat tämän moduulin
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Kasittelija(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            runko = teksti().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(runko)))
+            self.end_headers()
+            self.wfile.write(runko)
+
+    try:
+        _palvelin = ThreadingHTTPServer((isanta or METRICS_HOST, portti), Kasittelija)
+    except OSError as e:
+        print(f"Varoitus: mittaripäätepistettä ei voitu käynnistää porttiin {portti}: {e}")
+        return None
+    threading.Thread(target=_palvelin.serve_forever, name="mittarit", daemon=True).start()
+    print(f"Mittarit: http://{isanta or METRICS_HOST}:{portti}/metrics")
+    return _palvelin
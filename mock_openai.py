@@ -0,0 +1,186 @@
+# mock_openai.py
+# Paikallinen OpenAI-yhteensopiva palvelin nauhoitettujen keskustelujen toistoon.
+# Vastaukset haetaan samasta sisältöosoitteellisesta tallennuksesta kuin LLM-välimuisti
+# (llm_valimuisti.py), joten agenttikeskustelut voi ajaa CI:ssä ja kuormitustesteissä
+# ilman verkkoa. Agentit ohjataan palvelimelle config_listin base_url-kentällä (LLM_BASE_URL).
+#
+#   python mock_openai.py                                   # toisto; puuttuva vastaus -> 404
+#   python mock_openai.py --oletus                          # puuttuva -> deterministinen vastaus
+#   python mock_openai.py --nauhoita https://api.openai.com/v1   # puuttuva haetaan ja tallennetaan
+#   python mock_openai.py vie nauhoitus.jsonl | tuo nauhoitus.jsonl
+
+import os
+import sys
+import json
+import time
+import argparse
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from llm_valimuisti import LLMValimuisti, LLM_CACHE_PATH, sisaltoavain
+
+
+def oletusvastaus(pyynto: dict) -> dict:
+    """Deterministinen vastaus nauhoittamattomaan pyyntöön: toistaa viimeisen käyttäjäviestin alun."""
+    viimeinen = next((m for m in reversed(pyynto.get("messages", [])) if m.get("role") == "user"), {})
+    sisalto = viimeinen.get("content") or ""
+    if not isinstance(sisalto, str):
+        sisalto = json.dumps(sisalto, ensure_ascii=False)
+    return {
+        "id": "chatcmpl-mock-" + sisaltoavain(pyynto)[:16],
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": pyynto.get("model", "mock"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": f"[mock] {sisalto[:200]}"},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+def sse_palat(vastaus: dict):
+    """Muunna valmis chat.completion stream=true -muotoisiksi chat.completion.chunk-paloiksi."""
+    for valinta in vastaus.get("choices", []):
+        viesti = valinta.get("message", {})
+        delta = {"role": "assistant", "content": viesti.get("content")}
+        if viesti.get("tool_calls"):
+            delta["tool_calls"] = [dict(k, index=i) for i, k in enumerate(viesti["tool_calls"])]
+        yield {
+            "id": vastaus.get("id"), "object": "chat.completion.chunk", "created": vastaus.get("created"),
+            "model": vastaus.get("model"),
+            "choices": [{"index": valinta.get("index", 0), "delta": delta, "finish_reason": None}],
+        }
+        yield {
+            "id": vastaus.get("id"), "object": "chat.completion.chunk", "created": vastaus.get("created"),
+            "model": vastaus.get("model"),
+            "choices": [{"index": valinta.get("index", 0), "delta": {}, "finish_reason": valinta.get("finish_reason")}],
+        }
+
+
+class Kasittelija(BaseHTTPRequestHandler):
+    valimuisti = None
+    ylavirta = None
+    oletus = False
+    vastaaja = None
+    viive = 0.0
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _laheta_json(self, tila: int, data: dict):
+        runko = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(tila)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(runko)))
+        self.end_headers()
+        self.wfile.write(runko)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._laheta_json(200, {"object": "list", "data": [{"id": "mock", "object": "model", "owned_by": "mock"}]})
+        else:
+            self._laheta_json(404, {"error": {"message": "Tuntematon polku", "type": "not_found"}})
+
+    def do_POST(self):
+        pituus = int(self.headers.get("Content-Length", "0"))
+        try:
+            pyynto = json.loads(self.rfile.read(pituus) or b"{}")
+        except ValueError:
+            return self._laheta_json(400, {"error": {"message": "Virheellinen JSON", "type": "invalid_request_error"}})
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._laheta_json(404, {"error": {"message": "Tuntematon polku", "type": "not_found"}})
+
+        vastaus = self.valimuisti.hae_json(pyynto)
+        lahde = "toisto"
+        if vastaus is None and self.ylavirta:
+            try:
+                vastaus = self._hae_ylavirrasta(pyynto)
+            except urllib.error.HTTPError as e:
+                return self._laheta_json(e.code, json.loads(e.read() or b"{}"))
+            self.valimuisti.aseta_json(pyynto, vastaus)
+            lahde = "nauhoitus"
+        elif vastaus is None and self.vastaaja:
+            vastaus, lahde = self.vastaaja(pyynto), "skripti"
+        elif vastaus is None and self.oletus:
+            vastaus, lahde = oletusvastaus(pyynto), "oletus"
+        elif vastaus is None:
+            print(f"mock_openai: ei nauhoitusta ({sisaltoavain(pyynto)[:12]})")
+            return self._laheta_json(404, {"error": {
+                "message": "Pyynnölle ei ole nauhoitettua vastausta", "type": "replay_miss",
+            }})
+        print(f"mock_openai: {lahde} {sisaltoavain(pyynto)[:12]}")
+        if self.viive:
+            time.sleep(self.viive)
+
+        if pyynto.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for pala in sse_palat(vastaus):
+                self.wfile.write(f"data: {json.dumps(pala, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+        else:
+            self._laheta_json(200, vastaus)
+
+    def _hae_ylavirrasta(self, pyynto: dict) -> dict:
+        """Hae vastaus oikealta rajapinnalta (aina ilman streamia, jotta sen voi tallentaa)."""
+        runko = dict(pyynto, stream=False)
+        runko.pop("stream_options", None)
+        avain = self.headers.get("Authorization") or f"Bearer {os.getenv('OPENAI_API_KEY', '')}"
+        pyynto_http = urllib.request.Request(
+            self.ylavirta.rstrip("/") + "/chat/completions",
+            data=json.dumps(runko).encode("utf-8"),
+            headers={"Content-Type": "application/json", "Authorization": avain},
+        )
+        with urllib.request.urlopen(pyynto_http, timeout=300) as vastaus:
+            return json.loads(vastaus.read())
+
+
+def palvelin(portti: int, valimuisti: LLMValimuisti, ylavirta=None, oletus=False, viive=0.0, isanta="127.0.0.1",
+             vastaaja=None):
+    """Luo (ei käynnistä) palvelimen; testit ja benchmark voivat ajaa sen omassa säikeessään.
+
+    `vastaaja(pyynto) -> dict` tuottaa vastauksen nauhoittamattomiin pyyntöihin (esim. bench_e2e.py:n
+    käsikirjoitettu keskustelu); sitä ei tallenneta.
+    """
+    kasittelija = type("MockKasittelija", (Kasittelija,), {
+        "valimuisti": valimuisti, "ylavirta": ylavirta, "oletus": oletus, "viive": viive,
+        "vastaaja": staticmethod(vastaaja) if vastaaja else None,
+    })
+    return ThreadingHTTPServer((isanta, portti), kasittelija)
+
+
+if __name__ == "__main__":
+    jasennin = argparse.ArgumentParser(description="OpenAI-yhteensopiva toistopalvelin.")
+    jasennin.add_argument("komento", nargs="?", default="palvele", choices=["palvele", "vie", "tuo"])
+    jasennin.add_argument("tiedosto", nargs="?", help="JSONL-tiedosto (vie/tuo)")
+    jasennin.add_argument("--portti", type=int, default=int(os.getenv("MOCK_OPENAI_PORT", "8001")))
+    jasennin.add_argument("--tallennus", default=LLM_CACHE_PATH, help="SQLite-tiedosto (LLM_CACHE_PATH)")
+    jasennin.add_argument("--nauhoita", metavar="URL", help="puuttuvat vastaukset tästä rajapinnasta")
+    jasennin.add_argument("--oletus", action="store_true", help="puuttuvaan vastaukseen deterministinen vastaus")
+    jasennin.add_argument("--viive-ms", type=float, default=0.0, help="keinotekoinen vasteaika")
+    args = jasennin.parse_args()
+
+    valimuisti = LLMValimuisti(args.tallennus)
+    if args.komento in ("vie", "tuo"):
+        if not args.tiedosto:
+            print("Anna JSONL-tiedosto.")
+            sys.exit(1)
+        maara = valimuisti.vie(args.tiedosto) if args.komento == "vie" else valimuisti.tuo(args.tiedosto)
+        print(f"{maara} vastausta ({args.tiedosto}).")
+        sys.exit(0)
+
+    srv = palvelin(args.portti, valimuisti, args.nauhoita, args.oletus, args.viive_ms / 1000)
+    tila = "nauhoitus" if args.nauhoita else ("toisto + oletus" if args.oletus else "toisto")
+    print(f"mock_openai: http://127.0.0.1:{args.portti}/v1 ({tila}, {args.tallennus})")
+    print(f"Aseta agenteille LLM_BASE_URL=http://127.0.0.1:{args.portti}/v1")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
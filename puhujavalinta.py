@@ -0,0 +1,86 @@
+# puhujavalinta.py
+# Sääntöpohjainen puhujan valinta GroupChatille. Oletusvalinta ("auto") maksaa jokaisella
+# kierroksella ylimääräisen LLM-kutsun pelkästään seuraavan puhujan valitsemiseen; useimmat
+# siirtymät ovat kuitenkin yksiselitteisiä (työkalukutsu -> suorittaja, tulos -> kutsuja).
+# LLM:ää käytetään vain, kun sääntö ei ratkaise tilannetta.
+#
+# Asetus: SPEAKER_SELECTION = "saannot" (oletus) | "auto" (pelkkä LLM-valinta)
+
+import os
+import re
+
+SPEAKER_SELECTION = os.getenv("SPEAKER_SELECTION", "saannot").lower()
+
+# Sanojen alut (taivutusmuodot mukaan), jotka viittaavat WordPress/Docker-ympäristöihin
+WP_SANAT = re.compile(
+    r"\b(wordpress|wp\b|wp[-_]|plugin|lisäosa|teema|ympäristö|docker|kontti|kontit|portti|portil|pooli|lepotil|tilannekuv|kloon|wp-cli)",
+    re.IGNORECASE,
+)
+# Orkestroijan omat aihepiirit: osakkeet, etäisyydet ja käyttäjähaut
+YLEISET_SANAT = re.compile(
+    r"\b(osake|osakkee|kurssi|hinta|hinna|ticker|etäisyy|etäisyyk|matka|koordinaat|reitti|käyttäjä|käyttäji|tietokan)",
+    re.IGNORECASE,
+)
+
+# Kierroskohtaiset laskurit (sääntö vs. LLM) seurantaan
+tilastot = {"saanto": 0, "llm": 0}
+
+
+def _kutsujan_nimi(viestit, kutsu_idt):
+    """Etsi viesti, jonka tool_calls sisältää annetut id:t. Palauttaa (kutsujan nimi, työkalujen nimet)."""
+    for viesti in reversed(viestit):
+        kutsut = viesti.get("tool_calls") or []
+        if any(k.get("id") in kutsu_idt for k in kutsut):
+            return viesti.get("name"), [k.get("function", {}).get("name", "") for k in kutsut]
+    return None, []
+
+
+def valitsin(kayttaja: str = "User", yleinen: str = "Orkestroija", wp: str = "WordPress_Expert"):
+    """Palauta GroupChatin `speaker_selection_method`-funktio annetuille agenttinimille."""
+
+    def valitse(edellinen, groupchat):
+        viestit = groupchat.messages
+        viesti = viestit[-1] if viestit else {}
+        sisalto = viesti.get("content") or ""
+        if not isinstance(sisalto, str):
+            sisalto = str(sisalto)
+
+        if viesti.get("tool_calls") or viesti.get("function_call"):
+            valittu, syy = kayttaja, "työkalukutsu suoritetaan"
+        elif viesti.get("tool_responses") or viesti.get("role") in ("tool", "function"):
+            idt = {v.get("tool_call_id") for v in viesti.get("tool_responses") or []}
+            kutsuja, tyokalut = _kutsujan_nimi(viestit, idt)
+            if kutsuja in (yleinen, wp):
+                valittu, syy = kutsuja, "työkalun tulos kutsujalle"
+            elif any(t.startswith("wp_") for t in tyokalut):
+                valittu, syy = wp, "wp_*-työkalun tulos"
+            else:
+                valittu, syy = yleinen, "työkalun tulos"
+        elif edellinen.name == yleinen and wp in sisalto:
+            valittu, syy = wp, "orkestroija delegoi"
+        elif edellinen.name in (yleinen, wp):
+            valittu, syy = kayttaja, "vastaus käyttäjälle"
+        else:
+            on_wp = bool(WP_SANAT.search(sisalto))
+            on_yleinen = bool(YLEISET_SANAT.search(sisalto))
+            if on_wp and not on_yleinen:
+                valittu, syy = wp, "WordPress-avainsana"
+            elif on_yleinen and not on_wp:
+                valittu, syy = yleinen, "yleinen avainsana"
+            else:
+                tilastot["llm"] += 1
+                print(f"Puhujavalinta: {edellinen.name} -> LLM (monitulkintainen)")
+                return "auto"
+
+        tilastot["saanto"] += 1
+        print(f"Puhujavalinta: {edellinen.name} -> {valittu} ({syy})")
+        return groupchat.agent_by_name(valittu)
+
+    return valitse
+
+
+def speaker_selection_method(**nimet):
+    """GroupChatin speaker_selection_method SPEAKER_SELECTION-asetuksen mukaan."""
+    if SPEAKER_SELECTION == "auto":
+        return "auto"
+    return valitsin(**nimet)
@@ -0,0 +1,283 @@
+# rekisteri.py
+# Pysyvä ympäristörekisteri (SQLite ENV_DIR:n alla).
+# Listaukset, nimen ratkaisu ja porttikonfliktien tarkistus tehdään indeksikyselyinä
+# eikä jokaisella kutsulla käydä läpi hakemistoja ja meta.json-tiedostoja.
+#
+# Rekisterin voi rakentaa uudelleen levyltä:  python rekisteri.py rebuild [ENV_DIR]
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+REKISTERI_TIEDOSTO = ".rekisteri.sqlite3"
+
+_SKEEMA = """
+CREATE TABLE IF NOT EXISTS ymparistot (
+    slug TEXT PRIMARY KEY,
+    display_name TEXT NOT NULL,
+    type TEXT,
+    port INTEGER,
+    status TEXT,
+    has_compose INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ymparistot_display_name ON ymparistot(display_name COLLATE NOCASE);
+"""
+
+# Portti on yksikäsitteinen (NULL-portteja saa olla useita). Vanhan rekisterin
+# päällekkäiset portit nollataan ennen indeksin luontia (vanhin rivi pitää porttinsa).
+_PORTTI_INDEKSI = """
+DROP INDEX IF EXISTS idx_ymparistot_port;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_ymparistot_port_uniikki ON ymparistot(port);
+"""
+
+_KENTAT = ("display_name", "type", "port", "status", "has_compose")
+
+# Luonnin ajaksi varatun rivin tila: hakemistoa ei vielä ole, mutta slug ja portti ovat käytössä
+VARATTU = "luodaan"
+
+
+class VarattuVirhe(ValueError):
+    """Slug tai portti on jo toisen ympäristön käytössä (`kentta` 'slug' tai 'port', `varaaja` slug)."""
+
+    def __init__(self, kentta, arvo, varaaja):
+        self.kentta = kentta
+        self.arvo = arvo
+        self.varaaja = varaaja
+        super().__init__(f"{kentta} {arvo} on jo ympäristön '{varaaja}' käytössä")
+
+
+class Rekisteri:
+    """Ympäristöjen indeksi: slug, näyttönimi, tyyppi, portti, tila ja aikaleimat."""
+
+    def __init__(self, env_dir: str):
+        self.env_dir = env_dir
+        self.polku = os.path.join(env_dir, REKISTERI_TIEDOSTO)
+        self._conn = None
+        self._lukko = threading.RLock()
+
+    def _yhteys(self):
+        if self._conn is None:
+            os.makedirs(self.env_dir, exist_ok=True)
+            uusi = not os.path.exists(self.polku)
+            conn = sqlite3.connect(self.polku, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SKEEMA)
+            self._yksikasitteiset_portit(conn)
+            self._conn = conn
+            if uusi:
+                # Ensimmäinen käyttö: täytetään rekisteri olemassa olevista hakemistoista
+                self.rakenna_uudelleen()
+        return self._conn
+
+    @staticmethod
+    def _yksikasitteiset_portit(conn):
+        tuplat = conn.execute(
+            "SELECT slug, port FROM ymparistot WHERE port IS NOT NULL AND rowid NOT IN "
+            "(SELECT MIN(rowid) FROM ymparistot WHERE port IS NOT NULL GROUP BY port)"
+        ).fetchall()
+        for rivi in tuplat:
+            print(f"Varoitus: rekisterin portti {rivi['port']} oli usealla ympäristöllä; '{rivi['slug']}' ilman porttia.")
+            conn.execute("UPDATE ymparistot SET port=NULL WHERE slug=?", (rivi["slug"],))
+        conn.executescript(_PORTTI_INDEKSI)
+
+    def _varattu(self, conn, slug, port, virhe):
+        """Muunna eheysvirhe VarattuVirheeksi (kumpi sarake on jo käytössä)."""
+        if port is not None:
+            rivi = conn.execute("SELECT slug FROM ymparistot WHERE port=? AND slug IS NOT ?", (int(port), slug)).fetchone()
+            if rivi:
+                return VarattuVirhe("port", port, rivi["slug"])
+        if conn.execute("SELECT 1 FROM ymparistot WHERE slug=?", (slug,)).fetchone():
+            return VarattuVirhe("slug", slug, slug)
+        return virhe
+
+    @contextmanager
+    def transaktio(self):
+        """Kaikki lohkon muutokset tallentuvat yhdessä tai ei ollenkaan.
+
+        Lukko on säiekohtainen (RLock), joten se ei erota saman tapahtumasilmukan korutiineja
+        toisistaan: lohkon sisällä ei saa olla awaitia. Synkroninen lohko ajetaan loppuun ennen
+        kuin mikään muu korutiini pääsee vuoroon, joten ilman awaitia lohko on eristetty myös niistä.
+        """
+        with self._lukko:
+            conn = self._yhteys()
+            if conn.in_transaction:
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def lisaa(self, slug, display_name, tyyppi=None, port=None, status=None, has_compose=True):
+        """Lisää uusi ympäristö. Nostaa VarattuVirheen, jos slug tai portti on jo käytössä.
+
+        Tarkistus ja lisäys ovat yksi INSERT: rinnakkaiset luonnit eivät voi varata samaa nimeä tai porttia.
+        """
+        nyt = time.time()
+        with self.transaktio() as conn:
+            try:
+                conn.execute(
+                    "INSERT INTO ymparistot (slug, display_name, type, port, status, has_compose, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (slug, display_name, tyyppi, port, status, int(bool(has_compose)), nyt, nyt),
+                )
+            except sqlite3.IntegrityError as e:
+                raise self._varattu(conn, slug, port, e) from None
+
+    def korvaa(self, slug, display_name, tyyppi=None, port=None, status=None, has_compose=True):
+        """Lisää tai korvaa ympäristön rivi levyn tiedoilla (portti jätetään tyhjäksi, jos se on toisen käytössä)."""
+        nyt = time.time()
+        with self.transaktio() as conn:
+            if port is not None and conn.execute(
+                    "SELECT 1 FROM ymparistot WHERE port=? AND slug IS NOT ?", (int(port), slug)).fetchone():
+                print(f"Varoitus: ympäristön '{slug}' portti {port} on jo toisen ympäristön käytössä; ei rekisteröidä.")
+                port = None
+            conn.execute(
+                "INSERT INTO ymparistot (slug, display_name, type, port, status, has_compose, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(slug) DO UPDATE SET display_name=excluded.display_name, type=excluded.type, "
+                "port=excluded.port, status=excluded.status, has_compose=excluded.has_compose, updated_at=excluded.updated_at",
+                (slug, display_name, tyyppi, port, status, int(bool(has_compose)), nyt, nyt),
+            )
+
+    def paivita(self, slug, **kentat):
+        """Päivitä yksittäisiä kenttiä (display_name, type, port, status, has_compose).
+
+        Nostaa VarattuVirheen, jos uusi portti on jo toisen ympäristön käytössä.
+        """
+        tuntemattomat = set(kentat) - set(_KENTAT)
+        if tuntemattomat:
+            raise ValueError(f"Tuntemattomat kentät: {', '.join(sorted(tuntemattomat))}")
+        if not kentat:
+            return
+        sarakkeet = ", ".join(f"{k}=?" for k in kentat)
+        with self.transaktio() as conn:
+            try:
+                conn.execute(
+                    f"UPDATE ymparistot SET {sarakkeet}, updated_at=? WHERE slug=?",
+                    (*kentat.values(), time.time(), slug),
+                )
+            except sqlite3.IntegrityError as e:
+                raise self._varattu(conn, slug, kentat.get("port"), e) from None
+
+    def poista(self, slug):
+        with self.transaktio() as conn:
+            conn.execute("DELETE FROM ymparistot WHERE slug=?", (slug,))
+
+    def hae(self, slug):
+        """Palauta ympäristön rivi dict-muodossa tai None."""
+        with self._lukko:
+            rivi = self._yhteys().execute("SELECT * FROM ymparistot WHERE slug=?", (slug,)).fetchone()
+        return dict(rivi) if rivi else None
+
+    def etsi(self, nimi: str, slugify=None):
+        """Ratkaise käyttäjän antama nimi: slug, näyttönimi (kirjainkoosta välittämättä) tai slugifioitu nimi."""
+        with self._lukko:
+            conn = self._yhteys()
+            rivi = conn.execute("SELECT * FROM ymparistot WHERE slug=?", (nimi,)).fetchone()
+            if rivi is None:
+                rivi = conn.execute(
+                    "SELECT * FROM ymparistot WHERE display_name=? COLLATE NOCASE ORDER BY slug LIMIT 1", (nimi.strip(),)
+                ).fetchone()
+            if rivi is None and slugify is not None:
+                rivi = conn.execute("SELECT * FROM ymparistot WHERE slug=?", (slugify(nimi),)).fetchone()
+        return dict(rivi) if rivi else None
+
+    def listaa(self):
+        """Kaikki ympäristöt slugin mukaan järjestettynä."""
+        with self._lukko:
+            rivit = self._yhteys().execute("SELECT * FROM ymparistot ORDER BY slug").fetchall()
+        return [dict(r) for r in rivit]
+
+    def portin_kayttaja(self, port, paitsi=None):
+        """Palauta slug, jolle portti on jo varattu (tai None)."""
+        if port is None:
+            return None
+        with self._lukko:
+            rivi = self._yhteys().execute(
+                "SELECT slug FROM ymparistot WHERE port=? AND slug IS NOT ? LIMIT 1", (int(port), paitsi)
+            ).fetchone()
+        return rivi["slug"] if rivi else None
+
+    def lue_levylta(self, slug):
+        """Lue yhden ympäristöhakemiston tiedot levyltä rekisteririviksi (tai None jos hakemistoa ei ole)."""
+        env_path = os.path.join(self.env_dir, slug)
+        if not slug or slug.startswith(".") or "/" in slug or os.sep in slug or not os.path.isdir(env_path):
+            return None
+        meta = {}
+        meta_path = os.path.join(env_path, "meta.json")
+        if os.path.exists(meta_path):
+            try:
+                with open(meta_path) as mf:
+                    meta = json.load(mf)
+            except Exception as e:
+                print(f"Varoitus: {meta_path} lukeminen epäonnistui: {e}")
+        port = meta.get("port")
+        try:
+            port = int(port) if port is not None else None
+        except (TypeError, ValueError):
+            port = None
+        return {
+            "slug": slug,
+            "display_name": meta.get("display_name", slug),
+            "tyyppi": meta.get("type"),
+            "port": port,
+            "has_compose": os.path.exists(os.path.join(env_path, "docker-compose.yml")),
+        }
+
+    def synkronoi_levylta(self, slug):
+        """Lisää yksittäinen levyltä löytyvä ympäristö rekisteriin (esim. käsin luotu hakemisto)."""
+        tiedot = self.lue_levylta(slug)
+        if tiedot is None:
+            return None
+        vanha = self.hae(slug)
+        self.korvaa(status=vanha["status"] if vanha else None, **tiedot)
+        return self.hae(slug)
+
+    def rakenna_uudelleen(self) -> int:
+        """Rakenna koko rekisteri levyltä (hakemistot + meta.json). Palauttaa ympäristöjen määrän.
+
+        Keskeneräisten luontien varaukset (tila VARATTU) säilyvät: niiden slug ja portti pysyvät varattuina.
+        """
+        os.makedirs(self.env_dir, exist_ok=True)
+        slugit = sorted(d for d in os.listdir(self.env_dir) if not d.startswith("."))
+        rivit = [t for t in (self.lue_levylta(s) for s in slugit) if t is not None]
+        with self.transaktio() as conn:
+            vanhat = {r["slug"]: dict(r) for r in conn.execute("SELECT slug, port, status, created_at FROM ymparistot")}
+            varatut = {slug: r for slug, r in vanhat.items() if r["status"] == VARATTU}
+            conn.execute("DELETE FROM ymparistot WHERE status IS NOT ?", (VARATTU,))
+            nyt = time.time()
+            portit = {r["port"] for r in varatut.values() if r["port"] is not None}
+            for t in rivit:
+                if t["slug"] in varatut:
+                    continue
+                vanha = vanhat.get(t["slug"], {})
+                if t["port"] is not None and t["port"] in portit:
+                    print(f"Varoitus: ympäristön '{t['slug']}' portti {t['port']} on jo toisen ympäristön käytössä; ei rekisteröidä.")
+                    t["port"] = None
+                portit.add(t["port"])
+                conn.execute(
+                    "INSERT INTO ymparistot (slug, display_name, type, port, status, has_compose, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (t["slug"], t["display_name"], t["tyyppi"], t["port"], vanha.get("status"),
+                     int(t["has_compose"]), vanha.get("created_at", nyt), nyt),
+                )
+        return len(rivit)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("Käyttö: python rekisteri.py rebuild [ENV_DIR]")
+        sys.exit(1)
+    env_dir = sys.argv[2] if len(sys.argv) > 2 else os.getenv("DOCKER_ENV_DIR", "./environments")
+    maara = Rekisteri(env_dir).rakenna_uudelleen()
+    print(f"Rekisteri rakennettu uudelleen: {maara} ympäristöä ({os.path.join(env_dir, REKISTERI_TIEDOSTO)}).")
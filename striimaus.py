@@ -0,0 +1,143 @@
+# striimaus.py
+# Token-striimaus agenteilta Chainlit-käyttöliittymään. autogen kirjoittaa striimatut
+# LLM-palat IOStreamiin (print(..., end="", flush=True)) executor-säikeestä; tämä
+# IOStream siirtää ne tapahtumasilmukan jonoon, josta kuluttajatehtävä kutsuu
+# cl.Message.stream_token -metodia istunnon kontekstissa. Myös työkalujen
+# komentotuloste (esim. docker compose up) näytetään rivi kerrallaan.
+#
+# Asetus: LLM_STREAM=1 (oletus) lisää "stream": True striimaaville agenteille.
+
+import os
+import re
+import asyncio
+import chainlit as cl
+from autogen.io import IOStream, IOConsole
+
+LLM_STREAM = os.getenv("LLM_STREAM", "1").lower() in ("1", "true", "yes")
+
+_ANSI = re.compile(r"\x1b\[[0-9;]*m")
+
+# Jonon viestityypit
+_ALKU, _TOKEN, _TYOKALU, _LOPPU = "alku", "token", "tyokalu", "loppu"
+
+
+class ChainlitIOStream:
+    """Istuntokohtainen IOStream: tokenit ja työkalutuloste Chainlitiin, muu tuloste konsoliin."""
+
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self._jono = asyncio.Queue()
+        self._konsoli = IOConsole()
+        self._kirjoittaja = None
+        self._viesti = None
+        self._tyokaluviesti = None
+        # Viimeisimmän kokonaan striimatun vastauksen sisältö (ettei sitä lähetetä toiseen kertaan)
+        self.striimatut = []
+        # Luodaan käsittelijän kontekstissa, jolloin Chainlitin istuntokonteksti periytyy
+        self._kuluttaja = asyncio.create_task(self._kuluta())
+
+    def _laita(self, *tapahtuma):
+        """Säieturvallinen: print() kutsutaan executor-säikeestä, muut tapahtumasilmukasta."""
+        try:
+            asyncio.get_running_loop()
+            silmukassa = True
+        except RuntimeError:
+            silmukassa = False
+        if silmukassa:
+            self._jono.put_nowait(tapahtuma)
+        else:
+            self._loop.call_soon_threadsafe(self._jono.put_nowait, tapahtuma)
+
+    def aloita(self, kirjoittaja: str):
+        """Agentti aloittaa vastauksen: seuraavat tokenit näytetään sen nimellä."""
+        self._laita(_ALKU, kirjoittaja)
+
+    async def komentotuloste(self, virta: str, rivi: str):
+        """komennot.komentotuloste-vastaanottaja: työkalun komentojen tulosteet näkyviin."""
+        self._laita(_TYOKALU, rivi)
+
+    # IOStream-protokolla
+    def print(self, *objects, sep: str = " ", end: str = "\n", flush: bool = False):
+        teksti = sep.join(map(str, objects))
+        if end == "" and flush:
+            # OpenAI-asiakkaan striimaama pala
+            self._laita(_TOKEN, _ANSI.sub("", teksti))
+            return
+        self._konsoli.print(*objects, sep=sep, end=end, flush=flush)
+        # Mikä tahansa muu tuloste (esim. vastaanotetun viestin tulostus) päättää avoimen viestin
+        self._laita(_LOPPU, None)
+
+    def send(self, message):
+        self.print(message)
+
+    def input(self, prompt: str = "", *, password: bool = False) -> str:
+        return self._konsoli.input(prompt, password=password)
+
+    async def _kuluta(self):
+        while True:
+            tyyppi, arvo = await self._jono.get()
+            try:
+                if tyyppi == _ALKU:
+                    await self._sulje()
+                    self._kirjoittaja = arvo
+                elif tyyppi == _TOKEN:
+                    if self._tyokaluviesti is not None:
+                        await self._sulje()
+                    if self._viesti is None:
+                        self._viesti = cl.Message(content="", author=self._kirjoittaja or "Assistant")
+                    if arvo:
+                        await self._viesti.stream_token(arvo)
+                elif tyyppi == _TYOKALU:
+                    if self._tyokaluviesti is None:
+                        await self._sulje()
+                        self._tyokaluviesti = cl.Message(content="", author="Työkalu")
+                    await self._tyokaluviesti.stream_token(arvo + "\n")
+                elif tyyppi == _LOPPU:
+                    await self._sulje()
+                    if arvo == "pysayta":
+                        return
+            except Exception as e:
+                print(f"Varoitus: striimaus Chainlitiin epäonnistui: {e}")
+            finally:
+                self._jono.task_done()
+
+    async def _sulje(self):
+        if self._viesti is not None:
+            viesti, self._viesti = self._viesti, None
+            await viesti.send()
+            if viesti.content.strip():
+                self.striimatut.append(viesti.content.strip())
+        if self._tyokaluviesti is not None:
+            viesti, self._tyokaluviesti = self._tyokaluviesti, None
+            await viesti.send()
+
+    def on_striimattu(self, sisalto) -> bool:
+        """Onko tämä viestisisältö jo näytetty striimattuna."""
+        return bool(sisalto) and isinstance(sisalto, str) and sisalto.strip() in self.striimatut
+
+    async def tyhjenna(self):
+        """Odota, että kaikki jonossa oleva on näytetty, ja sulje avoimet viestit."""
+        self._laita(_LOPPU, None)
+        await self._jono.join()
+
+    async def lopeta(self):
+        """Sulje avoimet viestit ja pysäytä kuluttaja (kutsutaan keskustelun lopuksi)."""
+        self._laita(_LOPPU, "pysayta")
+        await self._kuluttaja
+
+
+def aloita_vastaus(recipient, messages=None, sender=None, config=None):
+    """register_reply-funktio (position=0): kertoo striimille, kuka agentti vastaa seuraavaksi.
+
+    Ei tuota vastausta itse, joten seuraava reply-funktio (LLM) ajetaan normaalisti.
+    """
+    virta = IOStream.get_default()
+    if isinstance(virta, ChainlitIOStream):
+        virta.aloita(recipient.name)
+    return False, None
+
+
+def aktiivinen_virta():
+    """Nykyisen keskustelun ChainlitIOStream tai None."""
+    virta = IOStream.get_default()
+    return virta if isinstance(virta, ChainlitIOStream) else None
@@ -0,0 +1,7 @@
+# tests/conftest.py
+# Moduulit ovat repon juuressa (ei pakettia): juuri tuontipolkuun.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
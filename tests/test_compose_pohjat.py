@@ -0,0 +1,36 @@
+import os
+import stat
+
+from compose_pohjat import DB_ENV, kirjoita_db_env, wordpress_compose
+
+TUNNUKSET = {"host": "wp-shared-db:3306", "name": "wp_sivu", "user": "wp_sivu", "password": "s4l4s4n4"}
+
+
+def _oikeudet(polku):
+    return stat.S_IMODE(os.stat(polku).st_mode)
+
+
+def test_salasana_vain_env_tiedostossa(tmp_path):
+    assert "s4l4s4n4" not in wordpress_compose(8080, slug="sivu", jaettu_db=TUNNUKSET)
+    oma_db = wordpress_compose(8080, slug="sivu")
+    assert "MYSQL_PASSWORD" not in oma_db and "WORDPRESS_DB_PASSWORD" not in oma_db
+    kirjoita_db_env(str(tmp_path), TUNNUKSET)
+    polku = tmp_path / DB_ENV
+    assert polku.read_text() == "WORDPRESS_DB_PASSWORD=s4l4s4n4\n"
+    assert _oikeudet(polku) == 0o600
+
+
+def test_olemassa_olevan_tiedoston_oikeudet_kiristetaan(tmp_path):
+    polku = tmp_path / DB_ENV
+    polku.write_text("vanha\n")
+    os.chmod(polku, 0o644)
+    kirjoita_db_env(str(tmp_path))
+    assert _oikeudet(polku) == 0o600
+    assert "vanha" not in polku.read_text()
+
+
+def test_salasanaton_tunnus_ei_korvaa_tiedostoa(tmp_path):
+    polku = tmp_path / DB_ENV
+    polku.write_text("WORDPRESS_DB_PASSWORD=poolista\n")
+    kirjoita_db_env(str(tmp_path), {k: v for k, v in TUNNUKSET.items() if k != "password"})
+    assert polku.read_text() == "WORDPRESS_DB_PASSWORD=poolista\n"
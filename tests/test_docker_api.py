@@ -0,0 +1,236 @@
+import asyncio
+import json
+import os
+import struct
+
+import pytest
+
+import docker_api
+from docker_api import DockerAPI, DockerAPIVirhe
+from komennot import KomentoAikakatkaisu, KomentoVirhe
+
+
+def _kehys(virta: int, data: bytes) -> bytes:
+    return bytes([virta, 0, 0, 0]) + struct.pack(">I", len(data)) + data
+
+
+class ValeDaemon:
+    """Minimaalinen Engine API unix-socketissa: vastaukset polun mukaan, keep-alive-yhteydet."""
+
+    def __init__(self, exit_code=0, kehykset=(), chunked=False):
+        self.exit_code = exit_code
+        self.kehykset = kehykset
+        self.chunked = chunked
+        self.yhteyksia = 0
+        self.pyynnot = []
+
+    async def kasittele(self, lukija, kirjoittaja):
+        self.yhteyksia += 1
+        try:
+            while True:
+                rivi = await lukija.readline()
+                if not rivi:
+                    return
+                metodi, polku, _ = rivi.decode().split(" ", 2)
+                otsakkeet = {}
+                while (rivi := await lukija.readline()) not in (b"\r\n", b""):
+                    avain, _, arvo = rivi.decode().partition(":")
+                    otsakkeet[avain.strip().lower()] = arvo.strip()
+                runko = await lukija.readexactly(int(otsakkeet.get("content-length", 0)))
+                self.pyynnot.append((metodi, polku.split("?")[0], json.loads(runko) if runko else None))
+                if polku.endswith("/start"):
+                    kirjoittaja.write(b"HTTP/1.1 101 UPGRADED\r\nConnection: Upgrade\r\nUpgrade: tcp\r\n\r\n"
+                                      + b"".join(self.kehykset))
+                    await kirjoittaja.drain()
+                    return
+                vastaus = self.vastaus(metodi, polku)
+                data = json.dumps(vastaus).encode()
+                if self.chunked:
+                    kirjoittaja.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                                      b"Transfer-Encoding: chunked\r\n\r\n"
+                                      + f"{len(data) - 3:x}\r\n".encode() + data[:-3] + b"\r\n"
+                                      + b"3\r\n" + data[-3:] + b"\r\n0\r\n\r\n")
+                else:
+                    kirjoittaja.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                                      + f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+                await kirjoittaja.drain()
+        finally:
+            kirjoittaja.close()
+
+    def vastaus(self, metodi, polku):
+        if polku.startswith("/containers/json"):
+            return [{"Id": "k1", "State": "running", "Labels": {
+                docker_api.PROJEKTI_LABEL: "proj", docker_api.PALVELU_LABEL: "wpcli"}}]
+        if polku.endswith("/exec"):
+            return {"Id": "e1"}
+        if polku.startswith("/exec/e1/json"):
+            return {"ExitCode": self.exit_code}
+        return {}
+
+
+def _aja_daemonilla(tmp_path, daemon, testi):
+    polku = str(tmp_path / "docker.sock")
+
+    async def aja():
+        palvelin = await asyncio.start_unix_server(daemon.kasittele, polku)
+        try:
+            return await testi(DockerAPI(polku))
+        finally:
+            palvelin.close()
+
+    return asyncio.run(aja())
+
+
+def test_exec_virran_demultipleksointi(tmp_path):
+    daemon = ValeDaemon(kehykset=[
+        _kehys(1, b"rivi1\nri"), _kehys(2, b"varoitus\n"), _kehys(1, b"vi2\n"), _kehys(1, b"loppu"),
+    ])
+    rivit = []
+    tulos = _aja_daemonilla(tmp_path, daemon, lambda api: api.exec_virta("e1", lambda v, r: rivit.append((v, r))))
+    assert tulos == ("rivi1\nrivi2\nloppu", "varoitus")
+    assert rivit == [("stdout", "rivi1"), ("stderr", "varoitus"), ("stdout", "rivi2"), ("stdout", "loppu")]
+
+
+def test_pyynnot_kayttavat_samaa_yhteytta(tmp_path):
+    daemon = ValeDaemon(chunked=True)
+
+    async def testi(api):
+        ensimmainen = await api.projektien_tilat()
+        toinen = await api.projektien_tilat()
+        return ensimmainen, toinen
+
+    ensimmainen, toinen = _aja_daemonilla(tmp_path, daemon, testi)
+    assert ensimmainen == toinen == {"proj": {"wpcli": "running"}}
+    assert daemon.yhteyksia == 1
+
+
+def test_suorita_paluukoodit(tmp_path):
+    async def testi(api):
+        return await api.suorita("proj", "wpcli", ["wp", "option", "get", "home"])
+
+    assert _aja_daemonilla(tmp_path, ValeDaemon(kehykset=[_kehys(1, b"ok\n")]), testi) == "ok"
+    with pytest.raises(KomentoVirhe) as e:
+        _aja_daemonilla(tmp_path, ValeDaemon(exit_code=3, kehykset=[_kehys(2, b"rikki\n")]), testi)
+    assert (e.value.returncode, e.value.stderr) == (3, "rikki")
+    # Tuntematon paluukoodi ei ole onnistuminen
+    with pytest.raises(KomentoVirhe):
+        _aja_daemonilla(tmp_path, ValeDaemon(exit_code=None), testi)
+
+
+class ValeAsiakas:
+    socket_polku = "vale.sock"
+
+    def __init__(self, virhe=None, viive=0.0):
+        self.virhe = virhe
+        self.viive = viive
+        self.kutsut = 0
+
+    async def suorita(self, projekti, palvelu, cmd, rivi_callback=None):
+        self.kutsut += 1
+        await asyncio.sleep(self.viive)
+        if self.virhe is not None:
+            raise self.virhe
+        return "api"
+
+    def sulje(self):
+        pass
+
+
+@pytest.fixture
+def cli(monkeypatch):
+    kutsut = []
+
+    async def aja_komento(cmd, **kwargs):
+        kutsut.append(cmd)
+        return "cli"
+
+    monkeypatch.setattr(docker_api, "aja_komento", aja_komento)
+    monkeypatch.setattr(docker_api, "_ei_ennen", 0.0)
+    return kutsut
+
+
+def test_aikakatkaisu_ei_toista_komentoa_cli_lla(monkeypatch, cli):
+    asiakas = ValeAsiakas(viive=5)
+    monkeypatch.setattr(docker_api, "asiakas", lambda: asiakas)
+    with pytest.raises(KomentoAikakatkaisu):
+        asyncio.run(docker_api.suorita("/env/sivu", "wpcli", ["wp", "plugin", "install", "x"], aikaraja=0.05))
+    assert cli == [] and asiakas.kutsut == 1
+    assert docker_api._ei_ennen == 0.0  # API:a ei merkitty rikkinäiseksi
+
+
+def test_yhteysvirhe_siirtyy_cli_hin(monkeypatch, cli):
+    asiakas = ValeAsiakas(virhe=ConnectionRefusedError("ei vastaa"))
+    monkeypatch.setattr(docker_api, "asiakas", lambda: asiakas)
+    assert asyncio.run(docker_api.suorita("/env/sivu", "wpcli", ["wp", "cli", "version"])) == "cli"
+    assert cli == [["docker", "compose", "-f", "docker-compose.yml", "exec", "-T", "wpcli", "wp", "cli", "version"]]
+    assert docker_api._ei_ennen > 0
+
+
+def test_api_virhe_siirtyy_cli_hin_ilman_katkoa(monkeypatch, cli):
+    monkeypatch.setattr(docker_api, "asiakas", lambda: ValeAsiakas(virhe=DockerAPIVirhe("500", 500)))
+    assert asyncio.run(docker_api.suorita("/env/sivu", "wpcli", ["true"])) == "cli"
+    assert docker_api._ei_ennen == 0.0
+
+
+def test_komennon_virhe_ei_siirry_cli_hin(monkeypatch, cli):
+    monkeypatch.setattr(docker_api, "asiakas", lambda: ValeAsiakas(virhe=KomentoVirhe(["wp"], 1, "virhe")))
+    with pytest.raises(KomentoVirhe):
+        asyncio.run(docker_api.suorita("/env/sivu", "wpcli", ["wp"]))
+    assert cli == []
+
+
+def test_ilman_socketia_kaytetaan_cli_ta(monkeypatch, tmp_path, cli):
+    monkeypatch.setattr(docker_api, "DOCKER_HOST", f"unix://{tmp_path}/puuttuu.sock")
+    monkeypatch.setattr(docker_api, "DOCKER_API", "auto")
+    assert docker_api.asiakas() is None
+    assert asyncio.run(docker_api.suorita("/env/sivu", "wpcli", ["true"])) == "cli"
+
+
+class JarjestysAPI(DockerAPI):
+    """Kirjaa käynnistyspyynnöt; kontit annetaan suoraan."""
+
+    def __init__(self, kontit):
+        super().__init__("vale.sock")
+        self._kontit = kontit
+        self.pyynnot = []
+
+    async def kontit(self, projekti=None, palvelu=None):
+        return self._kontit
+
+    async def pyynto(self, metodi, polku, *args, **kwargs):
+        await asyncio.sleep(0)
+        self.pyynnot.append(polku)
+        return 204, None
+
+
+def _kontti(palvelu, riippuvuudet="", tila="exited", luotu=3000):
+    nimikkeet = {docker_api.PROJEKTI_LABEL: "proj", docker_api.PALVELU_LABEL: palvelu}
+    if riippuvuudet:
+        nimikkeet[docker_api.RIIPPUVUUS_LABEL] = riippuvuudet
+    return {"Id": palvelu, "State": tila, "Created": luotu, "Labels": nimikkeet}
+
+
+def test_kaynnistys_riippuvuusjarjestyksessa():
+    api = JarjestysAPI([
+        _kontti("wpcli", "wordpress:service_started:false"),
+        _kontti("wordpress", "db:service_started:false,ulkoinen:service_started:false"),
+        _kontti("db", tila="paused"),
+    ])
+    assert asyncio.run(api.kaynnista_projekti("proj")) == 3
+    assert api.pyynnot == ["/containers/db/unpause", "/containers/wordpress/start", "/containers/wpcli/start"]
+
+
+def test_muuttunut_compose_tiedosto_luo_kontit_uudelleen(monkeypatch, tmp_path, cli):
+    (tmp_path / "docker-compose.yml").write_text("services: {}\n")
+    os.utime(tmp_path / "docker-compose.yml", (2000.5, 2000.5))
+    vanha = JarjestysAPI([_kontti("db", luotu=1000), _kontti("wordpress", "db:service_started:false")])
+    monkeypatch.setattr(docker_api, "asiakas", lambda: vanha)
+    asyncio.run(docker_api.kaynnista(str(tmp_path)))
+    assert vanha.pyynnot == []
+    assert cli == [["docker", "compose", "-f", "docker-compose.yml", "up", "-d"]]
+
+    # Samalla sekunnilla luotu kontti on ajantasainen
+    ajantasainen = JarjestysAPI([_kontti("db", luotu=2000)])
+    monkeypatch.setattr(docker_api, "asiakas", lambda: ajantasainen)
+    asyncio.run(docker_api.kaynnista(str(tmp_path)))
+    assert ajantasainen.pyynnot == ["/containers/db/start"] and len(cli) == 1
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+import geodesia
+
+
+def test_sama_piste_on_nolla():
+    assert geodesia.haversine(60.17, 24.94, 60.17, 24.94) == pytest.approx(0.0)
+    assert geodesia.vincenty(60.17, 24.94, 60.17, 24.94) == pytest.approx(0.0)
+
+
+def test_vincenty_tunnetut_wgs84_arvot():
+    # Neljännes meridiaania ja yksi pituusaste päiväntasaajalla (WGS84)
+    assert geodesia.vincenty(0, 0, 90, 0) == pytest.approx(10001.965729, abs=1e-5)
+    assert geodesia.vincenty(0, 0, 0, 1) == pytest.approx(111.319491, abs=1e-5)
+
+
+def test_haversine_pallomallilla():
+    neljannes = np.pi / 2 * geodesia.MAAN_SADE_KM
+    assert geodesia.haversine(0, 0, 90, 0) == pytest.approx(neljannes)
+    assert geodesia.haversine(0, 0, 0, 180) == pytest.approx(2 * neljannes)
+
+
+def test_menetelmat_lahella_toisiaan():
+    helsinki_tallinna = [[60.1699, 24.9384, 59.4370, 24.7536]]
+    h = geodesia.etaisyydet(helsinki_tallinna)[0]
+    v = geodesia.etaisyydet(helsinki_tallinna, "vincenty")[0]
+    assert 80 < h < 83
+    assert abs(h - v) / v < 0.005
+
+
+def test_antipodinen_piste_ei_ole_nan():
+    s = geodesia.vincenty(0, 0, 0.5, 179.7)
+    assert np.isfinite(s) and 19000 < s < 20100
+
+
+def test_matriisi_vastaa_pareja():
+    lahteet = [[60.17, 24.94], [61.50, 23.76]]
+    kohteet = [[65.01, 25.47], [60.45, 22.27], [59.44, 24.75]]
+    for menetelma in geodesia.MENETELMAT:
+        m = geodesia.etaisyysmatriisi(lahteet, kohteet, menetelma)
+        assert m.shape == (2, 3)
+        parit = [[*l, *k] for l in lahteet for k in kohteet]
+        np.testing.assert_allclose(m.ravel(), geodesia.etaisyydet(parit, menetelma))
+
+
+@pytest.mark.parametrize("parit", [
+    [[91, 0, 0, 0]],
+    [[0, 181, 0, 0]],
+    [[float("nan"), 0, 0, 0]],
+    [[0, 0, 0]],
+])
+def test_virheelliset_koordinaatit(parit):
+    with pytest.raises(ValueError):
+        geodesia.etaisyydet(parit)
+
+
+def test_tuntematon_menetelma():
+    with pytest.raises(ValueError):
+        geodesia.etaisyydet([[0, 0, 1, 1]], "manhattan")
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from hintavarasto import Hintavarasto
+
+
+@pytest.fixture
+def varasto(tmp_path):
+    csv = tmp_path / "hinnat.csv"
+    csv.write_text(
+        "Ticker,Date,Open,Close,Volume\n"
+        "aaa,2024-01-02,9,10,100\n"
+        "aaa,2024-01-03,10,,100\n"   # puuttuva päätöskurssi
+        "aaa,2024-01-05,11,12,100\n"
+        "aaa,2024/01/04,10,11,100\n"  # järjestys ja /-erotin korjataan
+        "bbb,2024-01-02,1,,1\n"
+        "bbb,2024-01-03,1,,1\n"
+    )
+    v = Hintavarasto(str(tmp_path / "varasto"))
+    assert v.tuo(str(csv)) == {"AAA": 4, "BBB": 2}
+    return v
+
+
+def test_hinta_edellinen_kaupankayntipaiva(varasto):
+    assert varasto.hinta("AAA", "2024/01/04") == ("2024-01-04", 11.0)
+    assert varasto.hinta("aaa", "2024-01-07") == ("2024-01-05", 12.0)
+    assert varasto.hinta("AAA", "2024-01-01") is None
+    assert varasto.hinta("CCC", "2024-01-05") is None
+
+
+def test_hinta_ohittaa_puuttuvan_kurssin(varasto):
+    assert varasto.hinta("AAA", "2024-01-03") == ("2024-01-02", 10.0)
+    assert varasto.hinta("BBB", "2024-01-03") is None
+
+
+def test_koosteet(varasto):
+    k = varasto.koosteet(["AAA"], "2024-01-02", "2024-01-05")["AAA"]
+    assert (k["lkm"], k["alku"], k["loppu"]) == (3, "2024-01-02", "2024-01-05")
+    assert (k["min"], k["max"], k["keskiarvo"]) == (10.0, 12.0, 11.0)
+    assert k["muutos_pros"] == 20.0
+
+
+def test_koosteet_ilman_arvoja_on_none(varasto, recwarn):
+    tulos = varasto.koosteet(["AAA", "BBB", "CCC"], "2024-01-03", "2024-01-03")
+    assert tulos == {"AAA": None, "BBB": None, "CCC": None}
+    assert not [w for w in recwarn if issubclass(w.category, RuntimeWarning)]
+    json.dumps(tulos, allow_nan=False)
+
+
+def test_uusi_tuonti_korvaa_saman_paivan(varasto, tmp_path):
+    lisa = tmp_path / "AAA.csv"
+    lisa.write_text("date,close\n2024-01-05,13\n2024-01-08,14\n")
+    assert varasto.tuo(str(lisa)) == {"AAA": 5}
+    assert varasto.hinta("AAA", "2024-01-05") == ("2024-01-05", 13.0)
+    assert varasto.tickerit() == ["AAA", "BBB"]
+
+
+def test_virheellinen_syote(varasto, tmp_path):
+    with pytest.raises(ValueError):
+        varasto.hinta("AA/A", "2024-01-05")
+    with pytest.raises(ValueError):
+        varasto.hinta("AAA", "ei päivä")
+    ilman_hintaa = tmp_path / "x.csv"
+    ilman_hintaa.write_text("date,open\n2024-01-05,1\n")
+    with pytest.raises(ValueError):
+        varasto.tuo(str(ilman_hintaa))
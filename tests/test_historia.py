@@ -0,0 +1,82 @@
+import pytest
+
+import historia
+import mittarit
+
+
+@pytest.fixture
+def mittari(monkeypatch):
+    """Tuoreet historiahistogrammit testille (prosessin yhteiset eivät sotkeudu)."""
+    tokenit = mittarit.Histogrammi("t", "", ("agentti", "vaihe"), mittarit.TOKENIRAJAT)
+    saasto = mittarit.Histogrammi("s", "", ("agentti",), mittarit.TOKENIRAJAT)
+    monkeypatch.setattr(mittarit, "historia_tokenit", tokenit)
+    monkeypatch.setattr(mittarit, "historia_saasto", saasto)
+    return tokenit, saasto
+
+
+def test_kierros_kirjataan_mittareihin(mittari, monkeypatch):
+    tokenit, saasto = mittari
+    monkeypatch.setattr(historia, "HISTORY_TOKEN_BUDGET", 50)
+    viestit = [{"role": "user", "content": "sana " * 200}] + [{"role": "user", "content": "hei"}] * 6
+    tulos = historia.historiakoukku("Orkestroija")(viestit)
+    assert tulos[0]["content"].startswith(historia.TIIVISTELMA_OTSIKKO)
+    ennen = tokenit._sarjat[("Orkestroija", "ennen")]
+    jalkeen = tokenit._sarjat[("Orkestroija", "jalkeen")]
+    assert ennen["maara"] == jalkeen["maara"] == 1
+    assert jalkeen["summa"] < ennen["summa"]
+    assert saasto._sarjat[("Orkestroija",)]["summa"] == ennen["summa"] - jalkeen["summa"]
+    assert "autogen_historia_tokenit" in mittarit.teksti()
+
+
+def test_budjettiin_mahtuva_ei_tiivisty(mittari):
+    tokenit, saasto = mittari
+    viestit = [{"role": "user", "content": "hei"}] * 10
+    assert historia.historiakoukku("A")(viestit) == viestit
+    assert tokenit._sarjat[("A", "jalkeen")]["maara"] == 1
+    assert saasto._sarjat == {}
+
+
+def _kutsu(i, nimi, argumentit="{}"):
+    return {"role": "assistant", "content": None,
+            "tool_calls": [{"id": f"k{i}", "function": {"name": nimi, "arguments": argumentit}}]}
+
+
+def _tulos(i, sisalto):
+    return {"role": "tool", "tool_call_id": f"k{i}", "content": sisalto}
+
+
+def _loppu(n=6):
+    return [{"role": "user", "content": f"viesti {i}"} for i in range(n)]
+
+
+def test_toistettu_listaus_korvataan_viittauksella():
+    listaus = "ympäristö\n" * 100
+    viestit = [_kutsu(1, "wp_listaa_ymparistot"), _tulos(1, listaus),
+               _kutsu(2, "wp_listaa_ymparistot"), _tulos(2, listaus)] + _loppu()
+    tulos = historia.tiivista(viestit, budjetti=100_000, sailyta=6)
+    assert tulos[1]["content"].startswith("[Vanhentunut tulos: wp_listaa_ymparistot")
+    assert tulos[3]["content"] == listaus
+    assert viestit[1]["content"] == listaus  # alkuperäinen ennallaan
+
+
+def test_vanha_tyokalutulos_lyhennetaan(monkeypatch):
+    monkeypatch.setattr(historia, "HISTORY_TOOL_MAX_CHARS", 50)
+    viestit = [_kutsu(1, "hae_kayttajat"), _tulos(1, "x" * 5000)] + _loppu()
+    tulos = historia.tiivista(viestit, budjetti=500, sailyta=6)
+    assert tulos[1]["content"].startswith("x" * 50 + "\n… [lyhennetty, 4950 merkkiä pois]")
+
+
+def test_tiivistelma_ei_jata_tulosta_ilman_kutsua():
+    # Budjetti täyttyy, kun kutsu on leikattu; sen tulos menee tiivistelmään kutsun mukana
+    viestit = [{"role": "user", "content": "sana " * 500}, _kutsu(1, "hae_kayttajat", "a" * 400),
+               _tulos(1, "kolme käyttäjää")] + _loppu(5)
+    tulos = historia.tiivista(viestit, budjetti=60, sailyta=5)
+    assert tulos[0]["content"].startswith(historia.TIIVISTELMA_OTSIKKO)
+    assert "hae_kayttajat -> kolme käyttäjää" in tulos[0]["content"]
+    assert tulos[1:] == viestit[3:]
+
+
+def test_pois_paalta_ja_lyhyt_historia_ennallaan():
+    viestit = [{"role": "user", "content": "sana " * 500}] * 3
+    assert historia.tiivista(viestit, budjetti=0) is viestit
+    assert historia.tiivista(viestit, budjetti=10, sailyta=6) is viestit
@@ -0,0 +1,46 @@
+import asyncio
+import json
+
+import pytest
+
+import komennot
+import mittarit
+from komennot import KomentoAikakatkaisu, KomentoVirhe, aja_komento
+
+
+def test_aikakatkaisu_ja_paluukoodi():
+    with pytest.raises(KomentoAikakatkaisu):
+        asyncio.run(aja_komento(["sleep", "5"], aikaraja=0.05))
+    with pytest.raises(KomentoVirhe) as e:
+        asyncio.run(aja_komento(["sh", "-c", "exit 4"]))
+    assert e.value.returncode == 4
+
+
+def test_syote_menee_stdiniin():
+    assert asyncio.run(aja_komento(["cat"], syote="rivi1\nrivi2\n")) == "rivi1\nrivi2"
+    # Prosessi, joka ei lue syötettä, ei kaada kutsua
+    assert asyncio.run(aja_komento(["true"], syote=b"x" * 1_000_000)) == ""
+
+
+def test_salaisuudet_peitetaan(monkeypatch, tmp_path, capsys):
+    jalki = tmp_path / "jalki.jsonl"
+    monkeypatch.setattr(mittarit, "TRACE_FILE", str(jalki))
+    monkeypatch.setattr(mittarit, "_jalki", None)
+    with pytest.raises(KomentoVirhe) as e:
+        asyncio.run(aja_komento(["sh", "-c", "echo pw=SALA >&2; exit 2"], salaiset=["SALA"]))
+    assert "SALA" not in str(e.value) and "SALA" not in " ".join(e.value.cmd)
+    assert "SALA" not in capsys.readouterr().out
+    rivit = [json.loads(r) for r in jalki.read_text().splitlines()]
+    assert rivit and all("SALA" not in json.dumps(r) for r in rivit)
+
+
+def test_peita():
+    assert komennot.peita(["-e", "PWD=abc", 5], ["abc", ""]) == ["-e", "PWD=***", "5"]
+
+
+def test_salaisuudet_peitetaan_tulosteesta():
+    rivit = []
+    tulos = asyncio.run(aja_komento(["sh", "-c", "echo a=SALA; echo b=SALA >&2"], salaiset=["SALA"],
+                                    rivi_callback=lambda virta, rivi: rivit.append((virta, rivi))))
+    assert tulos == "a=***"
+    assert sorted(rivit) == [("stderr", "b=***"), ("stdout", "a=***")]
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+import lepotila
+from docker_tila import projektin_nimi
+from lepotila import LEPOTILA, Lepotila, _tavut
+from rekisteri import Rekisteri
+
+
+class _Tilat:
+    """tila_valimuisti-korvike: `kaynnissa`-slugien kontit ovat käynnissä."""
+
+    def __init__(self):
+        self.kaynnissa = set()
+        self.kutsut = []
+
+    async def projektien_tilat(self):
+        return {projektin_nimi(s): {"db": "running", "wordpress": "running"} for s in self.kaynnissa}
+
+    async def palvelut(self, slug):
+        return {}
+
+    def vanhenna(self):
+        pass
+
+
+@pytest.fixture
+def docker(monkeypatch):
+    """Kirjaa lepotilan Docker-kutsut (`kutsut`); tilastot ilman liikennettä."""
+    tilat = _Tilat()
+    kutsut = tilat.kutsut
+
+    async def kaynnista(env_path, rivi_callback=None):
+        kutsut.append(("kaynnista", env_path))
+
+    async def pysayta(env_path, rivi_callback=None):
+        kutsut.append(("pysayta", env_path))
+
+    async def tilastot(projektit):
+        return {p: {"verkko": 0.0, "cpu_ns": 0} for p in projektit}
+
+    monkeypatch.setattr(lepotila.docker_api, "kaynnista", kaynnista)
+    monkeypatch.setattr(lepotila.docker_api, "pysayta", pysayta)
+    monkeypatch.setattr(lepotila.docker_api, "tilastot", tilastot)
+    monkeypatch.setattr(lepotila, "tila_valimuisti", tilat)
+    return tilat
+
+
+@pytest.fixture
+def rekisteri(tmp_path):
+    r = Rekisteri(str(tmp_path))
+    r.korvaa("sivu", "Sivu", "wordpress", 8080, status="käynnissä")
+    return r
+
+
+def test_kayttaa_annettua_rekisteria(tmp_path, rekisteri):
+    ajastin = Lepotila(raja=60, env_dir=str(tmp_path), rekisteri=rekisteri)
+    assert ajastin.rekisteri is rekisteri
+    with pytest.raises(RuntimeError):
+        Lepotila(raja=60, env_dir=str(tmp_path)).rekisteri
+
+
+def test_kayttamaton_sammutetaan_ja_herataan(tmp_path, rekisteri, docker):
+    ajastin = Lepotila(raja=60, env_dir=str(tmp_path))
+    ajastin.kayta_rekisteria(rekisteri)
+    docker.kaynnissa.add("sivu")
+    asyncio.run(ajastin.kierros())
+    ajastin._viimeisin["sivu"] -= 120
+    asyncio.run(ajastin.kierros())
+    polku = str(tmp_path / "sivu")
+    assert docker.kutsut == [("pysayta", polku)]
+    assert rekisteri.hae("sivu")["status"] == LEPOTILA
+
+    assert asyncio.run(ajastin.heraa("sivu", polku)) is True
+    assert docker.kutsut[-1] == ("kaynnista", polku)
+    assert rekisteri.hae("sivu")["status"] == "käynnissä"
+    assert (ajastin.tilastot()["lepuutetut"], ajastin.tilastot()["heratetyt"]) == (1, 1)
+
+
+def test_aktiivista_ei_lepuuteta(tmp_path, rekisteri, docker):
+    ajastin = Lepotila(raja=60, env_dir=str(tmp_path), rekisteri=rekisteri)
+    docker.kaynnissa.add("sivu")
+    asyncio.run(ajastin.kierros())
+    ajastin._viimeisin["sivu"] -= 120
+    ajastin.kirjaa("sivu")
+    asyncio.run(ajastin.kierros())
+    assert docker.kutsut == []
+    assert asyncio.run(ajastin.heraa("sivu", str(tmp_path / "sivu"))) is False
+
+
+def test_docker_stats_yksikot():
+    assert _tavut("1.45kB") == 1450.0
+    assert _tavut("2MiB") == 2 * 1024 ** 2
+    assert _tavut("12B") == 12.0
+    assert _tavut("--") == 0.0
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("autogen_core")
+
+import wordpress_tyokalut
+from rekisteri import Rekisteri
+
+
+class _Tilat:
+    """tila_valimuisti-korvike: kaikki ympäristöt pysähdyksissä."""
+
+    async def palvelut(self, slug):
+        return {"db": "exited", "wordpress": "exited"}
+
+    async def tilat_slugeille(self, slugit):
+        return {s: "pysähdyksissä" for s in slugit}
+
+    def vanhenna(self):
+        pass
+
+
+@pytest.fixture
+def ymparistot(tmp_path, monkeypatch):
+    rekisteri = Rekisteri(str(tmp_path))
+    monkeypatch.setattr(wordpress_tyokalut, "ENV_DIR", str(tmp_path))
+    monkeypatch.setattr(wordpress_tyokalut, "_rekisteri", rekisteri)
+    monkeypatch.setattr(wordpress_tyokalut, "tila_valimuisti", _Tilat())
+    for slug, portti in (("test-a", 8101), ("test-b", 8102), ("tuotanto", 8103)):
+        (tmp_path / slug).mkdir()
+        (tmp_path / slug / "docker-compose.yml").write_text("services: {}\n")
+        rekisteri.korvaa(slug, slug, "wordpress", portti, status="sammutettu")
+    return rekisteri
+
+
+def test_tulostaulukko_rakennetaan_palautusarvosta(ymparistot):
+    async def toiminto(slug):
+        if slug == "test-b":
+            raise RuntimeError("docker ei vastaa")
+        # Onnistuminen ratkeaa palautusarvosta, ei viestin sanoista
+        return True, "Virhe-sivu palautettu | ok"
+
+    teksti = asyncio.run(wordpress_tyokalut._massatoiminto(
+        "Testi", toiminto, [("test-a", "test-a"), ("test-b", "test-b"), ("puuttuu", None)]))
+    assert teksti.startswith("Testi: 1/3 onnistui")
+    rivit = teksti.splitlines()
+    assert rivit[4].startswith("| test-a | ok |") and rivit[4].endswith("Virhe-sivu palautettu / ok |")
+    assert rivit[5].startswith("| test-b | virhe |") and "docker ei vastaa" in rivit[5]
+    assert rivit[6].startswith("| puuttuu | virhe |")
+
+
+def test_valitsin_yhdistaa_globin_ja_nimikkeet(ymparistot):
+    kohteet = asyncio.run(wordpress_tyokalut._valitse_ymparistot(["test-a"], "test-*,portti=8102"))
+    assert kohteet == [("test-a", "test-a"), ("test-b", "test-b")]
+    kohteet = asyncio.run(wordpress_tyokalut._valitse_ymparistot(None, "tila=pysähdyksissä"))
+    assert sorted(slug for _, slug in kohteet) == ["test-a", "test-b", "tuotanto"]
+    with pytest.raises(ValueError):
+        asyncio.run(wordpress_tyokalut._valitse_ymparistot(None, "omistaja=minä"))
+
+
+def test_valitsimella_poisto_vaatii_vahvistuksen(ymparistot, tmp_path):
+    teksti = asyncio.run(wordpress_tyokalut.wp_poista_ymparistot(valitsin="test-*"))
+    assert "Mitään ei poistettu" in teksti
+    assert (tmp_path / "test-a").exists() and (tmp_path / "test-b").exists()
+
+
+def test_jo_sammutettu_on_onnistuminen(ymparistot):
+    teksti = asyncio.run(wordpress_tyokalut.wp_sammuta_ymparistot(["test-a", "puuttuu"]))
+    assert teksti.startswith("Sammutus: 1/2 onnistui")
+    assert "| test-a | ok |" in teksti and "| puuttuu | virhe |" in teksti
@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import pytest
+
+import puhujavalinta
+
+
+class Ryhma:
+    """GroupChatin osajoukko: viestit ja agentti nimellä."""
+
+    def __init__(self, *viestit):
+        self.messages = list(viestit)
+
+    def agent_by_name(self, nimi):
+        return nimi
+
+
+def _edellinen(nimi):
+    return SimpleNamespace(name=nimi)
+
+
+@pytest.fixture
+def valitse():
+    return puhujavalinta.valitsin(kayttaja="User", yleinen="Orkestroija", wp="WordPress_Expert")
+
+
+def test_tyokalukutsu_menee_suorittajalle(valitse):
+    ryhma = Ryhma({"name": "WordPress_Expert", "tool_calls": [{"id": "k1", "function": {"name": "wp_listaa_ymparistot"}}]})
+    assert valitse(_edellinen("WordPress_Expert"), ryhma) == "User"
+
+
+def test_tulos_palaa_kutsujalle(valitse):
+    kutsu = {"name": "Orkestroija", "tool_calls": [{"id": "k1", "function": {"name": "get_stock_price"}}]}
+    tulos = {"role": "tool", "tool_responses": [{"tool_call_id": "k1", "content": "12.3"}]}
+    assert valitse(_edellinen("User"), Ryhma(kutsu, tulos)) == "Orkestroija"
+
+
+def test_tuntemattoman_kutsujan_wp_tulos_asiantuntijalle(valitse):
+    kutsu = {"tool_calls": [{"id": "k1", "function": {"name": "wp_luo_ymparisto"}}]}
+    tulos = {"role": "tool", "tool_responses": [{"tool_call_id": "k1", "content": "ok"}]}
+    assert valitse(_edellinen("User"), Ryhma(kutsu, tulos)) == "WordPress_Expert"
+
+
+def test_orkestroija_delegoi_nimella(valitse):
+    ryhma = Ryhma({"content": "Tämä kuuluu WordPress_Expert-agentille."})
+    assert valitse(_edellinen("Orkestroija"), ryhma) == "WordPress_Expert"
+    assert valitse(_edellinen("WordPress_Expert"), Ryhma({"content": "Valmis."})) == "User"
+
+
+@pytest.mark.parametrize("sisalto, odotettu", [
+    ("Luo uusi WordPress-ympäristö porttiin 8081", "WordPress_Expert"),
+    ("Paljonko on Nokian osakkeen hinta?", "Orkestroija"),
+])
+def test_kayttajan_viesti_avainsanoilla(valitse, sisalto, odotettu):
+    assert valitse(_edellinen("User"), Ryhma({"content": sisalto})) == odotettu
+
+
+def test_monitulkintainen_jatetaan_llm_lle(valitse, monkeypatch):
+    monkeypatch.setitem(puhujavalinta.tilastot, "llm", 0)
+    for sisalto in ("Hei!", "Tallenna ympäristöjen käyttäjät tietokantaan"):
+        assert valitse(_edellinen("User"), Ryhma({"content": sisalto})) == "auto"
+    assert puhujavalinta.tilastot["llm"] == 2
+
+
+def test_auto_asetus_ohittaa_saannot(monkeypatch):
+    monkeypatch.setattr(puhujavalinta, "SPEAKER_SELECTION", "auto")
+    assert puhujavalinta.speaker_selection_method(kayttaja="User") == "auto"
@@ -0,0 +1,117 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+from rekisteri import Rekisteri, VarattuVirhe, REKISTERI_TIEDOSTO, VARATTU
+
+
+@pytest.fixture
+def rekisteri(tmp_path):
+    return Rekisteri(str(tmp_path))
+
+
+def _ymparisto(env_dir, slug, **meta):
+    polku = os.path.join(env_dir, slug)
+    os.makedirs(polku)
+    open(os.path.join(polku, "docker-compose.yml"), "w").close()
+    with open(os.path.join(polku, "meta.json"), "w") as mf:
+        json.dump(meta, mf)
+
+
+def test_lisaa_ja_hae(rekisteri):
+    rekisteri.lisaa("sivu", "Sivu", "wordpress", 8080, status="luotu")
+    rivi = rekisteri.hae("sivu")
+    assert (rivi["display_name"], rivi["type"], rivi["port"], rivi["status"]) == ("Sivu", "wordpress", 8080, "luotu")
+    assert rekisteri.hae("puuttuu") is None
+
+
+def test_lisaa_ei_korvaa_olemassa_olevaa_slugia(rekisteri):
+    rekisteri.lisaa("sivu", "Sivu", port=8080)
+    with pytest.raises(VarattuVirhe) as e:
+        rekisteri.lisaa("sivu", "Toinen", port=8081)
+    assert e.value.kentta == "slug"
+    assert rekisteri.hae("sivu")["display_name"] == "Sivu"
+    assert rekisteri.portin_kayttaja(8081) is None
+
+
+def test_portti_on_yksikasitteinen(rekisteri):
+    rekisteri.lisaa("a", "A", port=8080)
+    with pytest.raises(VarattuVirhe) as e:
+        rekisteri.lisaa("b", "B", port=8080)
+    assert (e.value.kentta, e.value.varaaja) == ("port", "a")
+    assert rekisteri.hae("b") is None
+    # Portittomia saa olla useita
+    rekisteri.lisaa("c", "C")
+    rekisteri.lisaa("d", "D")
+
+
+def test_paivita_varattuun_porttiin(rekisteri):
+    rekisteri.lisaa("a", "A", port=8080)
+    rekisteri.lisaa("b", "B", port=8081)
+    with pytest.raises(VarattuVirhe):
+        rekisteri.paivita("b", port=8080)
+    assert rekisteri.hae("b")["port"] == 8081
+    rekisteri.paivita("b", port=8082, status="käynnissä")
+    assert rekisteri.portin_kayttaja(8082) == "b"
+    with pytest.raises(ValueError):
+        rekisteri.paivita("b", tuntematon=1)
+
+
+def test_transaktio_peruu_kaiken(rekisteri):
+    with pytest.raises(RuntimeError):
+        with rekisteri.transaktio():
+            rekisteri.lisaa("a", "A", port=8080)
+            raise RuntimeError("keskeytys")
+    assert rekisteri.hae("a") is None
+
+
+def test_etsi_nayttonimella_ja_slugifioituna(rekisteri):
+    rekisteri.lisaa("oma_sivu", "Oma Sivu")
+    assert rekisteri.etsi("oma sivu")["slug"] == "oma_sivu"
+    assert rekisteri.etsi("OMA SIVU ")["slug"] == "oma_sivu"
+    assert rekisteri.etsi("Oma-Sivu", slugify=lambda n: n.lower().replace("-", "_"))["slug"] == "oma_sivu"
+    assert rekisteri.etsi("muu") is None
+
+
+def test_ensimmainen_kaytto_rakentaa_levylta(tmp_path):
+    _ymparisto(str(tmp_path), "a", display_name="A", type="wordpress", port=8080)
+    _ymparisto(str(tmp_path), "b", display_name="B", port=8080)  # sama portti levyllä
+    os.makedirs(tmp_path / ".pool")
+    rivit = {r["slug"]: r for r in Rekisteri(str(tmp_path)).listaa()}
+    assert sorted(rivit) == ["a", "b"]
+    assert rivit["a"]["port"] == 8080 and rivit["b"]["port"] is None
+    assert rivit["a"]["has_compose"] == 1
+
+
+def test_synkronoi_levylta_ei_vie_toisen_porttia(rekisteri, tmp_path):
+    rekisteri.lisaa("a", "A", port=8080)
+    _ymparisto(str(tmp_path), "kasin", display_name="Käsin", port=8080)
+    rivi = rekisteri.synkronoi_levylta("kasin")
+    assert rivi["display_name"] == "Käsin" and rivi["port"] is None
+    assert rekisteri.synkronoi_levylta("../ulkona") is None
+
+
+def test_vanhan_rekisterin_paallekkaiset_portit_nollataan(tmp_path):
+    conn = sqlite3.connect(tmp_path / REKISTERI_TIEDOSTO)
+    conn.executescript("""
+        CREATE TABLE ymparistot (slug TEXT PRIMARY KEY, display_name TEXT NOT NULL, type TEXT, port INTEGER,
+            status TEXT, has_compose INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, updated_at REAL NOT NULL);
+        CREATE INDEX idx_ymparistot_port ON ymparistot(port);
+        INSERT INTO ymparistot VALUES ('a', 'A', NULL, 80, NULL, 1, 0, 0), ('b', 'B', NULL, 80, NULL, 1, 0, 0);
+    """)
+    conn.commit()
+    conn.close()
+    rekisteri = Rekisteri(str(tmp_path))
+    assert [(r["slug"], r["port"]) for r in rekisteri.listaa()] == [("a", 80), ("b", None)]
+    with pytest.raises(VarattuVirhe):
+        rekisteri.paivita("b", port=80)
+
+
+def test_uudelleenrakennus_sailyttaa_varaukset(rekisteri, tmp_path):
+    rekisteri.lisaa("uusi", "Uusi", port=8080, status=VARATTU, has_compose=False)
+    _ymparisto(str(tmp_path), "vanha", display_name="Vanha", port=8080)
+    assert rekisteri.rakenna_uudelleen() == 1
+    assert rekisteri.hae("uusi")["port"] == 8080
+    assert rekisteri.hae("vanha")["port"] is None
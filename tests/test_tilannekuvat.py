@@ -0,0 +1,85 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+import tilannekuvat
+from rekisteri import Rekisteri
+
+
+@pytest.fixture
+def hakemisto(tmp_path, monkeypatch):
+    monkeypatch.setattr(tilannekuvat, "SNAPSHOT_DIR", str(tmp_path / ".snapshots"))
+    return tmp_path
+
+
+@pytest.fixture
+def komennot(monkeypatch):
+    """Kirjaa docker-komennot; `volume inspect` palauttaa `aja.kiinnityspisteet`."""
+    ajetut = []
+
+    async def aja(cmd, cwd=None, **kw):
+        ajetut.append(cmd)
+        if cmd[:3] == ["docker", "volume", "inspect"]:
+            return "\n".join(aja.kiinnityspisteet)
+        return ""
+
+    aja.kiinnityspisteet = []
+    aja.ajetut = ajetut
+    monkeypatch.setattr(tilannekuvat, "aja_komento", aja)
+    return aja
+
+
+def test_paivitys_kirjoittaa_aina_kayttamattomaan_sukupolveen(hakemisto):
+    ensimmainen = tilannekuvat.paivityksen_volyymit("sivu")
+    assert ensimmainen == tilannekuvat.volyymit("sivu")
+    tilannekuvat.tallenna("sivu", {"name": "sivu", "volumes": ensimmainen})
+    toinen = tilannekuvat.paivityksen_volyymit("sivu")
+    assert toinen == tilannekuvat.volyymit("sivu", "_b")
+    tilannekuvat.tallenna("sivu", {"name": "sivu", "volumes": toinen})
+    assert tilannekuvat.paivityksen_volyymit("sivu") == ensimmainen
+
+
+def test_listaus_vanhimmasta_uusimpaan_ja_rikkinainen_ohitetaan(hakemisto):
+    tilannekuvat.tallenna("b", {"name": "b", "created_at": 1})
+    tilannekuvat.tallenna("a", {"name": "a", "created_at": 2})
+    os.makedirs(os.path.join(tilannekuvat.SNAPSHOT_DIR, "rikki"))
+    assert [k["name"] for k in tilannekuvat.listaa()] == ["b", "a"]
+    assert tilannekuvat.lue("rikki") is None
+
+
+def test_nakyva_tyhja_kohde_kopioidaan_reflinkilla(tmp_path, komennot):
+    lahde, kohde = tmp_path / "lahde", tmp_path / "kohde"
+    lahde.mkdir()
+    kohde.mkdir()
+    komennot.kiinnityspisteet = [str(lahde), str(kohde)]
+    assert asyncio.run(tilannekuvat.kopioi_volyymi("v1", "v2")) == "cp --reflink=auto"
+    assert komennot.ajetut[-1] == ["cp", "-a", "--reflink=auto", os.path.join(str(lahde), "."), str(kohde)]
+
+
+def test_nakymaton_volyymi_kopioidaan_apukontissa(komennot):
+    komennot.kiinnityspisteet = ["/ei/ole"]
+    assert asyncio.run(tilannekuvat.kopioi_volyymi("v1", "v2")) == "apukontti"
+    assert komennot.ajetut[-1][:3] == ["docker", "run", "--rm"]
+
+
+def test_jaetun_tietokannan_ymparistoa_ei_kloonata(tmp_path, monkeypatch):
+    pytest.importorskip("autogen_core")
+    import wordpress_tyokalut
+
+    monkeypatch.setattr(wordpress_tyokalut, "ENV_DIR", str(tmp_path))
+    monkeypatch.setattr(wordpress_tyokalut, "_rekisteri", Rekisteri(str(tmp_path)))
+    lahde = tmp_path / "lahde"
+    lahde.mkdir()
+    (lahde / "docker-compose.yml").write_text("services: {}\n")
+    (lahde / "meta.json").write_text(json.dumps({"display_name": "lahde", "shared_db": {"name": "wp_lahde"}}))
+
+    async def ei_tilannekuvaa(*a, **kw):
+        raise AssertionError("tilannekuvaa ei pidä yrittää")
+
+    monkeypatch.setattr(wordpress_tyokalut, "_ota_tilannekuva", ei_tilannekuvaa)
+    viesti = asyncio.run(wordpress_tyokalut.wp_kloonaa_ymparisto("lahde", "klooni", 8099))
+    assert "jaettua tietokantaa" in viesti
+    assert not (tmp_path / "klooni").exists()
+    assert wordpress_tyokalut._rekisteri.hae("klooni") is None
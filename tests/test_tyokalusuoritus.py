@@ -0,0 +1,71 @@
+import asyncio
+import json
+import time
+
+from tyokalusuoritus import rinnakkainen_suoritus
+
+
+def _kutsu(i, nimi, **argumentit):
+    return {"id": f"k{i}", "function": {"name": nimi, "arguments": json.dumps(argumentit)}}
+
+
+def _aja(funktiot, kutsut, **asetukset):
+    suorita = rinnakkainen_suoritus(funktiot, **asetukset)
+    return asyncio.run(suorita(None, messages=[{"tool_calls": kutsut}]))
+
+
+def test_kutsut_rinnakkain_ja_jarjestyksessa():
+    async def odota(s, tunnus):
+        await asyncio.sleep(s)
+        return tunnus
+
+    alku = time.perf_counter()
+    valmis, vastaus = _aja({"odota": odota}, [_kutsu(1, "odota", s=0.2, tunnus="a"), _kutsu(2, "odota", s=0.1, tunnus="b"),
+                                              _kutsu(3, "odota", s=0.2, tunnus="c")], raja=3)
+    assert time.perf_counter() - alku < 0.45
+    assert valmis
+    assert [v["content"] for v in vastaus["tool_responses"]] == ["a", "b", "c"]
+    assert [v["tool_call_id"] for v in vastaus["tool_responses"]] == ["k1", "k2", "k3"]
+    assert vastaus["content"] == "a\n\nb\n\nc"
+
+
+def test_rinnakkaisuusraja():
+    kaynnissa, huippu = 0, 0
+
+    async def tyo():
+        nonlocal kaynnissa, huippu
+        kaynnissa += 1
+        huippu = max(huippu, kaynnissa)
+        await asyncio.sleep(0.02)
+        kaynnissa -= 1
+        return "ok"
+
+    _aja({"tyo": tyo}, [_kutsu(i, "tyo") for i in range(6)], raja=2)
+    assert huippu == 2
+
+
+def test_virheet_palautetaan_tuloksina():
+    async def hidas():
+        await asyncio.sleep(5)
+
+    def kaatuu():
+        raise RuntimeError("rikki")
+
+    def synkroninen(x):
+        return {"x": x}
+
+    kutsut = [_kutsu(1, "hidas"), _kutsu(2, "kaatuu"), _kutsu(3, "puuttuu"), _kutsu(4, "synkroninen", x=1),
+              {"id": "k5", "function": {"name": "synkroninen", "arguments": "{rikki"}}]
+    _, vastaus = _aja({"hidas": hidas, "kaatuu": kaatuu, "synkroninen": synkroninen}, kutsut,
+                      aikaraja=5, aikarajat={"hidas": 0.05})
+    sisallot = [v["content"] for v in vastaus["tool_responses"]]
+    assert sisallot[0] == "Virhe: työkalu 'hidas' ei valmistunut 0.05 sekunnissa."
+    assert sisallot[1] == "Virhe työkalussa 'kaatuu': rikki"
+    assert sisallot[2] == "Virhe: työkalua 'puuttuu' ei löydy."
+    assert sisallot[3] == '{"x": 1}'
+    assert sisallot[4].startswith("Virhe: työkalun 'synkroninen' argumentit eivät ole kelvollista JSONia")
+
+
+def test_viesti_ilman_kutsuja_ohitetaan():
+    suorita = rinnakkainen_suoritus({})
+    assert asyncio.run(suorita(None, messages=[{"content": "hei"}])) == (False, None)
@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+import valimuisti
+from valimuisti import LRUValimuisti, LevyValimuisti, PUUTTUU, muistiin
+
+
+class Kello:
+    def __init__(self):
+        self.nyt = 1000.0
+
+    def __call__(self):
+        return self.nyt
+
+
+@pytest.fixture
+def kello(monkeypatch):
+    k = Kello()
+    monkeypatch.setattr(valimuisti.time, "monotonic", k)
+    return k
+
+
+def test_lru_poistaa_vanhimman_kaytetyn():
+    muisti = LRUValimuisti(maksimi=2, ttl=0)
+    muisti.aseta("a", 1)
+    muisti.aseta("b", 2)
+    assert muisti.hae("a") == 1  # a on nyt tuorein
+    muisti.aseta("c", 3)
+    assert muisti.hae("b") is PUUTTUU
+    assert (muisti.hae("a"), muisti.hae("c")) == (1, 3)
+    assert muisti.tilastot()["poistot"] == 1
+
+
+def test_ttl_vanhenee(kello):
+    muisti = LRUValimuisti(ttl=10)
+    muisti.aseta("a", 1)
+    muisti.aseta("b", 2, ttl=100)
+    kello.nyt += 11
+    assert muisti.hae("a") is PUUTTUU
+    assert muisti.hae("b") == 2
+    assert len(muisti) == 1
+
+
+def test_none_on_kelvollinen_arvo():
+    muisti = LRUValimuisti()
+    muisti.aseta("a", None)
+    assert muisti.hae("a") is None
+
+
+def test_tagin_mitatointi():
+    muisti = LRUValimuisti()
+    muisti.aseta("k1", 1, tagit=("kayttajat",))
+    muisti.aseta("k2", 2, tagit=("kayttajat", "muu"))
+    muisti.aseta("m", 3, tagit=("muu",))
+    assert muisti.mitatoi_tagi("kayttajat") == 2
+    assert muisti.hae("k1") is PUUTTUU and muisti.hae("m") == 3
+    t = muisti.tilastot()
+    assert (t["mitatoinnit"], t["osumat"], t["ohitukset"], t["osumaprosentti"]) == (2, 1, 1, 50.0)
+
+
+def test_levyvalimuisti_sailyy_ja_vanhenee(tmp_path, monkeypatch):
+    polku = str(tmp_path / "v.sqlite3")
+    LevyValimuisti(polku).aseta("ns", "a", {"x": [1, 2]})
+    LevyValimuisti(polku).aseta("ns", "vanha", 1, ttl=5)
+    LevyValimuisti(polku).aseta("ns", "ei_json", object())
+    uusi = LevyValimuisti(polku)
+    assert uusi.hae("ns", "a") == {"x": [1, 2]}
+    assert uusi.hae("muu", "a") is PUUTTUU
+    assert uusi.hae("ns", "ei_json") is PUUTTUU
+    nyt = valimuisti.time.time()
+    monkeypatch.setattr(valimuisti.time, "time", lambda: nyt + 10)
+    assert uusi.hae("ns", "vanha") is PUUTTUU
+
+
+def test_muistiin_yhdistaa_samanaikaiset_kutsut():
+    kutsut = []
+
+    @muistiin(ttl=60)
+    async def hidas(x, kerroin=2):
+        kutsut.append(x)
+        await asyncio.sleep(0.01)
+        return x * kerroin
+
+    async def aja():
+        tulokset = await asyncio.gather(hidas(3), hidas(3), hidas(x=3), hidas(4))
+        return tulokset, await hidas(3, kerroin=2)
+
+    tulokset, myohempi = asyncio.run(aja())
+    assert tulokset == [6, 6, 6, 8] and myohempi == 6
+    assert sorted(kutsut) == [3, 4]
+    assert hidas.valimuisti.tilastot()["osumat"] == 1
+
+
+def test_muistiin_ei_tallenna_poikkeusta():
+    kutsut = []
+
+    @muistiin()
+    async def epavakaa(x):
+        kutsut.append(x)
+        if len(kutsut) == 1:
+            raise RuntimeError("ohimenevä")
+        return x
+
+    async def aja():
+        with pytest.raises(RuntimeError):
+            await epavakaa(1)
+        return await epavakaa(1)
+
+    assert asyncio.run(aja()) == 1
+    assert kutsut == [1, 1]
+
+
+def test_muistiin_levytaso(tmp_path, monkeypatch):
+    monkeypatch.setattr(valimuisti, "_levytaso", LevyValimuisti(str(tmp_path / "t.sqlite3")))
+    kutsut = []
+
+    def tee():
+        @muistiin(levy=True, nimi="tyokalu")
+        async def tyokalu(x):
+            kutsut.append(x)
+            return {"x": x}
+        return tyokalu
+
+    assert asyncio.run(tee()(5)) == {"x": 5}
+    # Uusi dekoraattori (tyhjä muisti, kuten uudelleenkäynnistyksen jälkeen) lukee levyltä
+    assert asyncio.run(tee()(5)) == {"x": 5}
+    assert kutsut == [5]
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+import jaettu_tietokanta
+import ymparistopooli
+from ymparistopooli import Ymparistopooli, VALMIS
+
+
+@pytest.fixture
+def komennot(monkeypatch):
+    """Kirjaa poolin docker-komennot ajamatta niitä; `epaonnistuu` kaataa annetut komennot."""
+    ajetut = []
+
+    async def aja(cmd, cwd=None, **kw):
+        ajetut.append((cmd, cwd))
+        if any(osa in cmd for osa in aja.epaonnistuu) and cwd in aja.epaonnistuvat_polut:
+            raise RuntimeError("docker ei vastaa")
+        return ""
+
+    aja.epaonnistuu = ()
+    aja.epaonnistuvat_polut = ()
+    aja.ajetut = ajetut
+    monkeypatch.setattr(ymparistopooli, "aja_komento", aja)
+    return aja
+
+
+def _valmis(hakemisto, nimi, **meta):
+    polku = os.path.join(hakemisto, nimi)
+    os.makedirs(polku)
+    if meta:
+        with open(os.path.join(polku, "meta.json"), "w") as mf:
+            json.dump(meta, mf)
+    open(os.path.join(polku, VALMIS), "w").close()
+    return polku
+
+
+def test_pois_paalta_ei_lunasta(tmp_path, komennot):
+    pooli = Ymparistopooli(koko=0, hakemisto=str(tmp_path))
+    _valmis(str(tmp_path), "pool_a")
+    assert asyncio.run(pooli.lunasta()) is None
+    assert komennot.ajetut == []
+
+
+def test_lunastus_ottaa_valmiin_ja_kirjaa_osuman(tmp_path, komennot):
+    pooli = Ymparistopooli(koko=2, hakemisto=str(tmp_path))
+    polku = _valmis(str(tmp_path), "pool_a", shared_db={"name": "wp_pool_a"})
+    ymp = asyncio.run(pooli.lunasta())
+    assert ymp == (polku, "pool_a", {"name": "wp_pool_a"})
+    assert os.listdir(polku) == ["meta.json"]
+    assert komennot.ajetut == [(["docker", "compose", "-f", "docker-compose.yml", "down"], polku)]
+    assert asyncio.run(pooli.lunasta()) is None
+    assert (pooli.tilastot()["osumat"], pooli.tilastot()["ohitukset"]) == (1, 1)
+
+
+def test_epaonnistunut_lunastus_poistetaan_ja_seuraava_kokeillaan(tmp_path, komennot):
+    pooli = Ymparistopooli(koko=2, hakemisto=str(tmp_path))
+    rikki = _valmis(str(tmp_path), "pool_a")
+    ehja = _valmis(str(tmp_path), "pool_b")
+    os.utime(os.path.join(ehja, VALMIS), (os.path.getmtime(os.path.join(rikki, VALMIS)) + 1,) * 2)
+    komennot.epaonnistuu = ("down",)
+    komennot.epaonnistuvat_polut = (rikki,)
+    ymp = asyncio.run(pooli.lunasta())
+    assert ymp.polku == ehja
+    assert not os.path.exists(rikki)
+
+
+def test_hylkaa_poistaa_volyymit_tietokannan_ja_hakemiston(tmp_path, komennot, monkeypatch):
+    poistetut = []
+
+    async def poista_tietokanta(tunnukset):
+        poistetut.append(tunnukset)
+
+    monkeypatch.setattr(jaettu_tietokanta, "poista_tietokanta", poista_tietokanta)
+    pooli = Ymparistopooli(koko=1, hakemisto=str(tmp_path))
+    polku = _valmis(str(tmp_path), "pool_a", shared_db={"name": "wp_pool_a"})
+    ymp = asyncio.run(pooli.lunasta())
+    siirretty = str(tmp_path / "sivu")
+    os.rename(polku, siirretty)
+    asyncio.run(pooli.hylkaa(ymp, siirretty))
+    assert komennot.ajetut[-1][0] == ["docker", "volume", "rm", "-f", "pool_a_db_data", "pool_a_wordpress_data"]
+    assert poistetut == [{"name": "wp_pool_a"}]
+    assert not os.path.exists(siirretty)
@@ -0,0 +1,127 @@
+# tietokanta.py
+# Jaettu asynkroninen PostgreSQL-yhteyspooli (psycopg 3 + psycopg_pool) kaikille
+# tietokantatyökaluille. Pooli luodaan kerran ja yhteydet käytetään uudelleen,
+# joten kutsut eivät maksa TCP- ja autentikointikättelyä joka kerta.
+
+import os
+import re
+import uuid
+import asyncio
+from psycopg import AsyncConnection
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+DB_CONFIG = {
+    "dbname": os.getenv("DB_NAME", "dbautogen"),
+    "user": os.getenv("DB_USER", "postgres"),
+    "password": os.getenv("DB_PASS", ""),
+    "host": os.getenv("DB_HOST", "localhost"),
+    "port": os.getenv("DB_PORT", "5432")
+}
+
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# Kuinka monta riviä palvelinpuolen kursori hakee kerralla
+DB_FETCH_SIZE = int(os.getenv("DB_FETCH_SIZE", "500"))
+
+# LISTEN/NOTIFY-kanava, johon taulujen muutostriggerit ilmoittavat taulun nimen
+DB_NOTIFY_CHANNEL = os.getenv("DB_NOTIFY_CHANNEL", "tietokanta_muutos")
+DB_LISTEN_RETRY = float(os.getenv("DB_LISTEN_RETRY", "5"))
+
+_pooli = None
+_lukko = None
+
+
+async def avaa_pooli() -> AsyncConnectionPool:
+    """Avaa prosessin yhteinen yhteyspooli (idempotentti). Kutsutaan käynnistyksessä tai ensimmäisellä haulla."""
+    global _pooli, _lukko
+    if _pooli is not None:
+        return _pooli
+    if _lukko is None:
+        _lukko = asyncio.Lock()
+    async with _lukko:
+        if _pooli is None:
+            pooli = AsyncConnectionPool(
+                conninfo=make_conninfo(**DB_CONFIG),
+                min_size=DB_POOL_MIN,
+                max_size=DB_POOL_MAX,
+                open=False,
+            )
+            await pooli.open()
+            _pooli = pooli
+    return _pooli
+
+
+async def sulje_pooli():
+    global _pooli
+    if _pooli is not None:
+        await _pooli.close()
+        _pooli = None
+
+
+async def virtaa_rivit(sql: str, params=(), eran_koko: int = DB_FETCH_SIZE):
+    """Aja kysely palvelinpuolen kursorilla ja tuota rivit (dict) erissä.
+
+    Koko tulosjoukkoa ei koskaan ladata muistiin kerralla.
+    """
+    pooli = await avaa_pooli()
+    async with pooli.connection() as conn:
+        async with conn.cursor(name=f"virta_{uuid.uuid4().hex}", row_factory=dict_row) as cur:
+            cur.itersize = eran_koko
+            await cur.execute(sql, params)
+            while True:
+                rivit = await cur.fetchmany(eran_koko)
+                if not rivit:
+                    break
+                for rivi in rivit:
+                    yield rivi
+
+
+def _tunniste(nimi: str) -> str:
+    if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", nimi):
+        raise ValueError(f"Virheellinen SQL-tunniste: {nimi}")
+    return nimi
+
+
+async def asenna_muutosilmoitus(taulu: str, kanava: str = DB_NOTIFY_CHANNEL):
+    """Luo tauluun triggerin, joka lähettää NOTIFY <kanava>, '<taulu>' jokaisen muutoslauseen jälkeen."""
+    taulu, kanava = _tunniste(taulu), _tunniste(kanava)
+    pooli = await avaa_pooli()
+    async with pooli.connection() as conn:
+        await conn.execute(
+            "CREATE OR REPLACE FUNCTION ilmoita_taulun_muutos() RETURNS trigger AS $$ "
+            "BEGIN PERFORM pg_notify(TG_ARGV[0], TG_TABLE_NAME); RETURN NULL; END; "
+            "$$ LANGUAGE plpgsql"
+        )
+        await conn.execute(f"DROP TRIGGER IF EXISTS {taulu}_muutosilmoitus ON {taulu}")
+        await conn.execute(
+            f"CREATE TRIGGER {taulu}_muutosilmoitus AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {taulu} "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION ilmoita_taulun_muutos('{kanava}')"
+        )
+
+
+async def kuuntele_muutoksia(callback, kanava: str = DB_NOTIFY_CHANNEL, yhdistetty=None):
+    """Kuuntele LISTEN-kanavaa omalla (poolin ulkopuolisella) yhteydellä, kunnes tehtävä perutaan.
+
+    `callback(taulu)` kutsutaan jokaisesta ilmoituksesta; `callback(None)` kun yhteys
+    katkeaa (ilmoituksia on voinut jäädä saamatta). `yhdistetty(bool)` kertoo yhteyden tilan.
+    """
+    kanava = _tunniste(kanava)
+    while True:
+        try:
+            conn = await AsyncConnection.connect(make_conninfo(**DB_CONFIG), autocommit=True)
+            async with conn:
+                await conn.execute(f"LISTEN {kanava}")
+                if yhdistetty:
+                    yhdistetty(True)
+                async for ilmoitus in conn.notifies():
+                    callback(ilmoitus.payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Varoitus: LISTEN {kanava} katkesi: {e}")
+        if yhdistetty:
+            yhdistetty(False)
+        callback(None)
+        await asyncio.sleep(DB_LISTEN_RETRY)
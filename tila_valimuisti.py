@@ -0,0 +1,148 @@
+# tila_valimuisti.py
+# Tapahtumapohjainen konttitilojen välimuisti.
+# Taustatehtävä seuraa `docker events` -virtaa compose-konteille ja pitää muistissa
+# tilakartan {projekti: {palvelu: tila}}. Listaus- ja käynnistys/sammutustyökalut
+# lukevat tilan tästä kartasta sen sijaan, että kysyisivät Dockerilta joka kerta.
+# Jos virta katkeaa, tila haetaan uudelleen yhdellä `docker ps` -kutsulla TTL:n välein.
+
+import os
+import json
+import time
+import asyncio
+from komennot import aja_komento
+from docker_tila import PROJEKTI_LABEL, PALVELU_LABEL, hae_projektien_tilat, projektin_nimi, tila_teksti
+
+# Kuinka vanha tilakartta kelpaa, kun events-virta ei ole käytössä (sekunteina)
+DOCKER_STATUS_TTL = float(os.getenv("DOCKER_STATUS_TTL", "30"))
+# Odotus ennen events-virran uudelleenkäynnistystä katkeamisen jälkeen
+DOCKER_EVENTS_RETRY = float(os.getenv("DOCKER_EVENTS_RETRY", "5"))
+
+# docker events -toiminto -> konttitila
+_TOIMINNOT = {
+    "create": "created",
+    "start": "running",
+    "restart": "running",
+    "unpause": "running",
+    "pause": "paused",
+    "die": "exited",
+    "stop": "exited",
+    "kill": "exited",
+    "oom": "exited",
+}
+
+
+class TilaValimuisti:
+    """Compose-projektien tilakartta, jota päivittää `docker events` -virta tai TTL-haku."""
+
+    def __init__(self, ttl: float = DOCKER_STATUS_TTL):
+        self.ttl = ttl
+        self._tilat = {}
+        self._haettu = 0.0
+        self._virta_ok = False
+        self._tehtava = None
+        self._lukko = None
+
+    @property
+    def virta_kaynnissa(self) -> bool:
+        return self._virta_ok
+
+    def kaynnista(self):
+        """Käynnistä events-taustatehtävä, jos se ei ole jo käynnissä (vaatii käynnissä olevan silmukan)."""
+        if self._tehtava is None or self._tehtava.done():
+            self._tehtava = asyncio.get_running_loop().create_task(self._seuraa())
+
+    async def pysayta(self):
+        if self._tehtava is not None:
+            self._tehtava.cancel()
+            try:
+                await self._tehtava
+            except asyncio.CancelledError:
+                pass
+            self._tehtava = None
+        self._virta_ok = False
+
+    async def _seuraa(self):
+        while True:
+            # --since kattaa aukon tilannekuvan ja virran käynnistymisen välillä
+            alku = int(time.time())
+            try:
+                await self.paivita()
+                self._virta_ok = True
+                await aja_komento(
+                    [
+                        "docker", "events",
+                        "--since", str(alku),
+                        "--filter", "type=container",
+                        "--filter", f"label={PROJEKTI_LABEL}",
+                        "--format", "{{json .}}",
+                    ],
+                    aikaraja=0,
+                    rivi_callback=self._kasittele_rivi,
+                    rajoita=False,
+                )
+                print("Varoitus: docker events -virta päättyi, käytetään TTL-päivitystä.")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Varoitus: docker events -virta katkesi: {e}")
+            self._virta_ok = False
+            await asyncio.sleep(DOCKER_EVENTS_RETRY)
+
+    def _kasittele_rivi(self, virta, rivi):
+        if virta != "stdout" or not rivi:
+            return
+        try:
+            tapahtuma = json.loads(rivi)
+        except ValueError:
+            return
+        attribuutit = (tapahtuma.get("Actor") or {}).get("Attributes") or {}
+        projekti = attribuutit.get(PROJEKTI_LABEL)
+        palvelu = attribuutit.get(PALVELU_LABEL)
+        if not projekti or not palvelu:
+            return
+        toiminto = (tapahtuma.get("Action") or tapahtuma.get("status") or "").split(":")[0]
+        if toiminto == "destroy":
+            palvelut = self._tilat.get(projekti, {})
+            palvelut.pop(palvelu, None)
+            if not palvelut:
+                self._tilat.pop(projekti, None)
+            return
+        tila = _TOIMINNOT.get(toiminto)
+        if tila:
+            self._tilat.setdefault(projekti, {})[palvelu] = tila
+
+    async def paivita(self):
+        """Hae koko tilakartta yhdellä docker ps -kutsulla."""
+        if self._lukko is None:
+            self._lukko = asyncio.Lock()
+        async with self._lukko:
+            self._tilat = await hae_projektien_tilat()
+            self._haettu = time.monotonic()
+
+    async def projektien_tilat(self) -> dict:
+        """Palauta {projekti: {palvelu: tila}}; virran ollessa poikki päivitetään TTL:n mukaan."""
+        self.kaynnista()
+        if not self._virta_ok and time.monotonic() - self._haettu > self.ttl:
+            await self.paivita()
+        return self._tilat
+
+    async def palvelut(self, slug: str) -> dict:
+        """Yhden ympäristön palvelutilat {palvelu: tila}."""
+        return dict((await self.projektien_tilat()).get(projektin_nimi(slug), {}))
+
+    async def tilat_slugeille(self, slugit) -> dict:
+        """Kuten docker_tila.hae_tilat_slugeille, mutta muistissa olevasta kartasta."""
+        projektit = await self.projektien_tilat()
+        return {slug: tila_teksti(projektit.get(projektin_nimi(slug))) for slug in slugit}
+
+    def vanhenna(self):
+        """Pakota TTL-haku seuraavalla kyselyllä, jos events-virta ei ole käytössä.
+
+        Kun virta on käynnissä, omat compose-komennot näkyvät kartassa tapahtumina.
+        """
+        if not self._virta_ok:
+            self._haettu = 0.0
+
+
+# Prosessin yhteinen välimuisti
+tila_valimuisti = TilaValimuisti()
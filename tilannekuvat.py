@@ -0,0 +1,128 @@
+# tilannekuvat.py
+# Ympäristöjen tilannekuvat (snapshot) ja kloonaus volyymikopioina.
+# Tilannekuva kopioi ympäristön db_data- ja wordpress_data-volyymit omiksi
+# volyymeikseen (wpsnap_<nimi>_*); klooni kopioi ne uuden ympäristön volyymeiksi ennen
+# `up -d`:tä, joten asennettu WordPress, pluginit ja sisältö ovat valmiina sekunneissa.
+#
+# Kopiointitapa valitaan volyymien sijainnin mukaan:
+# - volyymien hakemistot näkyvät tälle prosessille (Docker samalla koneella, oikeudet riittävät):
+#   tyhjään kohteeseen `cp -a --reflink=auto` (btrfs/XFS: copy-on-write, lähes hetkessä),
+#   olemassa olevaan kohteeseen `rsync -a --delete` (vain muuttuneet tiedostot), jos saatavilla
+# - muuten apukontti (WP_SNAPSHOT_HELPER_IMAGE), joka liittää molemmat volyymit ja kopioi.
+#
+# Tilannekuvien metatiedot: ENV_DIR/.snapshots/<nimi>/meta.json
+#
+# Päivitys kopioi aina sukupolveen, johon meta.json ei osoita (wpsnap_<nimi>_* ja
+# wpsnap_<nimi>_b_* vuorotellen), ja meta.json vaihdetaan vasta onnistuneen kopion jälkeen:
+# keskeytynyt päivitys ei koskaan jätä tilannekuvaa osoittamaan puolityhjiin volyymeihin.
+#
+# Asetukset: WP_SNAPSHOT_DIR, WP_SNAPSHOT_HELPER_IMAGE
+
+import os
+import json
+import time
+import shutil
+import asyncio
+from komennot import aja_komento
+from compose_pohjat import volyymi_nimet
+
+SNAPSHOT_DIR = os.getenv("WP_SNAPSHOT_DIR", os.path.join(os.getenv("DOCKER_ENV_DIR", "./environments"), ".snapshots"))
+SNAPSHOT_HELPER_IMAGE = os.getenv("WP_SNAPSHOT_HELPER_IMAGE", "alpine:3")
+
+VOLYYMI_PREFIX = "wpsnap_"
+SUKUPOLVET = ("", "_b")
+
+
+def volyymit(nimi: str, sukupolvi: str = "") -> dict:
+    """Tilannekuvan volyymien Docker-nimet: {'db_data': ..., 'wordpress_data': ...}."""
+    return volyymi_nimet(f"{VOLYYMI_PREFIX}{nimi}{sukupolvi}")
+
+
+def paivityksen_volyymit(nimi: str) -> dict:
+    """Uuden kopion kohde: sukupolvi, jota nykyinen meta.json ei käytä (edellinen säilyy ehjänä)."""
+    nykyiset = (lue(nimi) or {}).get("volumes")
+    return next(v for v in (volyymit(nimi, s) for s in SUKUPOLVET) if v != nykyiset)
+
+
+def lue(nimi: str):
+    """Tilannekuvan meta.json tai None, jos tilannekuvaa ei ole."""
+    try:
+        with open(os.path.join(SNAPSHOT_DIR, nimi, "meta.json")) as mf:
+            return json.load(mf)
+    except (OSError, ValueError):
+        return None
+
+
+def listaa() -> list:
+    """Kaikki tilannekuvat vanhimmasta uusimpaan."""
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return []
+    kuvat = [lue(d) for d in sorted(os.listdir(SNAPSHOT_DIR))]
+    return sorted((k for k in kuvat if k), key=lambda k: k.get("created_at", 0))
+
+
+def tallenna(nimi: str, meta: dict):
+    polku = os.path.join(SNAPSHOT_DIR, nimi)
+    os.makedirs(polku, exist_ok=True)
+    with open(os.path.join(polku, "meta.json.tmp"), "w") as mf:
+        json.dump(meta, mf)
+    os.replace(os.path.join(polku, "meta.json.tmp"), os.path.join(polku, "meta.json"))
+
+
+async def poista(nimi: str):
+    """Poista tilannekuvan metatiedot ja molempien sukupolvien volyymit."""
+    shutil.rmtree(os.path.join(SNAPSHOT_DIR, nimi), ignore_errors=True)
+    await aja_komento(["docker", "volume", "rm", "-f", *(v for s in SUKUPOLVET for v in volyymit(nimi, s).values())])
+
+
+async def _kiinnityspisteet(*nimet) -> list:
+    """Volyymien hakemistot isännällä (docker volume inspect), tai None jos ei luettavissa tältä prosessilta."""
+    out = await aja_komento(["docker", "volume", "inspect", "-f", "{{.Mountpoint}}", *nimet])
+    polut = out.splitlines()
+    if len(polut) != len(nimet):
+        return [None] * len(nimet)
+    return [p if p and os.path.isdir(p) and os.access(p, os.R_OK | os.X_OK) else None for p in polut]
+
+
+async def kopioi_volyymi(lahde: str, kohde: str) -> str:
+    """Kopioi volyymin `lahde` sisältö volyymiin `kohde` (luodaan tarvittaessa). Palauttaa käytetyn tavan."""
+    await aja_komento(["docker", "volume", "create", kohde])
+    lahde_polku, kohde_polku = await _kiinnityspisteet(lahde, kohde)
+
+    if lahde_polku and kohde_polku and os.access(kohde_polku, os.W_OK):
+        if not os.listdir(kohde_polku):
+            await aja_komento(["cp", "-a", "--reflink=auto", os.path.join(lahde_polku, "."), kohde_polku], aikaraja=0)
+            return "cp --reflink=auto"
+        if shutil.which("rsync"):
+            await aja_komento(["rsync", "-a", "--delete", lahde_polku + "/", kohde_polku + "/"], aikaraja=0)
+            return "rsync (inkrementaalinen)"
+        await aja_komento(["find", kohde_polku, "-mindepth", "1", "-delete"], aikaraja=0)
+        await aja_komento(["cp", "-a", "--reflink=auto", os.path.join(lahde_polku, "."), kohde_polku], aikaraja=0)
+        return "cp --reflink=auto"
+
+    # Docker toisella koneella tai rootless: kopio apukontissa (kohde tyhjennetään ensin)
+    await aja_komento([
+        "docker", "run", "--rm", "-v", f"{lahde}:/lahde:ro", "-v", f"{kohde}:/kohde", SNAPSHOT_HELPER_IMAGE,
+        "sh", "-c", "find /kohde -mindepth 1 -delete && cp -a /lahde/. /kohde/",
+    ], aikaraja=0)
+    return "apukontti"
+
+
+async def kopioi_volyymit(lahteet: dict, kohteet: dict, avaimet=("db_data", "wordpress_data")) -> str:
+    """Kopioi volyymiparit rinnakkain ({'db_data': nimi, ...}). Palauttaa kopiointitavat tekstinä."""
+    tavat = await asyncio.gather(*(kopioi_volyymi(lahteet[a], kohteet[a]) for a in avaimet))
+    return ", ".join(sorted(set(tavat)))
+
+
+def uusi_meta(nimi: str, lahde_slug: str, lahde_meta: dict, kohteet: dict, tapa: str, kesto: float) -> dict:
+    return {
+        "name": nimi,
+        "source": lahde_slug,
+        "display_name": lahde_meta.get("display_name", lahde_slug),
+        "type": lahde_meta.get("type", "wordpress"),
+        "port": lahde_meta.get("port"),
+        "volumes": kohteet,
+        "copy": tapa,
+        "copy_seconds": round(kesto, 2),
+        "created_at": time.time(),
+    }
@@ -0,0 +1,81 @@
+# tyokalusuoritus.py
+# Yhden LLM-viestin useat tool_calls-kutsut suoritetaan rinnakkain (asyncio.gather),
+# jolloin esim. kolmen ympäristön käynnistys tai viiden osakkeen hintahaku kestää
+# hitaimman kutsun verran eikä kutsujen summaa. Rinnakkaisuus on rajattu, jokaisella
+# kutsulla on oma aikaraja ja tulokset palautetaan kutsujen järjestyksessä.
+#
+# Asetukset: TOOL_MAX_CONCURRENCY (kutsuja yhtä aikaa yhdestä viestistä),
+# TOOL_TIMEOUT (sekuntia per kutsu, 0 = ei aikarajaa)
+
+import os
+import json
+import time
+import asyncio
+import inspect
+
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "4"))
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "900"))
+
+
+async def _suorita_kutsu(kutsu: dict, funktiot, semafori, aikaraja: float) -> dict:
+    """Suorita yksi tool_call; virheet palautetaan työkalun tuloksena, jotta LLM näkee ne."""
+    funktio = kutsu.get("function", {})
+    nimi = funktio.get("name", "")
+    vastaus = {"tool_call_id": kutsu.get("id"), "role": "tool"}
+
+    func = funktiot.get(nimi)
+    if func is None:
+        return dict(vastaus, content=f"Virhe: työkalua '{nimi}' ei löydy.")
+    try:
+        argumentit = json.loads(funktio.get("arguments") or "{}")
+    except ValueError as e:
+        return dict(vastaus, content=f"Virhe: työkalun '{nimi}' argumentit eivät ole kelvollista JSONia: {e}")
+
+    async with semafori:
+        alku = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(func):
+                kesken = func(**argumentit)
+            else:
+                kesken = asyncio.to_thread(func, **argumentit)
+            tulos = await asyncio.wait_for(kesken, timeout=aikaraja or None)
+        except asyncio.TimeoutError:
+            tulos = f"Virhe: työkalu '{nimi}' ei valmistunut {aikaraja:g} sekunnissa."
+        except Exception as e:
+            tulos = f"Virhe työkalussa '{nimi}': {e}"
+        kesto = time.perf_counter() - alku
+    print(f"Työkalu {nimi} valmis ({kesto:.2f} s)")
+    return dict(vastaus, content=tulos if isinstance(tulos, str) else json.dumps(tulos, ensure_ascii=False, default=str))
+
+
+def rinnakkainen_suoritus(funktiot, raja: int = None, aikaraja: float = None, aikarajat=None):
+    """register_reply-funktio, joka suorittaa viestin kaikki tool_calls-kutsut rinnakkain.
+
+    `aikarajat` voi antaa työkalukohtaisen aikarajan ({nimi: sekuntia}), muuten käytetään
+    `aikaraja`-arvoa (oletus TOOL_TIMEOUT).
+    """
+    raja = TOOL_MAX_CONCURRENCY if raja is None else raja
+    aikaraja = TOOL_TIMEOUT if aikaraja is None else aikaraja
+    aikarajat = aikarajat or {}
+
+    async def suorita(recipient, messages=None, sender=None, config=None):
+        viesti = messages[-1] if messages else {}
+        kutsut = viesti.get("tool_calls") or []
+        if not kutsut:
+            return False, None
+        semafori = asyncio.Semaphore(max(1, raja))
+        alku = time.perf_counter()
+        vastaukset = await asyncio.gather(*(
+            _suorita_kutsu(k, funktiot, semafori, aikarajat.get(k.get("function", {}).get("name"), aikaraja))
+            for k in kutsut
+        ))
+        if len(kutsut) > 1:
+            print(f"Työkalut: {len(kutsut)} kutsua rinnakkain, {time.perf_counter() - alku:.2f} s")
+        # Sama muoto kuin autogenin oma tool_calls-vastaus
+        return True, {
+            "role": "tool",
+            "tool_responses": vastaukset,
+            "content": "\n\n".join(v["content"] for v in vastaukset),
+        }
+
+    return suorita
@@ -1,64 +1,194 @@
 # tyokalut.py
 
 import os
-import psycopg2
-import random
-import psycopg2
+import json
+from typing import List, Optional
 from typing_extensions import Annotated
 from autogen_core import CancellationToken
 from autogen_core.tools import FunctionTool
-from psycopg2.extras import RealDictCursor
+from tietokanta import virtaa_rivit, asenna_muutosilmoitus, kuuntele_muutoksia
+from valimuisti import LRUValimuisti, PUUTTUU
+import numpy as np
+import geodesia
+from hintavarasto import hintavarasto
+import asyncio
 
-DB_CONFIG = {
-    "dbname": os.getenv("DB_NAME", "dbautogen"),
-    "user": os.getenv("DB_USER", "postgres"),
-    "password": os.getenv("DB_PASS", ""),
-    "host": os.getenv("DB_HOST", "localhost"),
-    "port": os.getenv("DB_PORT", "5432")
-}
+# Kyselytulosten välimuisti. Rivit mitätöidään heti Postgresin NOTIFY-ilmoituksesta;
+# jos kuuntelija ei ole yhteydessä, rivit vanhenevat lyhyemmällä varmuus-TTL:llä.
+DB_CACHE_MAX = int(os.getenv("DB_CACHE_MAX", "256"))
+DB_CACHE_TTL = float(os.getenv("DB_CACHE_TTL", "600"))
+DB_CACHE_FALLBACK_TTL = float(os.getenv("DB_CACHE_FALLBACK_TTL", "30"))
+
+kyselyvalimuisti = LRUValimuisti(DB_CACHE_MAX, DB_CACHE_TTL)
+_kuuntelija = None
+_kuuntelija_yhteydessa = False
+# Kasvaa jokaisesta mitätöinnistä: kesken olleen kyselyn tulosta ei tallenneta, jos data muuttui sen aikana
+_sukupolvi = 0
 
 async def get_stock_price(
     ticker: str,
     date: Annotated[str, "Päivämäärä muodossa VVVV/KK/PP"]
-) -> float:
+) -> str:
     print(f"Haetaan hinta symbolille {ticker} päivältä {date}...")
-    return random.uniform(10, 200)
+    try:
+        tulos = hintavarasto.hinta(ticker, date)
+    except ValueError as e:
+        return f"Virhe hintahaussa: {e}"
+    if tulos is None:
+        return f"Symbolille {ticker.upper()} ei ole hintadataa päivältä {date} tai sitä aiemmin."
+    paiva, hinta = tulos
+    return f"{ticker.upper()} {paiva}: {hinta:.2f}"
 
 stock_price_autogen_tool = FunctionTool(
     get_stock_price,
     name="get_stock_price",
-    description="Keksi minkä tahansa random yrityksen osakkeen hinta tiettynä päivänä."
+    description="Hae osakkeen päätöskurssi paikallisesta hintavarastosta tiettynä päivänä "
+                "(tai edellisenä kaupankäyntipäivänä)."
 )
 
+async def get_stock_prices(
+    tickers: Annotated[List[str], "Osakkeiden tunnukset, esim. ['AAPL', 'MSFT']"],
+    start_date: Annotated[str, "Alkupäivä muodossa VVVV/KK/PP"],
+    end_date: Annotated[str, "Loppupäivä muodossa VVVV/KK/PP"],
+    include_series: Annotated[bool, "Palauta myös päiväkohtaiset päätöskurssit"] = False,
+) -> str:
+    try:
+        tulos = hintavarasto.koosteet(tickers, start_date, end_date)
+        if include_series:
+            for ticker, kooste in tulos.items():
+                if kooste is not None:
+                    paivat, hinnat = hintavarasto.vali(ticker, start_date, end_date)
+                    kelvolliset = ~np.isnan(hinnat)  # NaN ei ole kelvollista JSONia
+                    kooste["sarja"] = dict(zip(paivat[kelvolliset].astype(str).tolist(),
+                                               np.round(hinnat[kelvolliset], 4).tolist()))
+    except ValueError as e:
+        return f"Virhe hintahaussa: {e}"
+    return json.dumps(tulos, ensure_ascii=False)
+
+stock_prices_autogen_tool = FunctionTool(
+    get_stock_prices,
+    name="get_stock_prices",
+    description="Hae usean osakkeen kurssit aikaväliltä yhdellä kutsulla: lukumäärä, min, max, keskiarvo, "
+                "ensimmäinen, viimeinen ja muutos-% per tunnus (valinnaisesti koko päivittäinen sarja)."
+)
+
+# Yhden eräkutsun enimmäiskoko (parien määrä tai matriisin solut)
+DISTANCE_MAX_PAIRS = int(os.getenv("DISTANCE_MAX_PAIRS", "1000000"))
+
 async def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    print(f"RRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRRR")
-    return 100.5
+    geodesia.tarkista_koordinaatit([lat1, lat2], [lon1, lon2])
+    return round(float(geodesia.vincenty(lat1, lon1, lat2, lon2)), 3)
 
 distance_autogen_tool = FunctionTool(
     calculate_distance,
     name="calculate_distance",
-    description="Laske etäisyys kahden GPS-koordinaatin välillä."
+    description="Laske etäisyys kilometreinä kahden GPS-koordinaatin välillä (WGS84)."
 )
 
-async def hae_kayttajat() -> str:
-    """Hakee kaikki käyttäjät tietokannasta ja palauttaa ne tekstinä."""
+async def calculate_distances(
+    pairs: Annotated[Optional[List[List[float]]], "Parit muodossa [[lat1, lon1, lat2, lon2], ...]"] = None,
+    origins: Annotated[Optional[List[List[float]]], "Matriisin lähtöpisteet [[lat, lon], ...]"] = None,
+    destinations: Annotated[Optional[List[List[float]]], "Matriisin kohdepisteet [[lat, lon], ...]"] = None,
+    method: Annotated[str, "haversine (nopea) tai vincenty (ellipsoidi, tarkka)"] = "haversine",
+) -> str:
+    try:
+        if pairs:
+            if len(pairs) > DISTANCE_MAX_PAIRS:
+                return f"Virhe: enintään {DISTANCE_MAX_PAIRS} paria kerralla."
+            km = geodesia.etaisyydet(pairs, method)
+            return json.dumps({"yksikko": "km", "menetelma": method, "etaisyydet": km.round(3).tolist()})
+        if origins and destinations:
+            if len(origins) * len(destinations) > DISTANCE_MAX_PAIRS:
+                return f"Virhe: matriisissa saa olla enintään {DISTANCE_MAX_PAIRS} solua."
+            km = geodesia.etaisyysmatriisi(origins, destinations, method)
+            return json.dumps({"yksikko": "km", "menetelma": method, "matriisi": km.round(3).tolist()})
+        return "Virhe: anna joko pairs tai sekä origins että destinations."
+    except ValueError as e:
+        return f"Virhe etäisyyslaskennassa: {e}"
+
+distance_batch_autogen_tool = FunctionTool(
+    calculate_distances,
+    name="calculate_distances",
+    description="Laske monta etäisyyttä (km) yhdellä kutsulla: lista pareja (pairs) tai N×M-etäisyysmatriisi "
+                "(origins × destinations). Käytä tätä aina, kun etäisyyksiä on useampi kuin yksi."
+)
+
+def _taulu_muuttui(taulu):
+    global _sukupolvi
+    _sukupolvi += 1
+    if taulu is None:
+        kyselyvalimuisti.tyhjenna()
+    else:
+        kyselyvalimuisti.mitatoi_tagi(taulu)
+
+
+def _aseta_kuuntelijan_tila(yhteydessa):
+    global _kuuntelija_yhteydessa
+    _kuuntelija_yhteydessa = yhteydessa
+
+
+async def _kuuntele():
+    # Triggerin asennus on valinnainen: virhe ei estä kuuntelua eikä hakua
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        cur.execute("SELECT kayttajanimi FROM kayttajat;")
-        rows = cur.fetchall()
-        
-        cur.close()
-        conn.close()
-        
-        if not rows:
+        await asenna_muutosilmoitus("kayttajat")
+    except Exception as e:
+        print(f"Varoitus: muutostriggerin asennus epäonnistui, käytetään TTL-vanhenemista: {e}")
+    await kuuntele_muutoksia(_taulu_muuttui, yhdistetty=_aseta_kuuntelijan_tila)
+
+
+async def _kaynnista_kuuntelija():
+    """Käynnistä NOTIFY-kuuntelija kerran. Tehtävä asetetaan ennen ensimmäistä awaitia, joten
+    rinnakkaiset ensimmäiset haut eivät käynnistä omiaan; rivit saavat varmuus-TTL:n, kunnes
+    kuuntelija on yhteydessä."""
+    global _kuuntelija
+    if _kuuntelija is not None and not _kuuntelija.done():
+        return
+    _kuuntelija = asyncio.get_running_loop().create_task(_kuuntele())
+
+
+def tietokantavalimuistin_tilastot() -> dict:
+    """Kyselyvälimuistin osumat, ohitukset ja koko."""
+    return {**kyselyvalimuisti.tilastot(), "notify_yhteydessa": _kuuntelija_yhteydessa}
+
+
+async def hae_kayttajat(
+    raja: Annotated[int, "Montako käyttäjää palautetaan enintään (oletus 100)"] = 100,
+    siirtyma: Annotated[int, "Montako käyttäjää ohitetaan alusta (sivutus)"] = 0,
+) -> str:
+    """Hakee käyttäjät tietokannasta sivu kerrallaan ja palauttaa ne tekstinä."""
+    raja = max(1, min(int(raja), 1000))
+    siirtyma = max(0, int(siirtyma))
+    avain = ("hae_kayttajat", raja, siirtyma)
+    tulos = kyselyvalimuisti.hae(avain)
+    if tulos is not PUUTTUU:
+        return tulos
+    try:
+        await _kaynnista_kuuntelija()
+        sukupolvi = _sukupolvi
+        # Jaettu yhteyspooli + palvelinpuolen kursori: rivit tulevat erissä, ei fetchall()
+        # Haetaan yksi ylimääräinen rivi, jotta tiedetään onko seuraava sivu olemassa
+        rivit = []
+        async for r in virtaa_rivit(
+            "SELECT kayttajanimi FROM kayttajat ORDER BY kayttajanimi LIMIT %s OFFSET %s;",
+            (raja + 1, siirtyma),
+        ):
+            rivit.append(f"Nimi: {r['kayttajanimi']}")
+
+        if not rivit:
+            # Tyhjää tulosta ei tallenneta välimuistiin
+            if siirtyma:
+                return f"Ei käyttäjiä kohdasta {siirtyma} eteenpäin."
             return "Tietokannassa ei ole vielä käyttäjiä."
-            
+
         # Muotoillaan lista luettavaksi merkkijonoksi LLM:lle
-        tulos = "Löytyi seuraavat käyttäjät:\n"
-        for r in rows:
-            tulos += f"Nimi: {r['kayttajanimi']}\n"
+        lisaa = len(rivit) > raja
+        tulos = ["Löytyi seuraavat käyttäjät:", *rivit[:raja]]
+        if lisaa:
+            tulos.append(f"(Lisää käyttäjiä löytyy: hae seuraava sivu siirtymällä {siirtyma + raja}.)")
+        tulos = "\n".join(tulos) + "\n"
+        if sukupolvi == _sukupolvi:
+            ttl = DB_CACHE_TTL if _kuuntelija_yhteydessa else DB_CACHE_FALLBACK_TTL
+            kyselyvalimuisti.aseta(avain, tulos, tagit=("kayttajat",), ttl=ttl)
         return tulos
 
     except Exception as e:
@@ -67,5 +197,5 @@ async def hae_kayttajat() -> str:
 hae_kayttajat_tool = FunctionTool(
     hae_kayttajat,
     name="hae_kayttajat",
-    description="Hakee listan kaikista dbautogen-tietokannan käyttäjistä."
-)
\ No newline at end of file
+    description="Hakee listan dbautogen-tietokannan käyttäjistä sivu kerrallaan. Parametrit: raja, siirtyma."
+)
\ No newline at end of file
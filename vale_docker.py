@@ -0,0 +1,373 @@
+# vale_docker.py
+# Docker-CLI:n korvike suorituskykymittauksiin (bench_e2e.py). Toteuttaa ne komennot,
+# joita työkalut käyttävät (compose up/stop/down/exec/ps/pause/unpause, ps -a --format, stats,
+# volume create/inspect/rm, events), pitää
+# projektien tilan tiedostossa ja viivästää jokaista kutsua säädettävästi. Jokainen kutsu
+# kirjataan, joten mittaus näkee aliprosessien määrän komennoittain.
+#
+# bench_e2e.py luo PATHiin `docker`-skriptin, joka ajaa tämän tiedoston.
+# `python vale_docker.py palvele SOCKET` tarjoaa samasta tilasta Docker Engine API:n osajoukon
+# (docker_api.py: konttilistaus, start/stop/pause/unpause, stats, exec) unix-socketissa.
+# Konteilla ei ole liikennettä: stats palauttaa aina nollalaskurit. Volyymit ovat hakemistoja
+# tilahakemiston alla (volumes/<nimi>), joten tilannekuvien kopiointi toimii oikeasti. Asetukset:
+#   VALE_DOCKER_TILA      tilahakemisto (tila.json, tapahtumat.jsonl, kutsut.log)
+#   VALE_DOCKER_VIIVE_MS  viive jokaiselle kutsulle (oletus 50)
+#   VALE_DOCKER_UP_MS     lisäviive `compose up` -kutsulle (oletus 500)
+
+import os
+import re
+import sys
+import json
+import time
+import fcntl
+import shutil
+import struct
+import asyncio
+import contextlib
+import urllib.parse
+from docker_tila import PROJEKTI_LABEL, PALVELU_LABEL, projektin_nimi
+
+TILA_DIR = os.getenv("VALE_DOCKER_TILA", os.path.join(".cache", "vale_docker"))
+VIIVE = float(os.getenv("VALE_DOCKER_VIIVE_MS", "50")) / 1000
+UP_VIIVE = float(os.getenv("VALE_DOCKER_UP_MS", "500")) / 1000
+
+KUTSULOKI = "kutsut.log"
+TAPAHTUMAT = "tapahtumat.jsonl"
+
+
+def _polku(nimi: str) -> str:
+    return os.path.join(TILA_DIR, nimi)
+
+
+def _kirjaa_kutsu(argv):
+    """Yksi rivi per kutsu: aikaleima ja komento (esim. 'compose up', 'ps', 'events')."""
+    if argv[:1] == ["compose"]:
+        # compose -f X <alikomento>: ohitetaan tiedostonimi
+        alikomennot = [a for a in argv[1:] if a in ("up", "down", "stop", "start", "exec", "ps", "restart", "pull",
+                                                  "pause", "unpause")]
+        komento = "compose " + (alikomennot[0] if alikomennot else "?")
+    else:
+        komento = argv[0] if argv else ""
+    with open(_polku(KUTSULOKI), "a") as f:
+        f.write(f"{time.time():.6f}\t{komento}\n")
+
+
+@contextlib.contextmanager
+def _tila():
+    """Lukittu luku-muokkaus-kirjoitus: {projekti: {palvelu: tila}}."""
+    with open(_polku("tila.lock"), "w") as lukko:
+        fcntl.flock(lukko, fcntl.LOCK_EX)
+        try:
+            with open(_polku("tila.json")) as f:
+                tila = json.load(f)
+        except (OSError, ValueError):
+            tila = {}
+        yield tila
+        with open(_polku("tila.json.tmp"), "w") as f:
+            json.dump(tila, f)
+        os.replace(_polku("tila.json.tmp"), _polku("tila.json"))
+
+
+def _tapahtuma(projekti: str, palvelu: str, toiminto: str):
+    """docker events --format '{{json .}}' -muotoinen rivi tila_valimuistille."""
+    rivi = {
+        "Type": "container", "Action": toiminto, "status": toiminto, "time": int(time.time()),
+        "Actor": {"Attributes": {PROJEKTI_LABEL: projekti, PALVELU_LABEL: palvelu}},
+    }
+    with open(_polku(TAPAHTUMAT), "a") as f:
+        f.write(json.dumps(rivi) + "\n")
+
+
+def _palvelut(compose_polku: str):
+    """Compose-tiedoston palvelut, jotka `up` käynnistää (profiilien palvelut ohitetaan)."""
+    with open(compose_polku) as f:
+        teksti = f.read()
+    lohko = re.search(r"^services:\n(.*?)(?=^\S|\Z)", teksti, re.M | re.S)
+    if not lohko:
+        return []
+    palvelut = []
+    for osa in re.split(r"^  (?=[A-Za-z0-9_.-]+:\s*$)", lohko.group(1), flags=re.M):
+        nimi = re.match(r"([A-Za-z0-9_.-]+):", osa)
+        if nimi and "profiles:" not in osa:
+            palvelut.append(nimi.group(1))
+    return palvelut
+
+
+def _volyymi(nimi: str) -> str:
+    return _polku(os.path.join("volumes", nimi))
+
+
+def _compose_volyymit(compose_polku: str):
+    """Compose-tiedoston nimetyt volyymit (volumes:-lohkon name:-kentät)."""
+    with open(compose_polku) as f:
+        teksti = f.read()
+    lohko = re.search(r"^volumes:\n(.*?)(?=^\S|\Z)", teksti, re.M | re.S)
+    return re.findall(r"^\s+name:\s*(\S+)\s*$", lohko.group(1), re.M) if lohko else []
+
+
+def _compose(argv) -> int:
+    tiedosto = "docker-compose.yml"
+    args = list(argv)
+    if "-f" in args:
+        i = args.index("-f")
+        tiedosto = args[i + 1]
+        del args[i:i + 2]
+    projekti = projektin_nimi(os.path.basename(os.getcwd()))
+    alikomento = args[0] if args else ""
+
+    if alikomento == "up":
+        time.sleep(UP_VIIVE)
+        palvelut = _palvelut(tiedosto)
+        # Uuteen volyymiin "asennus" (tiedosto), olemassa oleva säilyy sellaisenaan
+        for volyymi in _compose_volyymit(tiedosto):
+            if not os.path.isdir(_volyymi(volyymi)):
+                os.makedirs(_volyymi(volyymi))
+                with open(os.path.join(_volyymi(volyymi), "asennettu.txt"), "w") as f:
+                    f.write(projekti + "\n")
+        with _tila() as tila:
+            for palvelu in palvelut:
+                tila.setdefault(projekti, {})[palvelu] = "running"
+        for palvelu in palvelut:
+            _tapahtuma(projekti, palvelu, "start")
+    elif alikomento in ("stop", "down"):
+        if alikomento == "down" and "-v" in args:
+            for volyymi in _compose_volyymit(tiedosto):
+                shutil.rmtree(_volyymi(volyymi), ignore_errors=True)
+        with _tila() as tila:
+            palvelut = list(tila.get(projekti, {}))
+            if alikomento == "down":
+                tila.pop(projekti, None)
+            else:
+                for palvelu in palvelut:
+                    tila[projekti][palvelu] = "exited"
+        for palvelu in palvelut:
+            _tapahtuma(projekti, palvelu, "stop")
+            if alikomento == "down":
+                _tapahtuma(projekti, palvelu, "destroy")
+    elif alikomento in ("pause", "unpause"):
+        lahto, uusi = ("running", "paused") if alikomento == "pause" else ("paused", "running")
+        muutetut = []
+        with _tila() as tila:
+            for palvelu, tila_ in tila.get(projekti, {}).items():
+                if tila_ == lahto and (palvelu in args[1:] or len(args) == 1):
+                    tila[projekti][palvelu] = uusi
+                    muutetut.append(palvelu)
+        for palvelu in muutetut:
+            _tapahtuma(projekti, palvelu, alikomento)
+    elif alikomento == "exec":
+        palvelu = next((a for a in args[1:] if not a.startswith("-")), "")
+        with _tila() as tila:
+            kaynnissa = tila.get(projekti, {}).get(palvelu) == "running"
+        if not kaynnissa:
+            print(f"service \"{palvelu}\" is not running", file=sys.stderr)
+            return 1
+    elif alikomento == "ps":
+        with _tila() as tila:
+            for palvelu, tila_ in tila.get(projekti, {}).items():
+                print(f"{projekti}-{palvelu}-1\t{tila_}")
+    return 0
+
+
+def _ps(argv) -> int:
+    with _tila() as tila:
+        for projekti, palvelut in tila.items():
+            for palvelu, tila_ in palvelut.items():
+                print(f"{projekti}\t{palvelu}\t{tila_}")
+    return 0
+
+
+def _volume(argv) -> int:
+    """volume create NIMI | inspect -f ... NIMI... (hakemistopolut) | rm [-f] NIMI..."""
+    alikomento = argv[0] if argv else ""
+    nimet = [a for a in argv[1:] if not a.startswith("-") and "{{" not in a]
+    if alikomento == "create":
+        os.makedirs(_volyymi(nimet[0]), exist_ok=True)
+        print(nimet[0])
+    elif alikomento == "inspect":
+        for nimi in nimet:
+            if not os.path.isdir(_volyymi(nimi)):
+                print(f"Error response from daemon: get {nimi}: no such volume", file=sys.stderr)
+                return 1
+        for nimi in nimet:
+            print(os.path.abspath(_volyymi(nimi)))
+    elif alikomento == "rm":
+        for nimi in nimet:
+            shutil.rmtree(_volyymi(nimi), ignore_errors=True)
+    return 0
+
+
+def _stats(argv) -> int:
+    """docker stats --no-stream --format '{{.Name}}\t{{.CPUPerc}}\t{{.NetIO}}' (ei liikennettä)."""
+    with _tila() as tila:
+        for projekti, palvelut in tila.items():
+            for palvelu, tila_ in palvelut.items():
+                if tila_ == "running":
+                    print(f"{projekti}-{palvelu}-1\t0.00%\t0B / 0B")
+    return 0
+
+
+def _events(argv) -> int:
+    """Seuraa tapahtumatiedostoa, kunnes prosessi tapetaan.
+
+    Ilman --sincea aloitetaan nykyisestä lopusta; --since toistaa ensin sitä uudemmat tapahtumat
+    (kuten docker events), jolloin prosessin käynnistyksen aikaiset tapahtumat eivät katoa.
+    """
+    since = None
+    if "--since" in argv:
+        since = int(argv[argv.index("--since") + 1])
+    polku = _polku(TAPAHTUMAT)
+    open(polku, "a").close()
+    with open(polku) as f:
+        if since is None:
+            f.seek(0, os.SEEK_END)
+        while True:
+            rivi = f.readline()
+            if rivi:
+                if since is None or json.loads(rivi).get("time", 0) >= since:
+                    sys.stdout.write(rivi)
+                    sys.stdout.flush()
+            else:
+                time.sleep(0.05)
+
+
+# --- Docker Engine API -palvelin ---
+
+def _kontit(suodattimet: dict) -> list:
+    nimikkeet = dict(n.partition("=")[::2] for n in suodattimet.get("label", []))
+    kontit = []
+    with _tila() as tila:
+        for projekti, palvelut in tila.items():
+            for palvelu, tila_ in palvelut.items():
+                labels = {PROJEKTI_LABEL: projekti, PALVELU_LABEL: palvelu}
+                if all(k in labels and (not v or labels[k] == v) for k, v in nimikkeet.items()):
+                    kontit.append({"Id": f"{projekti}-{palvelu}", "Names": [f"/{projekti}-{palvelu}-1"],
+                                   "State": tila_, "Labels": labels})
+    return kontit
+
+
+_TOIMINNOT = {"start": "running", "stop": "exited", "pause": "paused", "unpause": "running"}
+
+
+def _aseta_kontti(kontti_id: str, toiminto: str) -> bool:
+    projekti, _, palvelu = kontti_id.rpartition("-")
+    with _tila() as tila:
+        if palvelu not in tila.get(projekti, {}):
+            return False
+        tila[projekti][palvelu] = _TOIMINNOT[toiminto]
+    _tapahtuma(projekti, palvelu, toiminto)
+    return True
+
+
+class _APIPalvelin:
+    def __init__(self):
+        self.execit = {}
+
+    async def kasittele(self, lukija, kirjoittaja):
+        try:
+            while True:
+                tilarivi = await lukija.readline()
+                if not tilarivi:
+                    break
+                metodi, polku, _ = tilarivi.decode().split(" ", 2)
+                otsakkeet = {}
+                while (rivi := await lukija.readline()) not in (b"\r\n", b""):
+                    avain, _, arvo = rivi.decode().partition(":")
+                    otsakkeet[avain.strip().lower()] = arvo.strip()
+                runko = await lukija.readexactly(int(otsakkeet.get("content-length", 0)))
+                osoite = urllib.parse.urlsplit(polku)
+                kysely = dict(urllib.parse.parse_qsl(osoite.query))
+                # Tunnisteet pois, jotta kutsuloki laskee kutsut päätepisteittäin
+                reitti = re.sub(r"^/(containers|exec)/(?!json$)[^/]+", r"/\1/ID", osoite.path)
+                _kirjaa_kutsu([f"api {metodi} {reitti}"])
+                await asyncio.sleep(VIIVE / 10)
+                if await self._reitti(metodi, osoite.path, kysely, json.loads(runko or b"null"), kirjoittaja):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            kirjoittaja.close()
+
+    @staticmethod
+    def _vastaa(kirjoittaja, status, runko=None):
+        data = json.dumps(runko).encode() if runko is not None else b""
+        otsakkeet = f"HTTP/1.1 {status} X\r\nContent-Length: {len(data)}\r\n"
+        if runko is not None:
+            otsakkeet += "Content-Type: application/json\r\n"
+        kirjoittaja.write((otsakkeet + "\r\n").encode() + data)
+
+    async def _reitti(self, metodi, polku, kysely, runko, kirjoittaja) -> bool:
+        """Palauttaa True, jos yhteys suljetaan vastauksen jälkeen (exec-virta)."""
+        osat = polku.strip("/").split("/")
+        if osat[0] == "_ping":
+            self._vastaa(kirjoittaja, 200, "OK")
+        elif osat == ["containers", "json"]:
+            self._vastaa(kirjoittaja, 200, _kontit(json.loads(kysely.get("filters", "{}"))))
+        elif osat[0] == "containers" and len(osat) == 3 and osat[2] in _TOIMINNOT:
+            ok = _aseta_kontti(osat[1], osat[2])
+            self._vastaa(kirjoittaja, 204 if ok else 404, None if ok else {"message": "No such container"})
+        elif osat[0] == "containers" and osat[2:] == ["stats"]:
+            self._vastaa(kirjoittaja, 200, {"networks": {"eth0": {"rx_bytes": 0, "tx_bytes": 0}},
+                                            "cpu_stats": {"cpu_usage": {"total_usage": 0}}})
+        elif osat[0] == "containers" and osat[2:] == ["exec"]:
+            exec_id = os.urandom(8).hex()
+            self.execit[exec_id] = {"kontti": osat[1], "Cmd": runko.get("Cmd", []), "ExitCode": None}
+            self._vastaa(kirjoittaja, 201, {"Id": exec_id})
+        elif osat[0] == "exec" and osat[2:] == ["start"] and osat[1] in self.execit:
+            exe = self.execit[osat[1]]
+            projekti, _, palvelu = exe["kontti"].rpartition("-")
+            with _tila() as tila:
+                kaynnissa = tila.get(projekti, {}).get(palvelu) == "running"
+            kirjoittaja.write(b"HTTP/1.1 101 UPGRADED\r\nContent-Type: application/vnd.docker.raw-stream\r\n"
+                              b"Connection: Upgrade\r\nUpgrade: tcp\r\n\r\n")
+            if kaynnissa:
+                tuloste, virta, exe["ExitCode"] = " ".join(exe["Cmd"]) + "\n", 1, 0
+            else:
+                tuloste, virta, exe["ExitCode"] = "container is not running\n", 2, 1
+            data = tuloste.encode()
+            kirjoittaja.write(struct.pack(">BxxxI", virta, len(data)) + data)
+            await kirjoittaja.drain()
+            return True
+        elif osat[0] == "exec" and osat[2:] == ["json"] and osat[1] in self.execit:
+            exe = self.execit[osat[1]]
+            self._vastaa(kirjoittaja, 200, {"ID": osat[1], "Running": False, "ExitCode": exe["ExitCode"]})
+        else:
+            self._vastaa(kirjoittaja, 404, {"message": f"page not found: {metodi} {polku}"})
+        await kirjoittaja.drain()
+        return False
+
+
+async def _palvele(socket_polku: str):
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(socket_polku)
+    palvelin = await asyncio.start_unix_server(_APIPalvelin().kasittele, socket_polku)
+    async with palvelin:
+        await palvelin.serve_forever()
+
+
+def main(argv) -> int:
+    os.makedirs(TILA_DIR, exist_ok=True)
+    komento = argv[0] if argv else ""
+    if komento == "palvele":
+        asyncio.run(_palvele(argv[1] if len(argv) > 1 else _polku("docker.sock")))
+        return 0
+    _kirjaa_kutsu(argv)
+    if komento == "events":
+        return _events(argv[1:])
+    time.sleep(VIIVE)
+    if komento == "compose":
+        return _compose(argv[1:])
+    if komento == "ps":
+        return _ps(argv[1:])
+    if komento == "stats":
+        return _stats(argv[1:])
+    if komento == "volume":
+        return _volume(argv[1:])
+    # network, volume, inspect ym.: onnistuu ilman tulostetta
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main(sys.argv[1:]))
+    except KeyboardInterrupt:
+        sys.exit(130)
@@ -0,0 +1,222 @@
+# valimuisti.py
+# Yksinkertainen muistinsisäinen LRU-välimuisti TTL:llä, tageilla ja osuma-/ohitusmittareilla,
+# sekä `muistiin`-dekoraattori puhtaille async-työkaluille (valinnainen levytaso).
+
+import os
+import json
+import time
+import asyncio
+import inspect
+import sqlite3
+import functools
+import threading
+from collections import OrderedDict
+
+# Työkalujen pysyvä välimuisti (muistiin(..., levy=True))
+TOOL_CACHE_PATH = os.getenv("TOOL_CACHE_PATH", os.path.join(".cache", "tyokalut.sqlite3"))
+
+# Palautetaan hae()-kutsusta, kun avainta ei ole (None voi olla oikea arvo)
+PUUTTUU = object()
+
+
+class LRUValimuisti:
+    """LRU-välimuisti: enintään `maksimi` avainta, jokaisella oma vanhenemisaika ja tagit.
+
+    Tagien avulla voidaan mitätöidä kerralla kaikki tiettyyn tauluun/lähteeseen liittyvät rivit.
+    """
+
+    def __init__(self, maksimi: int = 256, ttl: float = 300.0):
+        self.maksimi = max(1, int(maksimi))
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self.osumat = 0
+        self.ohitukset = 0
+        self.poistot = 0
+        self.mitatoinnit = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def hae(self, avain):
+        """Palauta arvo tai PUUTTUU (vanhentunut rivi poistetaan)."""
+        rivi = self._data.get(avain)
+        if rivi is None:
+            self.ohitukset += 1
+            return PUUTTUU
+        arvo, vanhenee, _ = rivi
+        if vanhenee is not None and time.monotonic() >= vanhenee:
+            del self._data[avain]
+            self.ohitukset += 1
+            return PUUTTUU
+        self._data.move_to_end(avain)
+        self.osumat += 1
+        return arvo
+
+    def aseta(self, avain, arvo, tagit=(), ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        vanhenee = time.monotonic() + ttl if ttl else None
+        self._data[avain] = (arvo, vanhenee, frozenset(tagit))
+        self._data.move_to_end(avain)
+        while len(self._data) > self.maksimi:
+            self._data.popitem(last=False)
+            self.poistot += 1
+
+    def poista(self, avain):
+        self._data.pop(avain, None)
+
+    def mitatoi_tagi(self, tagi) -> int:
+        """Poista kaikki rivit, joilla on annettu tagi. Palauttaa poistettujen määrän."""
+        avaimet = [k for k, (_, _, tagit) in self._data.items() if tagi in tagit]
+        for k in avaimet:
+            del self._data[k]
+        self.mitatoinnit += len(avaimet)
+        return len(avaimet)
+
+    def tyhjenna(self):
+        self.mitatoinnit += len(self._data)
+        self._data.clear()
+
+    def tilastot(self) -> dict:
+        yhteensa = self.osumat + self.ohitukset
+        return {
+            "koko": len(self._data),
+            "maksimi": self.maksimi,
+            "osumat": self.osumat,
+            "ohitukset": self.ohitukset,
+            "osumaprosentti": round(100.0 * self.osumat / yhteensa, 1) if yhteensa else None,
+            "poistot": self.poistot,
+            "mitatoinnit": self.mitatoinnit,
+        }
+
+
+class LevyValimuisti:
+    """SQLite-pohjainen pysyvä välimuistitaso (säilyy uudelleenkäynnistysten yli).
+
+    Arvot tallennetaan JSON-muodossa; arvoja, joita ei voi serialisoida, ei tallenneta levylle.
+    """
+
+    def __init__(self, polku: str, maksimi_rivit: int = 10000):
+        self.polku = polku
+        self.maksimi_rivit = maksimi_rivit
+        self._conn = None
+        self._lukko = threading.Lock()
+
+    def _yhteys(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.polku)), exist_ok=True)
+            self._conn = sqlite3.connect(self.polku, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS valimuisti ("
+                "nimiavaruus TEXT NOT NULL, avain TEXT NOT NULL, arvo TEXT NOT NULL, "
+                "vanhenee REAL, luotu REAL NOT NULL, PRIMARY KEY (nimiavaruus, avain))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_valimuisti_luotu ON valimuisti(luotu)")
+            self._conn.commit()
+        return self._conn
+
+    def hae(self, nimiavaruus: str, avain: str):
+        with self._lukko:
+            rivi = self._yhteys().execute(
+                "SELECT arvo, vanhenee FROM valimuisti WHERE nimiavaruus=? AND avain=?", (nimiavaruus, avain)
+            ).fetchone()
+        if rivi is None or (rivi[1] is not None and time.time() >= rivi[1]):
+            return PUUTTUU
+        return json.loads(rivi[0])
+
+    def aseta(self, nimiavaruus: str, avain: str, arvo, ttl=None):
+        try:
+            data = json.dumps(arvo)
+        except (TypeError, ValueError):
+            return
+        nyt = time.time()
+        with self._lukko:
+            conn = self._yhteys()
+            conn.execute(
+                "INSERT OR REPLACE INTO valimuisti (nimiavaruus, avain, arvo, vanhenee, luotu) VALUES (?, ?, ?, ?, ?)",
+                (nimiavaruus, avain, data, nyt + ttl if ttl else None, nyt),
+            )
+            # Vanhimmat pois, kun rivimäärä ylittyy (ja vanhentuneet samalla)
+            conn.execute("DELETE FROM valimuisti WHERE vanhenee IS NOT NULL AND vanhenee < ?", (nyt,))
+            conn.execute(
+                "DELETE FROM valimuisti WHERE rowid IN (SELECT rowid FROM valimuisti ORDER BY luotu DESC LIMIT -1 OFFSET ?)",
+                (self.maksimi_rivit,),
+            )
+            conn.commit()
+
+
+_levytaso = None
+
+
+def _hae_levytaso():
+    global _levytaso
+    if _levytaso is None:
+        _levytaso = LevyValimuisti(TOOL_CACHE_PATH)
+    return _levytaso
+
+
+def muistiin(ttl: float = 300.0, maksimi: int = 256, levy: bool = False, nimi: str = None):
+    """Async-dekoraattori puhtaille työkaluille: samat argumentit -> sama tulos ilman uutta suoritusta.
+
+    - `ttl` ja `maksimi` ovat työkalukohtaisia (LRU muistissa).
+    - Samanaikaiset identtiset kutsut yhdistetään: vain yksi suoritus, muut odottavat sen tulosta.
+    - `levy=True` lisää pysyvän SQLite-tason (TOOL_CACHE_PATH), joka säilyy uudelleenkäynnistysten yli.
+    - functools.wraps säilyttää allekirjoituksen ja annotaatiot, joten autogenin
+      register_for_execution ja FunctionTool näkevät alkuperäisen funktion skeeman.
+    """
+    def koristele(func):
+        tyokalu = nimi or func.__name__
+        allekirjoitus = inspect.signature(func)
+        muisti = LRUValimuisti(maksimi, ttl)
+        kesken = {}
+
+        @functools.wraps(func)
+        async def kaare(*args, **kwargs):
+            sidottu = allekirjoitus.bind(*args, **kwargs)
+            sidottu.apply_defaults()
+            avain = json.dumps(sidottu.arguments, sort_keys=True, default=repr)
+
+            arvo = muisti.hae(avain)
+            if arvo is not PUUTTUU:
+                return arvo
+            if levy:
+                arvo = _hae_levytaso().hae(tyokalu, avain)
+                if arvo is not PUUTTUU:
+                    muisti.aseta(avain, arvo)
+                    return arvo
+
+            while avain in kesken:
+                tuleva = kesken[avain]
+                try:
+                    return await asyncio.shield(tuleva)
+                except asyncio.CancelledError:
+                    # Alkuperäinen suoritus peruttiin -> yritetään itse (ellei tätä kutsua peruttu)
+                    if not tuleva.cancelled():
+                        raise
+
+            tuleva = asyncio.get_running_loop().create_future()
+            kesken[avain] = tuleva
+            try:
+                arvo = func(*args, **kwargs)
+                if inspect.isawaitable(arvo):
+                    arvo = await arvo
+            except asyncio.CancelledError:
+                tuleva.cancel()
+                raise
+            except BaseException as e:
+                tuleva.set_exception(e)
+                tuleva.exception()  # merkitään luetuksi, vaikka odottajia ei olisi
+                raise
+            finally:
+                kesken.pop(avain, None)
+
+            muisti.aseta(avain, arvo)
+            if levy:
+                _hae_levytaso().aseta(tyokalu, avain, arvo, ttl)
+            tuleva.set_result(arvo)
+            return arvo
+
+        kaare.valimuisti = muisti
+        return kaare
+
+    return koristele
@@ -2,14 +2,29 @@
 # WordPress-specific Docker helper tools (adds an optional 'wpcli' service for WP-CLI)
 
 import os
-import subprocess
 import json
 import shutil
+import time
+import asyncio
+import fnmatch
+import functools
+from typing import List, Optional, Tuple
 from typing_extensions import Annotated
 from autogen_core.tools import FunctionTool
 import re
+from komennot import aja_komento, komentotuloste
+from tila_valimuisti import tila_valimuisti
+from rekisteri import Rekisteri, VarattuVirhe, VARATTU
+from wp_pluginit import asenna_pluginit, valmistele_hakemistot
+from compose_pohjat import wordpress_compose, volyymi_nimet, lue_volyymi_prefix, lue_meta, kirjoita_db_env
+# Pooli, jaettu tietokanta, Docker API, lepotila ja tilannekuvat tuodaan vasta niitä käyttävissä
+# työkaluissa, jotta tämän moduulin import pysyy kevyenä (ks. bench_import.py)
 
 ENV_DIR = os.getenv("DOCKER_ENV_DIR", "./environments")
+# Kloonin WordPress-osoitteen korjauksen odotus (tietokannan käynnistyminen), sekuntia
+WP_CLONE_READY_TIMEOUT = float(os.getenv("WP_CLONE_READY_TIMEOUT", "120"))
+# Massatoimintojen rinnakkaiset ympäristöt (compose-komentoja rajoittaa lisäksi CMD_MAX_CONCURRENCY)
+WP_BULK_CONCURRENCY = int(os.getenv("WP_BULK_CONCURRENCY", "4"))
 
 
 def _slugify(name: str) -> str:
@@ -19,16 +34,112 @@ def _slugify(name: str) -> str:
     s = re.sub(r"[^a-z0-9_-]", "", s)
     return s[:128]
 
-os.makedirs(ENV_DIR, exist_ok=True)
+# Pysyvä ympäristöindeksi (ENV_DIR/.rekisteri.sqlite3); yhteys avataan vasta ensimmäisellä käytöllä
+_rekisteri = Rekisteri(ENV_DIR)
 
 
-def _run(cmd, cwd=None):
-    """Suorita shell-komento ja palauta stdout tai nosta poikkeus."""
-    print(f"Suoritetaan: {' '.join(cmd)} (cwd={cwd})")
-    res = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True)
-    if res.returncode != 0:
-        raise RuntimeError(f"Komentovirhe: {res.returncode}: {res.stderr.strip()}")
-    return res.stdout.strip()
+def alusta():
+    """Eksplisiittinen alustus (ei tehdä importissa): ympäristöhakemisto, plugin-välimuisti ja lepotilan rekisteri."""
+    os.makedirs(ENV_DIR, exist_ok=True)
+    valmistele_hakemistot()
+    # Lepotila-ajastin käyttää samaa rekisteriä (yksi SQLite-yhteys ja transaktiolukko)
+    from lepotila import lepotila
+    lepotila.kayta_rekisteria(_rekisteri)
+
+
+def _ratkaise_slug(nimi: str):
+    """Ratkaise käyttäjän antama nimi (slug tai näyttönimi) rekisterin kautta. Palauttaa slugin tai None."""
+    rivi = _rekisteri.etsi(nimi, slugify=_slugify)
+    if rivi is None:
+        # Rekisterin ulkopuolella (esim. käsin) luotu hakemisto lisätään rekisteriin lennossa
+        for ehdokas in (nimi, _slugify(nimi)):
+            rivi = _rekisteri.synkronoi_levylta(ehdokas) if ehdokas else None
+            if rivi:
+                break
+    return rivi["slug"] if rivi else None
+
+
+async def _run(cmd, cwd=None, aikaraja=None, rivi_callback=None):
+    """Suorita komento asynkronisesti ja palauta stdout tai nosta poikkeus.
+
+    Ks. komennot.aja_komento: globaali rinnakkaisuusraja, aikaraja ja
+    rivikohtainen tulosteen välitys `rivi_callback`-funktiolle. Oletuksena rivit
+    menevät istunnon komentotuloste-vastaanottajalle (edistyminen käyttöliittymään).
+    """
+    if rivi_callback is None:
+        rivi_callback = komentotuloste.get()
+    return await aja_komento(cmd, cwd=cwd, aikaraja=aikaraja, rivi_callback=rivi_callback)
+
+
+def _kohdeymparisto(heraa: bool = True):
+    """Työkalu kohdistuu ympäristöön `nimi`: kirjaa käyttö lepotila-ajastimelle ja
+    herätä lepäävä ympäristö ennen suoritusta (`heraa=False` = vain kirjaus)."""
+    def koristin(func):
+        @functools.wraps(func)
+        async def kaare(nimi, *args, **kwargs):
+            from lepotila import lepotila
+            slug = _ratkaise_slug(nimi)
+            if slug and heraa:
+                try:
+                    await lepotila.heraa(slug, os.path.join(ENV_DIR, slug))
+                except Exception as e:
+                    print(f"Varoitus: ympäristön '{nimi}' herätys lepotilasta epäonnistui: {e}")
+            elif slug:
+                lepotila.kirjaa(slug)
+            return await func(nimi, *args, **kwargs)
+        return kaare
+    return koristin
+
+
+def _tila_teksti(e, tilat) -> str:
+    """Listauksen tila: Dockerin tila ja automaattinen lepotila rekisteristä."""
+    from lepotila import LEPOTILA
+    if not e["has_compose"]:
+        return "ei docker-compose.yml"
+    tila = tilat.get(e["slug"], "tila: tarkistamaton")
+    if e["status"] == LEPOTILA and tila != "käynnissä":
+        tila += " (lepotila, herää käytettäessä)"
+    return tila
+
+
+def _varaa(slug, nimi, tyyppi, portti, env_path):
+    """Varaa slug ja portti rekisteriin ennen ensimmäistä awaitia. Palauttaa virheviestin tai None.
+
+    Rinnakkainen luonti samalla nimellä tai portilla saa virheen eikä koske tämän kutsun hakemistoon.
+    """
+    try:
+        with _rekisteri.transaktio():
+            if os.path.exists(env_path):
+                return f"Ympäristö '{nimi}' on jo olemassa (slug: {slug})."
+            _rekisteri.lisaa(slug, nimi, tyyppi, portti, status=VARATTU, has_compose=False)
+    except VarattuVirhe as e:
+        if e.kentta == "port":
+            return f"Portti {portti} on jo ympäristön '{e.varaaja}' käytössä. Valitse toinen portti."
+        return f"Ympäristö '{nimi}' on jo olemassa (slug: {slug})."
+    return None
+
+
+def _vapauta_varaus(slug):
+    """Poista _varaa-rivi, jos luonti päättyi ennen kuin ympäristön hakemisto valmistui."""
+    with _rekisteri.transaktio():
+        rivi = _rekisteri.hae(slug)
+        if rivi and rivi["status"] == VARATTU:
+            _rekisteri.poista(slug)
+
+
+def _paivita_meta(env_path, **muutokset):
+    """Päivitä meta.json-kenttiä (varoitus, jos tiedostoa ei voi kirjoittaa)."""
+    meta_path = os.path.join(env_path, "meta.json")
+    meta = {}
+    try:
+        if os.path.exists(meta_path):
+            with open(meta_path) as mf:
+                meta = json.load(mf)
+        meta.update(muutokset)
+        with open(meta_path, "w") as mf:
+            json.dump(meta, mf)
+    except Exception as e:
+        print(f"Varoitus: meta.json päivitys epäonnistui: {e}")
 
 
 async def wp_luo_ymparisto(
@@ -47,94 +158,99 @@ async def wp_luo_ymparisto(
     except Exception as e:
         return f"Virhe lisätietojen jäsentämisessä: {str(e)}"
 
-    slug = _slugify(nimi)
-    env_path = os.path.join(ENV_DIR, slug)
-    if os.path.exists(env_path):
-        return f"Ympäristö '{nimi}' on jo olemassa (slug: {slug})." 
-
-    os.makedirs(env_path, exist_ok=True)
-
-    if tyyppi.lower() == "wordpress":
-        # Luo yksinkertainen docker-compose.yml (WordPress + optional wpcli service)
-        compose = f"""
-services:
-  db:
-    image: mysql:5.7
-    restart: always
-    environment:
-      MYSQL_DATABASE: wordpress
-      MYSQL_USER: wordpress
-      MYSQL_PASSWORD: wordpress
-      MYSQL_RANDOM_ROOT_PASSWORD: '1'
-    volumes:
-      - db_data:/var/lib/mysql
-
-  wordpress:
-    image: wordpress:latest
-    depends_on:
-      - db
-    ports:
-      - \"{portti}:80\"
-    environment:
-      WORDPRESS_DB_HOST: db:3306
-      WORDPRESS_DB_USER: wordpress
-      WORDPRESS_DB_PASSWORD: wordpress
-      WORDPRESS_DB_NAME: wordpress
-    volumes:
-      - wordpress_data:/var/www/html
-
-  wpcli:
-    image: wordpress:cli
-    depends_on:
-      - wordpress
-    volumes:
-      - wordpress_data:/var/www/html
-    command: tail -f /dev/null
-    restart: unless-stopped
-
-volumes:
-  db_data:
-  wordpress_data:
-"""
-    else:
+    if tyyppi.lower() != "wordpress":
         return f"Tyyppiä '{tyyppi}' ei tueta vielä. Tällä hetkellä tuettuja: wordpress."
 
-    compose_path = os.path.join(env_path, "docker-compose.yml")
-    with open(compose_path, "w") as f:
-        f.write(compose)
-
-    # Save metadata (display name, type, requested port)
-    meta = {"display_name": nimi, "type": tyyppi, "port": portti}
+    slug = _slugify(nimi)
+    env_path = os.path.join(ENV_DIR, slug)
+    virhe = _varaa(slug, nimi, tyyppi, portti, env_path)
+    if virhe:
+        return virhe
     try:
-        with open(os.path.join(env_path, "meta.json"), "w") as mf:
-            json.dump(meta, mf)
+        return await _luo_wordpress(nimi, tyyppi, portti, data, slug, env_path)
+    finally:
+        _vapauta_varaus(slug)
+
+
+async def _luo_wordpress(nimi, tyyppi, portti, data, slug, env_path) -> str:
+    from ymparistopooli import pooli
+    import jaettu_tietokanta
+    alku = time.monotonic()
+    # Valmis ympäristö poolista, jos sellainen on (volyymit säilyvät, nimi ja portti vaihtuvat)
+    pooli.kaynnista()
+    lunastettu = await pooli.lunasta()
+    volyymi_prefix = lunastettu.volyymi_prefix if lunastettu else None
+    jaettu_db = lunastettu.jaettu_db if lunastettu else None
+    if jaettu_tietokanta.SHARED_DB and not jaettu_db:
+        # Oma tietokanta ja käyttäjä jaettuun MariaDB-instanssiin, ei omaa db-konttia
+        try:
+            jaettu_db = await jaettu_tietokanta.luo_tietokanta(slug)
+        except Exception as e:
+            if lunastettu:
+                await pooli.hylkaa(lunastettu)
+            return f"Jaetun tietokannan luonti epäonnistui: {str(e)}"
+    # Luo yksinkertainen docker-compose.yml (WordPress + optional wpcli service)
+    compose = wordpress_compose(portti, volyymi_prefix=volyymi_prefix, slug=slug, jaettu_db=jaettu_db)
+    valmistele_hakemistot()
+
+    # Hakemisto, compose-tiedosto ja rekisteririvin valmistuminen yhdessä tai ei ollenkaan
+    luotu = False
+    try:
+        with _rekisteri.transaktio():
+            if lunastettu:
+                os.rename(lunastettu.polku, env_path)
+            else:
+                os.makedirs(env_path)
+            luotu = True
+            kirjoita_db_env(env_path, jaettu_db)
+            compose_path = os.path.join(env_path, "docker-compose.yml")
+            with open(compose_path, "w") as f:
+                f.write(compose)
+
+            # Save metadata (display name, type, requested port)
+            meta = {"display_name": nimi, "type": tyyppi, "port": portti}
+            if volyymi_prefix:
+                meta["volume_prefix"] = volyymi_prefix
+            if jaettu_db:
+                meta["shared_db"] = jaettu_tietokanta.ilman_salasanaa(jaettu_db)
+            try:
+                with open(os.path.join(env_path, "meta.json"), "w") as mf:
+                    json.dump(meta, mf)
+            except Exception as e:
+                print(f"Varoitus: meta.json tallennus epäonnistui: {e}")
+            _rekisteri.paivita(slug, status="luotu", has_compose=True)
     except Exception as e:
-        print(f"Varoitus: meta.json tallennus epäonnistui: {e}")
+        # Vain tämän kutsun luoma hakemisto poistetaan (rekisterin varaus vapautuu kutsujassa)
+        if lunastettu:
+            await pooli.hylkaa(lunastettu, env_path if luotu else None)
+        elif luotu:
+            shutil.rmtree(env_path, ignore_errors=True)
+        if jaettu_db and not (lunastettu and lunastettu.jaettu_db):
+            try:
+                await jaettu_tietokanta.poista_tietokanta(jaettu_db)
+            except Exception as ex:
+                print(f"Varoitus: jaetun tietokannan poisto epäonnistui: {ex}")
+        return f"Ympäristön tallennus epäonnistui: {str(e)}"
 
     try:
-        _run(["docker", "compose", "-f", "docker-compose.yml", "up", "-d"], cwd=env_path)
+        await _run(["docker", "compose", "-f", "docker-compose.yml", "up", "-d"], cwd=env_path)
     except Exception as e:
+        _rekisteri.paivita(slug, status="virhe")
         return f"Docker-compose up epäonnistui: {str(e)}"
+    finally:
+        tila_valimuisti.vanhenna()
+    _rekisteri.paivita(slug, status="käynnissä")
+    if lunastettu:
+        pooli.kirjaa_lunastusaika(time.monotonic() - alku)
+        print(f"Pooli: '{slug}' lunastettu poolista {time.monotonic() - alku:.1f} s:ssa. {pooli.tilastot()}")
 
     # Asenna mahdolliset WordPress-pluginit, jos on määritelty
     plugins = data.get("plugins", []) if isinstance(data, dict) else []
     if plugins:
         try:
-            # Yritetään käyttää wp-cli, on mahdollista että sitä ei ole valmiiksi asennettuna konttiin
-            for plugin in plugins:
-                installed = False
-                try:
-                    # Try using a dedicated wpcli service
-                    _run(["docker", "compose", "-f", "docker-compose.yml", "exec", "-T", "wpcli", "wp", "plugin", "install", plugin, "--activate", "--allow-root"], cwd=env_path)
-                    installed = True
-                except Exception:
-                    try:
-                        # Fallback to running wp inside the wordpress container
-                        _run(["docker", "compose", "-f", "docker-compose.yml", "exec", "-T", "wordpress", "wp", "plugin", "install", plugin, "--activate", "--allow-root"], cwd=env_path)
-                        installed = True
-                    except Exception:
-                        print(f"WP-CLI ei ollut saatavilla tai plugin asennus epäonnistui: {plugin}")
-            return f"Ympäristö '{nimi}' luotu ja käynnistetty. Plugin-asennukset yritetty (voi vaatia manuaalisen asennuksen konttiin)."
+            # Kaikki pluginit yhdellä WP-CLI-kutsulla, zipit jaetusta välimuistista/peilistä
+            raportti = await asenna_pluginit(env_path, plugins)
+            return f"Ympäristö '{nimi}' luotu ja käynnistetty porttiin {portti}. {raportti}"
         except Exception as e:
             return f"Ympäristö luotu, mutta plugin-asennuksessa virhe: {str(e)}"
 
@@ -143,129 +259,171 @@ volumes:
 
 async def wp_poista_ymparisto(nimi: str) -> str:
     """Poistaa ympäristön: pysäyttää ja poistaa kontit ja poistaa hakemiston."""
-    env_path = os.path.join(ENV_DIR, nimi)
-    if not os.path.exists(env_path):
-        return f"Ympäristöä '{nimi}' ei löydy." 
+    _, viesti = await _poista(nimi)
+    return viesti
+
+
+@_kohdeymparisto(heraa=False)
+async def _poista(nimi: str) -> Tuple[bool, str]:
+    """wp_poista_ymparisto: palauttaa (onnistui, viesti) massatoiminnon tulostaulukkoa varten."""
+    import jaettu_tietokanta
+    from lepotila import lepotila
+    slug = _ratkaise_slug(nimi)
+    env_path = os.path.join(ENV_DIR, slug) if slug else None
+    if not env_path or not os.path.exists(env_path):
+        if slug:
+            _rekisteri.poista(slug)
+        return False, f"Ympäristöä '{nimi}' ei löydy." 
 
-    compose_path = os.path.join(env_path, "docker-compose.yml")
     try:
-        _run(["docker", "compose", "-f", "docker-compose.yml", "down", "-v"], cwd=env_path)
+        await _run(["docker", "compose", "-f", "docker-compose.yml", "down", "-v"], cwd=env_path)
     except Exception as e:
-        return f"Docker-compose down epäonnistui: {str(e)}"
+        return False, f"Docker-compose down epäonnistui: {str(e)}"
+    finally:
+        tila_valimuisti.vanhenna()
+
+    # Jaetun tietokannan tila: ympäristön tietokanta ja käyttäjä pois instanssista
+    jaettu_db = lue_meta(env_path).get("shared_db")
+    if jaettu_db:
+        try:
+            await jaettu_tietokanta.poista_tietokanta(jaettu_db)
+        except Exception as e:
+            return False, f"Kontit poistettu, mutta jaetun tietokannan poisto epäonnistui: {str(e)}"
 
     try:
-        shutil.rmtree(env_path)
+        with _rekisteri.transaktio():
+            _rekisteri.poista(slug)
+            shutil.rmtree(env_path)
     except Exception as e:
-        return f"Kontit pysäytetty, mutta hakemiston poisto epäonnistui: {str(e)}"
+        _rekisteri.paivita(slug, status="virhe")
+        return False, f"Kontit pysäytetty, mutta hakemiston poisto epäonnistui: {str(e)}"
+    lepotila.unohda(slug)
 
-    return f"Ympäristö '{nimi}' poistettu." 
+    return True, f"Ympäristö '{nimi}' poistettu." 
 
 
 async def wp_sammuta_ymparisto(nimi: str) -> str:
     """Sammuttaa ympäristön: pysäyttää kontit mutta ei poista hakemistoa."""
-    env_path = os.path.join(ENV_DIR, nimi)
-    if not os.path.exists(env_path):
-        return f"Ympäristöä '{nimi}' ei löydy." 
+    _, viesti = await _sammuta(nimi)
+    return viesti
 
-    compose_path = os.path.join(env_path, "docker-compose.yml")
-    if not os.path.exists(compose_path):
-        return f"Ympäristöä '{nimi}' ei löydy tai siinä ei ole docker-compose.yml:ää."
+
+@_kohdeymparisto(heraa=False)
+async def _sammuta(nimi: str) -> Tuple[bool, str]:
+    """wp_sammuta_ymparisto: palauttaa (onnistui, viesti); jo sammutettu on onnistuminen."""
+    import docker_api
+    slug = _ratkaise_slug(nimi)
+    env_path = os.path.join(ENV_DIR, slug) if slug else None
+    if not env_path or not os.path.exists(env_path):
+        return False, f"Ympäristöä '{nimi}' ei löydy." 
+
+    if not os.path.exists(os.path.join(env_path, "docker-compose.yml")):
+        return False, f"Ympäristöä '{nimi}' ei löydy tai siinä ei ole docker-compose.yml:ää."
+
+    try:
+        palvelut = await tila_valimuisti.palvelut(slug)
+    except Exception as e:
+        print(f"Varoitus: tilan haku epäonnistui: {e}")
+        palvelut = None
+    if palvelut is not None and not any(t in ("running", "paused") for t in palvelut.values()):
+        _rekisteri.paivita(slug, status="sammutettu")
+        return True, f"Ympäristö '{nimi}' on jo sammutettu."
 
     try:
-        _run(["docker", "compose", "-f", "docker-compose.yml", "stop"], cwd=env_path)
+        await docker_api.pysayta(env_path, rivi_callback=komentotuloste.get())
     except Exception as e:
-        return f"Ympäristön sammuttaminen epäonnistui: {str(e)}"
+        return False, f"Ympäristön sammuttaminen epäonnistui: {str(e)}"
+    finally:
+        tila_valimuisti.vanhenna()
+    _rekisteri.paivita(slug, status="sammutettu")
 
-    return f"Ympäristö '{nimi}' sammutettu." 
+    return True, f"Ympäristö '{nimi}' sammutettu." 
 
 
 async def wp_kaynnista_ymparisto(nimi: str) -> str:
-    """Käynnistää ympäristön: käynnistää kontit uudelleen (up -d)."""
-    env_path = os.path.join(ENV_DIR, nimi)
-    if not os.path.exists(env_path):
-        return f"Ympäristöä '{nimi}' ei löydy." 
+    """Käynnistää ympäristön: olemassa olevat kontit Docker API:lla, muuten up -d."""
+    _, viesti = await _kaynnista(nimi)
+    return viesti
 
-    compose_path = os.path.join(env_path, "docker-compose.yml")
-    if not os.path.exists(compose_path):
-        return f"Ympäristöä '{nimi}' ei löydy tai siinä ei ole docker-compose.yml:ää."
+
+@_kohdeymparisto()
+async def _kaynnista(nimi: str) -> Tuple[bool, str]:
+    """wp_kaynnista_ymparisto: palauttaa (onnistui, viesti); jo käynnissä on onnistuminen."""
+    import docker_api
+    slug = _ratkaise_slug(nimi)
+    env_path = os.path.join(ENV_DIR, slug) if slug else None
+    if not env_path or not os.path.exists(env_path):
+        return False, f"Ympäristöä '{nimi}' ei löydy." 
+
+    if not os.path.exists(os.path.join(env_path, "docker-compose.yml")):
+        return False, f"Ympäristöä '{nimi}' ei löydy tai siinä ei ole docker-compose.yml:ää."
+
+    try:
+        palvelut = await tila_valimuisti.palvelut(slug)
+    except Exception as e:
+        print(f"Varoitus: tilan haku epäonnistui: {e}")
+        palvelut = None
+    if palvelut and all(t == "running" for t in palvelut.values()):
+        _rekisteri.paivita(slug, status="käynnissä")
+        return True, f"Ympäristö '{nimi}' on jo käynnissä."
 
     try:
-        _run(["docker", "compose", "-f", "docker-compose.yml", "up", "-d"], cwd=env_path)
+        await docker_api.kaynnista(env_path, rivi_callback=komentotuloste.get())
     except Exception as e:
-        return f"Ympäristön käynnistäminen epäonnistui: {str(e)}"
+        return False, f"Ympäristön käynnistäminen epäonnistui: {str(e)}"
+    finally:
+        tila_valimuisti.vanhenna()
+    _rekisteri.paivita(slug, status="käynnissä")
 
-    return f"Ympäristö '{nimi}' käynnistetty." 
+    return True, f"Ympäristö '{nimi}' käynnistetty." 
 
 
 async def wp_listaa_kaikki_ymparistot() -> str:
     """Listaa kaikki ympäristöt, niiden metatiedot ja tila (sis. ei-docker-compose hakemistot)."""
-    envs = sorted([d for d in os.listdir(ENV_DIR) if os.path.isdir(os.path.join(ENV_DIR, d))])
+    envs = _rekisteri.listaa()
     if not envs:
         return "Ei löydetty ympäristöjä."
 
-    tulos = "Kaikki ympäristöt:\n"
-    for e in envs:
-        display = e
-        port = None
-        meta_path = os.path.join(ENV_DIR, e, "meta.json")
-        if os.path.exists(meta_path):
-            try:
-                m = json.load(open(meta_path))
-                display = m.get("display_name", e)
-                port = m.get("port")
-            except Exception:
-                pass
-
-        compose_path = os.path.join(ENV_DIR, e, "docker-compose.yml")
-        has_compose = os.path.exists(compose_path)
-        if has_compose:
-            try:
-                out = _run(["docker", "compose", "-f", "docker-compose.yml", "ps", "--services", "--filter", "status=running"], cwd=os.path.join(ENV_DIR, e))
-                tila = "käynnissä" if out.strip() else "pysähdyksissä"
-            except Exception:
-                tila = "tila: tarkistamaton"
-        else:
-            tila = "ei docker-compose.yml"
+    # Kaikkien compose-ympäristöjen tila yhdellä docker-kutsulla
+    try:
+        tilat = await tila_valimuisti.tilat_slugeille([e["slug"] for e in envs if e["has_compose"]])
+    except Exception as ex:
+        print(f"Varoitus: tilojen haku epäonnistui: {ex}")
+        tilat = {}
 
-        tulos += f"- {display} (slug: {e}) - port: {port if port else 'unknown'}, compose: {'yes' if has_compose else 'no'}, tila: {tila}\n"
+    rivit = ["Kaikki ympäristöt:"]
+    for e in envs:
+        port = e["port"]
+        has_compose = bool(e["has_compose"])
+        tila = _tila_teksti(e, tilat)
+        rivit.append(f"- {e['display_name']} (slug: {e['slug']}) - port: {port if port else 'unknown'}, compose: {'yes' if has_compose else 'no'}, tila: {tila}")
 
-    return tulos
+    return "\n".join(rivit) + "\n"
 
 
 async def wp_listaa_ymparistot() -> str:
-    """Listaa ympäristöt hakemistosta ja niiden tila (käynnissä/pysähdyksissä)."""
-    envs = [d for d in os.listdir(ENV_DIR) if os.path.isdir(os.path.join(ENV_DIR, d))]
+    """Listaa ympäristöt rekisteristä ja niiden tila (käynnissä/pysähdyksissä)."""
+    envs = _rekisteri.listaa()
     if not envs:
         return "Ei löydetty ympäristöjä."
 
-    tulos = "Löydetyt ympäristöt ja tila:\n"
-    for e in envs:
-        compose_path = os.path.join(ENV_DIR, e, "docker-compose.yml")
-        display = e
-        meta_path = os.path.join(ENV_DIR, e, "meta.json")
-        if os.path.exists(meta_path):
-            try:
-                m = json.load(open(meta_path))
-                display = m.get("display_name", e)
-            except Exception:
-                pass
+    try:
+        tilat = await tila_valimuisti.tilat_slugeille([e["slug"] for e in envs if e["has_compose"]])
+    except Exception as ex:
+        print(f"Varoitus: tilojen haku epäonnistui: {ex}")
+        tilat = {}
 
-        if os.path.exists(compose_path):
-            try:
-                out = _run(["docker", "compose", "-f", "docker-compose.yml", "ps", "--services", "--filter", "status=running"], cwd=os.path.join(ENV_DIR, e))
-                tila = "käynnissä" if out.strip() else "pysähdyksissä"
-            except Exception:
-                tila = "tila: tarkistamaton"
-        else:
-            tila = "ei docker-compose.yml"
-        tulos += f"- {display} (slug: {e}): {tila}\n"
+    rivit = ["Löydetyt ympäristöt ja tila:"]
+    for e in envs:
+        rivit.append(f"- {e['display_name']} (slug: {e['slug']}): {_tila_teksti(e, tilat)}")
 
-    return tulos
+    return "\n".join(rivit) + "\n"
 
 
+@_kohdeymparisto()
 async def wp_muuta_ymparisto(nimi: str, asetukset: Annotated[str, "JSON asetukset, esim. {'portti': 8081} "]) -> str:
     """Muokkaa olemassaolevaa ympäristöä -- tällä hetkellä tukee portin muokkausta ja uusien pluginien lisäämistä."""
-    slug = _slugify(nimi)
+    slug = _ratkaise_slug(nimi) or _slugify(nimi)
     env_path = os.path.join(ENV_DIR, slug)
     compose_path = os.path.join(env_path, "docker-compose.yml")
     if not os.path.exists(compose_path):
@@ -278,38 +436,383 @@ async def wp_muuta_ymparisto(nimi: str, asetukset: Annotated[str, "JSON asetukse
 
     # Yksinkertainen muutos: portin päivitys
     if "portti" in aset:
-        with open(compose_path, "r+") as f:
-            s = f.read()
-            # Etsi ensimmäinen port-mappi ja korvaa portti
-            import re
-            new = re.sub(r"ports:\n\s*- \"\d+:80\"", f"ports:\n      - \"{aset['portti']}:80\"", s, count=1)
-            f.seek(0)
-            f.write(new)
-            f.truncate()
         try:
-            _run(["docker", "compose", "-f", "docker-compose.yml", "up", "-d"], cwd=env_path)
+            with _rekisteri.transaktio():
+                _rekisteri.paivita(slug, port=int(aset["portti"]))
+                with open(compose_path, "r+") as f:
+                    s = f.read()
+                    # Etsi ensimmäinen port-mappi ja korvaa portti
+                    new = re.sub(r"ports:\n\s*- \"\d+:80\"", f"ports:\n      - \"{aset['portti']}:80\"", s, count=1)
+                    f.seek(0)
+                    f.write(new)
+                    f.truncate()
+                _paivita_meta(env_path, port=aset["portti"])
+        except VarattuVirhe as e:
+            return f"Portti {aset['portti']} on jo ympäristön '{e.varaaja}' käytössä."
+        try:
+            await _run(["docker", "compose", "-f", "docker-compose.yml", "up", "-d"], cwd=env_path)
             return f"Ympäristön '{nimi}' portti päivitetty ja ympäristö uudelleenkäynnistetty." 
         except Exception as e:
             return f"Portin päivitys epäonnistui: {str(e)}"
+        finally:
+            tila_valimuisti.vanhenna()
 
     # Pluginien lisääminen
     if "plugins" in aset and isinstance(aset["plugins"], list):
         try:
-            for plugin in aset["plugins"]:
-                try:
-                    _run(["docker", "compose", "-f", "docker-compose.yml", "exec", "-T", "wpcli", "wp", "plugin", "install", plugin, "--activate", "--allow-root"], cwd=env_path)
-                except Exception:
-                    try:
-                        _run(["docker", "compose", "-f", "docker-compose.yml", "exec", "-T", "wordpress", "wp", "plugin", "install", plugin, "--activate", "--allow-root"], cwd=env_path)
-                    except Exception:
-                        print(f"WP-CLI ei saatavilla tai plugin asennus epäonnistui: {plugin}")
-            return f"Pluginien asennus yritetty ympäristöön '{nimi}', tarkista tarvittaessa manuaalisesti." 
+            raportti = await asenna_pluginit(env_path, aset["plugins"])
+            return f"Ympäristö '{nimi}': {raportti}"
         except Exception as e:
             return f"Pluginien asennus epäonnistui: {str(e)}"
 
     return "Ei tehtyjä muutoksia. Tuettuja asetuksia: 'portti', 'plugins'."
 
 
+async def wp_pooli_tila() -> str:
+    """Näyttää valmiiden ympäristöjen poolin tilan ja mittarit (osumat, ohitukset, lunastusaika)."""
+    from ymparistopooli import pooli
+    t = pooli.tilastot()
+    if not t["koko"]:
+        return "Ympäristöpooli ei ole käytössä (WP_POOL_SIZE=0)."
+    return (
+        f"Ympäristöpooli: {t['valmiina']}/{t['koko']} valmiina, {t['kesken']} käynnistymässä. "
+        f"Osumat: {t['osumat']}, ohitukset: {t['ohitukset']}, osumaprosentti: {t['osumaprosentti']}. "
+        f"Lunastusaika p50: {t['lunastus_p50_s']} s, max: {t['lunastus_max_s']} s."
+    )
+
+
+async def wp_lepotila_tila() -> str:
+    """Näyttää käyttämättömien ympäristöjen lepotila-ajastimen tilan ja mittarit."""
+    from lepotila import lepotila
+    t = lepotila.tilastot()
+    if not t["raja_s"]:
+        return "Automaattinen lepotila ei ole käytössä (WP_IDLE_SUSPEND_AFTER=0)."
+    kohde = "vain wpcli-sivukontti tauotetaan" if t["tila"] == "wpcli" else "ympäristö sammutetaan"
+    kayttamatta = ", ".join(f"{s}: {k} s" for s, k in t["kayttamatta_s"].items()) or "-"
+    return (
+        f"Lepotila: {t['raja_s']:g} s käyttämättä -> {kohde}. Lepuutettu: {t['lepuutetut']}, "
+        f"herätetty: {t['heratetyt']}, herätys p50: {t['heratys_p50_s']} s. "
+        f"Aikaa viimeisestä käytöstä: {kayttamatta}."
+    )
+
+
+async def wp_tilannekuva(
+    nimi: Annotated[str, "Ympäristö, josta tilannekuva otetaan"],
+    tilannekuva: Annotated[str, "Tilannekuvan nimi (oletus: ympäristön slug); olemassa oleva päivitetään"] = "",
+) -> str:
+    """Ottaa ympäristön volyymeista (db_data, wordpress_data) tilannekuvan kloonausta varten.
+
+    Käynnissä oleva ympäristö pysäytetään kopioinnin ajaksi (MySQL-tiedostot yhtenäisinä).
+    """
+    _, viesti = await _ota_tilannekuva(nimi, tilannekuva)
+    return viesti
+
+
+@_kohdeymparisto(heraa=False)
+async def _ota_tilannekuva(nimi: str, tilannekuva: str = "") -> Tuple[bool, str]:
+    """wp_tilannekuva: palauttaa (onnistui, viesti), jotta kloonaus ei tulkitse viestin tekstiä."""
+    import docker_api
+    import tilannekuvat
+    from docker_tila import projektin_nimi, hae_projektien_tilat
+    slug = _ratkaise_slug(nimi)
+    env_path = os.path.join(ENV_DIR, slug) if slug else None
+    compose_path = os.path.join(env_path, "docker-compose.yml") if env_path else None
+    if not compose_path or not os.path.exists(compose_path):
+        return False, f"Ympäristöä '{nimi}' ei löydy tai siinä ei ole docker-compose.yml:ää."
+    meta = lue_meta(env_path)
+    if meta.get("shared_db"):
+        return False, f"Ympäristö '{nimi}' käyttää jaettua tietokantaa; tilannekuvat tukevat vain omaa db-volyymia."
+    kuva = _slugify(tilannekuva or slug)
+    if not kuva:
+        return False, f"Virheellinen tilannekuvan nimi: '{tilannekuva}'."
+    with open(compose_path) as f:
+        prefix = meta.get("volume_prefix") or lue_volyymi_prefix(f.read(), slug)
+
+    # Ajantasainen tila suoraan Dockerilta (ei välimuistista): käynnissä olevaa MySQL:ää ei kopioida
+    try:
+        palvelut = (await hae_projektien_tilat()).get(projektin_nimi(slug), {})
+    except Exception as e:
+        return False, f"Ympäristön tilan haku epäonnistui: {str(e)}"
+    kaynnissa = any(t in ("running", "paused", "restarting") for t in palvelut.values())
+    # Kopio menee toiseen sukupolveen; meta.json osoittaa vanhaan, kunnes kopio on valmis
+    kohteet = tilannekuvat.paivityksen_volyymit(kuva)
+    alku = time.monotonic()
+    try:
+        if kaynnissa:
+            await docker_api.pysayta(env_path, rivi_callback=komentotuloste.get())
+        tapa = await tilannekuvat.kopioi_volyymit(volyymi_nimet(prefix), kohteet)
+    except Exception as e:
+        return False, f"Tilannekuvan ottaminen epäonnistui: {str(e)}"
+    finally:
+        try:
+            if kaynnissa:
+                await docker_api.kaynnista(env_path, rivi_callback=komentotuloste.get())
+        except Exception as e:
+            print(f"Varoitus: ympäristön '{slug}' käynnistys tilannekuvan jälkeen epäonnistui: {e}")
+        tila_valimuisti.vanhenna()
+    kesto = time.monotonic() - alku
+    tilannekuvat.tallenna(kuva, tilannekuvat.uusi_meta(kuva, slug, meta, kohteet, tapa, kesto))
+    return True, f"Tilannekuva '{kuva}' otettu ympäristöstä '{nimi}' {kesto:.1f} s:ssa ({tapa})."
+
+
+async def _korjaa_osoite(env_path: str, vanha_portti, portti) -> str:
+    """Vaihda kloonin WordPress-osoitteet uudelle portille (wp search-replace); odottaa tietokantaa."""
+    import docker_api
+    if not vanha_portti or str(vanha_portti) == str(portti):
+        return ""
+    cmd = ["wp", "search-replace", f"//localhost:{vanha_portti}", f"//localhost:{portti}",
+           "--all-tables", "--skip-columns=guid", "--allow-root"]
+    raja = time.monotonic() + WP_CLONE_READY_TIMEOUT
+    while True:
+        try:
+            await docker_api.suorita(env_path, "wpcli", cmd, aikaraja=120)
+            return f" Osoitteet päivitetty porttiin {portti}."
+        except Exception as e:
+            if time.monotonic() > raja:
+                return f" Osoitteiden päivitys epäonnistui (aja wp search-replace käsin): {str(e)}"
+            await asyncio.sleep(2)
+
+
+async def wp_kloonaa_ymparisto(
+    lahde: Annotated[str, "Tilannekuva tai ympäristö (ympäristöstä otetaan ensin tilannekuva)"],
+    nimi: Annotated[str, "Uuden ympäristön nimi"],
+    portti: Annotated[int, "Julkaistava host-portti uudelle ympäristölle"],
+) -> str:
+    """Luo uuden ympäristön tilannekuvasta: volyymit kopioidaan (reflink/rsync/apukontti) ennen käynnistystä."""
+    slug = _slugify(nimi)
+    env_path = os.path.join(ENV_DIR, slug)
+    virhe = _varaa(slug, nimi, None, portti, env_path)
+    if virhe:
+        return virhe
+    try:
+        return await _kloonaa(lahde, nimi, slug, env_path, portti)
+    finally:
+        _vapauta_varaus(slug)
+
+
+async def _kloonaa(lahde, nimi, slug, env_path, portti) -> str:
+    import tilannekuvat
+    from docker_tila import projektin_nimi
+    raportti = ""
+    lahde_slug = _ratkaise_slug(lahde)
+    if lahde_slug and os.path.exists(os.path.join(ENV_DIR, lahde_slug, "docker-compose.yml")):
+        # Ympäristö lähteenä: tilannekuva sen slugilla (päivittyy inkrementaalisesti)
+        if lue_meta(os.path.join(ENV_DIR, lahde_slug)).get("shared_db"):
+            return f"Ympäristö '{lahde}' käyttää jaettua tietokantaa; kloonaus tukee vain omaa db-volyymia."
+        ok, raportti = await _ota_tilannekuva(lahde_slug)
+        if not ok:
+            return raportti
+        kuva = _slugify(lahde_slug)
+    else:
+        kuva = _slugify(lahde)
+    kuva_meta = tilannekuvat.lue(kuva)
+    if kuva_meta is None:
+        return f"Tilannekuvaa tai ympäristöä '{lahde}' ei löydy."
+
+    alku = time.monotonic()
+    tyyppi = kuva_meta.get("type", "wordpress")
+    luotu = False
+    try:
+        with _rekisteri.transaktio():
+            os.makedirs(env_path)
+            luotu = True
+            kirjoita_db_env(env_path)
+            with open(os.path.join(env_path, "docker-compose.yml"), "w") as f:
+                f.write(wordpress_compose(portti, slug=slug))
+            with open(os.path.join(env_path, "meta.json"), "w") as mf:
+                json.dump({"display_name": nimi, "type": tyyppi, "port": portti, "cloned_from": kuva}, mf)
+            _rekisteri.paivita(slug, type=tyyppi, status="luotu", has_compose=True)
+    except Exception as e:
+        if luotu:
+            shutil.rmtree(env_path, ignore_errors=True)
+        return f"Ympäristön tallennus epäonnistui: {str(e)}"
+
+    kohteet = volyymi_nimet(projektin_nimi(slug))
+    try:
+        tapa = await tilannekuvat.kopioi_volyymit(kuva_meta["volumes"], kohteet)
+    except Exception as e:
+        try:
+            await _run(["docker", "volume", "rm", "-f", *kohteet.values()])
+        except Exception as ex:
+            print(f"Varoitus: kloonin volyymien poisto epäonnistui: {ex}")
+        with _rekisteri.transaktio():
+            _rekisteri.poista(slug)
+            shutil.rmtree(env_path, ignore_errors=True)
+        return f"Volyymien kopiointi tilannekuvasta '{kuva}' epäonnistui: {str(e)}"
+
+    try:
+        await _run(["docker", "compose", "-f", "docker-compose.yml", "up", "-d"], cwd=env_path)
+    except Exception as e:
+        _rekisteri.paivita(slug, status="virhe")
+        return f"Docker-compose up epäonnistui: {str(e)}"
+    finally:
+        tila_valimuisti.vanhenna()
+    _rekisteri.paivita(slug, status="käynnissä")
+    kopioitu = time.monotonic() - alku
+    osoitteet = await _korjaa_osoite(env_path, kuva_meta.get("port"), portti)
+
+    return (f"{raportti} Ympäristö '{nimi}' kloonattu tilannekuvasta '{kuva}' porttiin {portti} "
+            f"{kopioitu:.1f} s:ssa ({tapa}).{osoitteet}").strip()
+
+
+async def wp_listaa_tilannekuvat() -> str:
+    """Listaa tilannekuvat: lähdeympäristö, ikä ja kopiointitapa."""
+    import tilannekuvat
+    kuvat = tilannekuvat.listaa()
+    if not kuvat:
+        return "Ei tilannekuvia."
+    rivit = ["Tilannekuvat:"]
+    for k in kuvat:
+        otettu = time.strftime("%Y-%m-%d %H:%M", time.localtime(k.get("created_at", 0)))
+        rivit.append(f"- {k['name']}: lähde {k.get('display_name')} (slug: {k.get('source')}), "
+                     f"otettu {otettu}, {k.get('copy')} {k.get('copy_seconds')} s")
+    return "\n".join(rivit) + "\n"
+
+
+async def wp_poista_tilannekuva(tilannekuva: Annotated[str, "Tilannekuvan nimi"]) -> str:
+    """Poistaa tilannekuvan ja sen volyymit (kloonattuihin ympäristöihin ei vaikuteta)."""
+    import tilannekuvat
+    kuva = _slugify(tilannekuva)
+    if not kuva or tilannekuvat.lue(kuva) is None:
+        return f"Tilannekuvaa '{tilannekuva}' ei löydy."
+    try:
+        await tilannekuvat.poista(kuva)
+    except Exception as e:
+        return f"Tilannekuvan poisto epäonnistui: {str(e)}"
+    return f"Tilannekuva '{kuva}' poistettu."
+
+
+# Massatoiminnot: valitsimen nimikkeet -> rekisterin kentät ('tila' on Dockerin ajantasainen tila)
+_VALITSIN_KENTAT = {"tyyppi": "type", "type": "type", "portti": "port", "port": "port", "status": "status"}
+
+
+async def _valitse_ymparistot(nimet, valitsin: str):
+    """Massatoiminnon kohteet nimilistasta ja/tai valitsimesta. Palauttaa [(nimi, slug tai None)].
+
+    Valitsin on pilkuilla eroteltu lista glob-kuvioita (slug tai näyttönimi, esim. 'test-*')
+    ja nimikkeitä (esim. 'tila=käynnissä', 'tyyppi=wordpress'). Ympäristö valitaan, jos jokin
+    kuvio osuu (tai kuvioita ei ole) ja kaikki nimikkeet täsmäävät.
+    """
+    kohteet = []
+    for nimi in nimet or []:
+        kohteet.append((nimi, _ratkaise_slug(nimi)))
+
+    if valitsin and valitsin.strip():
+        kuviot, nimikkeet = [], {}
+        for osa in (o.strip() for o in valitsin.split(",")):
+            if "=" in osa:
+                avain, arvo = (s.strip() for s in osa.split("=", 1))
+                nimikkeet[avain.lower()] = arvo
+            elif osa:
+                kuviot.append(osa.lower())
+        tuntemattomat = set(nimikkeet) - set(_VALITSIN_KENTAT) - {"tila"}
+        if tuntemattomat:
+            raise ValueError(f"tuntematon nimike: {', '.join(sorted(tuntemattomat))} "
+                             f"(tuetut: tila, tyyppi, portti, status)")
+        envs = _rekisteri.listaa()
+        tilat = {}
+        if "tila" in nimikkeet:
+            tilat = await tila_valimuisti.tilat_slugeille([e["slug"] for e in envs if e["has_compose"]])
+        for e in envs:
+            if kuviot and not any(fnmatch.fnmatch(e["slug"], k) or fnmatch.fnmatch((e["display_name"] or "").lower(), k)
+                                  for k in kuviot):
+                continue
+            if any(str(e[_VALITSIN_KENTAT[a]]).lower() != v.lower()
+                   for a, v in nimikkeet.items() if a != "tila"):
+                continue
+            if "tila" in nimikkeet and tilat.get(e["slug"], "") != nimikkeet["tila"].lower():
+                continue
+            kohteet.append((e["display_name"], e["slug"]))
+
+    # Sama ympäristö vain kerran (nimi ja valitsin voivat osua samaan)
+    nahdyt, uniikit = set(), []
+    for nimi, slug in kohteet:
+        if slug is None or slug not in nahdyt:
+            uniikit.append((nimi, slug))
+            nahdyt.add(slug)
+    return uniikit
+
+
+async def _massatoiminto(otsikko: str, toiminto, kohteet) -> str:
+    """Aja `toiminto(slug)` kohteille rinnakkain (WP_BULK_CONCURRENCY) ja palauta tulostaulukko.
+
+    `toiminto` palauttaa (onnistui, viesti); poikkeus kirjataan epäonnistumiseksi.
+    """
+    semafori = asyncio.Semaphore(max(1, WP_BULK_CONCURRENCY))
+
+    async def yksi(nimi, slug):
+        if slug is None:
+            return nimi, False, f"Ympäristöä '{nimi}' ei löydy.", 0.0
+        async with semafori:
+            alku = time.monotonic()
+            try:
+                ok, viesti = await toiminto(slug)
+            except Exception as e:
+                ok, viesti = False, f"Virhe: {str(e)}"
+            return nimi, ok, viesti.strip(), time.monotonic() - alku
+
+    alku = time.monotonic()
+    tulokset = await asyncio.gather(*(yksi(nimi, slug) for nimi, slug in kohteet))
+    onnistuneet = sum(1 for _, ok, _, _ in tulokset if ok)
+    rivit = [
+        f"{otsikko}: {onnistuneet}/{len(tulokset)} onnistui ({time.monotonic() - alku:.1f} s).",
+        "",
+        "| Ympäristö | Tulos | Kesto | Viesti |",
+        "|---|---|---|---|",
+    ]
+    for nimi, ok, viesti, kesto in tulokset:
+        tulos = "ok" if ok else "virhe"
+        rivit.append(f"| {nimi} | {tulos} | {kesto:.1f} s | {viesti.replace('|', '/')} |")
+    return "\n".join(rivit) + "\n"
+
+
+async def wp_sammuta_ymparistot(
+    nimet: Annotated[Optional[List[str]], "Ympäristöjen nimet"] = None,
+    valitsin: Annotated[str, "Glob ja/tai nimikkeet, esim. 'test-*' tai 'tila=käynnissä,tyyppi=wordpress'"] = "",
+) -> str:
+    """Sammuttaa useita ympäristöjä rinnakkain (nimilista tai valitsin) ja palauttaa tulostaulukon."""
+    try:
+        kohteet = await _valitse_ymparistot(nimet, valitsin)
+    except ValueError as e:
+        return f"Virheellinen valitsin: {str(e)}"
+    if not kohteet:
+        return "Yksikään ympäristö ei vastannut nimiä tai valitsinta."
+    return await _massatoiminto("Sammutus", _sammuta, kohteet)
+
+
+async def wp_kaynnista_ymparistot(
+    nimet: Annotated[Optional[List[str]], "Ympäristöjen nimet"] = None,
+    valitsin: Annotated[str, "Glob ja/tai nimikkeet, esim. 'test-*' tai 'tila=pysähdyksissä'"] = "",
+) -> str:
+    """Käynnistää useita ympäristöjä rinnakkain (nimilista tai valitsin) ja palauttaa tulostaulukon."""
+    try:
+        kohteet = await _valitse_ymparistot(nimet, valitsin)
+    except ValueError as e:
+        return f"Virheellinen valitsin: {str(e)}"
+    if not kohteet:
+        return "Yksikään ympäristö ei vastannut nimiä tai valitsinta."
+    return await _massatoiminto("Käynnistys", _kaynnista, kohteet)
+
+
+async def wp_poista_ymparistot(
+    nimet: Annotated[Optional[List[str]], "Ympäristöjen nimet"] = None,
+    valitsin: Annotated[str, "Glob ja/tai nimikkeet, esim. 'test-*'"] = "",
+    vahvista: Annotated[bool, "Valitsimella poistettaessa true; muuten vain listataan osumat"] = False,
+) -> str:
+    """Poistaa useita ympäristöjä rinnakkain. Valitsimella poisto tehdään vasta vahvistuksella."""
+    try:
+        kohteet = await _valitse_ymparistot(nimet, valitsin)
+    except ValueError as e:
+        return f"Virheellinen valitsin: {str(e)}"
+    if not kohteet:
+        return "Yksikään ympäristö ei vastannut nimiä tai valitsinta."
+    if valitsin and valitsin.strip() and not vahvista:
+        listaus = ", ".join(nimi for nimi, _ in kohteet)
+        return (f"Valitsin '{valitsin}' osuu {len(kohteet)} ympäristöön: {listaus}. "
+                f"Mitään ei poistettu; kutsu uudelleen vahvista=true poistaaksesi ne.")
+    return await _massatoiminto("Poisto", _poista, kohteet)
+
+
 # FunctionToolit
 wp_luo_ymparisto_tool = FunctionTool(
     wp_luo_ymparisto,
@@ -352,3 +855,62 @@ wp_listaa_kaikki_ymparistot_tool = FunctionTool(
     name="wp_listaa_kaikki_ymparistot",
     description="Listaa kaikki ympäristöt ja niiden metatiedot (display name, portti, compose-tila)."
 )
+
+wp_sammuta_ymparistot_tool = FunctionTool(
+    wp_sammuta_ymparistot,
+    name="wp_sammuta_ymparistot",
+    description="Sammuttaa monta ympäristöä kerralla rinnakkain: nimet (lista) ja/tai valitsin "
+                "(glob kuten 'test-*' tai nimikkeet kuten 'tila=käynnissä'). Palauttaa tulostaulukon."
+)
+
+wp_kaynnista_ymparistot_tool = FunctionTool(
+    wp_kaynnista_ymparistot,
+    name="wp_kaynnista_ymparistot",
+    description="Käynnistää monta ympäristöä kerralla rinnakkain: nimet (lista) ja/tai valitsin "
+                "(glob tai nimikkeet kuten 'tila=pysähdyksissä'). Palauttaa tulostaulukon."
+)
+
+wp_poista_ymparistot_tool = FunctionTool(
+    wp_poista_ymparistot,
+    name="wp_poista_ymparistot",
+    description="Poistaa monta ympäristöä kerralla rinnakkain: nimet (lista) ja/tai valitsin. "
+                "Valitsimella ensin listataan osumat; poisto vaatii vahvista=true."
+)
+
+wp_lepotila_tila_tool = FunctionTool(
+    wp_lepotila_tila,
+    name="wp_lepotila_tila",
+    description="Näyttää käyttämättömien ympäristöjen automaattisen lepotilan asetukset, herätykset ja käyttämättömyysajat."
+)
+
+wp_tilannekuva_tool = FunctionTool(
+    wp_tilannekuva,
+    name="wp_tilannekuva",
+    description="Ottaa ympäristön tietokanta- ja WordPress-volyymeista tilannekuvan (tai päivittää olemassa olevan). "
+                "Parametrit: nimi, tilannekuva (valinnainen)."
+)
+
+wp_kloonaa_ymparisto_tool = FunctionTool(
+    wp_kloonaa_ymparisto,
+    name="wp_kloonaa_ymparisto",
+    description="Luo uuden ympäristön tilannekuvasta tai toisesta ympäristöstä sekunneissa (sisältö ja pluginit mukana). "
+                "Parametrit: lahde, nimi, portti."
+)
+
+wp_listaa_tilannekuvat_tool = FunctionTool(
+    wp_listaa_tilannekuvat,
+    name="wp_listaa_tilannekuvat",
+    description="Listaa ympäristöjen tilannekuvat (lähde, ikä, kopiointitapa)."
+)
+
+wp_poista_tilannekuva_tool = FunctionTool(
+    wp_poista_tilannekuva,
+    name="wp_poista_tilannekuva",
+    description="Poistaa tilannekuvan ja sen volyymit. Parametri: tilannekuva."
+)
+
+wp_pooli_tila_tool = FunctionTool(
+    wp_pooli_tila,
+    name="wp_pooli_tila",
+    description="Näyttää valmiiksi käynnistettyjen WordPress-ympäristöjen poolin tilan ja osuma-/lunastusmittarit."
+)
\ No newline at end of file
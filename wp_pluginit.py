@@ -0,0 +1,130 @@
+# wp_pluginit.py
+# WordPress-pluginien asennus yhdellä WP-CLI-kutsulla ja jaettu plugin-välimuisti.
+#
+# - Kaikki ympäristöt liittävät saman host-hakemiston WP-CLI:n välimuistiksi
+#   (WP_CLI_CACHE_DIR). WP-CLI tallentaa sinne ladatut zipit nimellä
+#   plugin/<slug>-<versio>.zip, joten sama versio ladataan wordpress.orgista vain kerran.
+# - WP_PLUGIN_MIRROR_DIR: paikallinen peilihakemisto zipeille (<slug>.<versio>.zip,
+#   <slug>-<versio>.zip tai <slug>.zip). Peilin ja välimuistin zipit asennetaan
+#   suoraan ilman verkkoa.
+# - WP_PLUGIN_OFFLINE=1: ei latauksia ollenkaan, vain peili ja välimuisti.
+
+import os
+import glob
+from komennot import komentotuloste
+
+PLUGIN_CACHE_DIR = os.path.abspath(os.getenv(
+    "WP_PLUGIN_CACHE_DIR",
+    os.path.join(os.getenv("DOCKER_ENV_DIR", "./environments"), ".wp-cli-cache"),
+))
+PLUGIN_MIRROR_DIR = os.getenv("WP_PLUGIN_MIRROR_DIR", "")
+PLUGIN_OFFLINE = os.getenv("WP_PLUGIN_OFFLINE", "0").lower() in ("1", "true", "yes")
+
+# Polut konttien sisällä
+KONTTI_CACHE_DIR = "/wp-cli-cache"
+KONTTI_MIRROR_DIR = "/plugin-mirror"
+
+
+def valmistele_hakemistot():
+    """Luo jaettu välimuistihakemisto (wpcli-kontti ajaa www-data-käyttäjänä, joten kirjoitusoikeus kaikille)."""
+    os.makedirs(os.path.join(PLUGIN_CACHE_DIR, "plugin"), exist_ok=True)
+    for polku in (PLUGIN_CACHE_DIR, os.path.join(PLUGIN_CACHE_DIR, "plugin")):
+        try:
+            os.chmod(polku, 0o777)
+        except OSError as e:
+            print(f"Varoitus: välimuistihakemiston oikeuksia ei voitu asettaa: {e}")
+
+
+def compose_volyymit() -> list:
+    """wpcli-palvelun lisäliitokset compose-tiedostoon: jaettu välimuisti ja mahdollinen peili."""
+    liitokset = [f"{PLUGIN_CACHE_DIR}:{KONTTI_CACHE_DIR}"]
+    if PLUGIN_MIRROR_DIR:
+        liitokset.append(f"{os.path.abspath(PLUGIN_MIRROR_DIR)}:{KONTTI_MIRROR_DIR}:ro")
+    return liitokset
+
+
+def _jaa_plugin(plugin: str):
+    """'slug' tai 'slug:versio' -> (slug, versio|None)."""
+    slug, _, versio = str(plugin).strip().partition(":")
+    return slug, (versio or None)
+
+
+def _uusin(polut):
+    polut = [p for p in polut if os.path.isfile(p)]
+    return max(polut, key=os.path.getmtime) if polut else None
+
+
+def etsi_paikallinen_zip(slug: str, versio=None):
+    """Etsi pluginin zip peilistä tai jaetusta välimuistista. Palauttaa polun kontin sisällä tai None."""
+    hakemistot = []
+    if PLUGIN_MIRROR_DIR:
+        hakemistot.append((os.path.abspath(PLUGIN_MIRROR_DIR), KONTTI_MIRROR_DIR))
+    hakemistot.append((os.path.join(PLUGIN_CACHE_DIR, "plugin"), f"{KONTTI_CACHE_DIR}/plugin"))
+
+    for host_dir, kontti_dir in hakemistot:
+        if versio:
+            ehdokkaat = [os.path.join(host_dir, f"{slug}.{versio}.zip"), os.path.join(host_dir, f"{slug}-{versio}.zip")]
+        else:
+            ehdokkaat = [os.path.join(host_dir, f"{slug}.zip")]
+            ehdokkaat += glob.glob(os.path.join(glob.escape(host_dir), f"{glob.escape(slug)}.*.zip"))
+            ehdokkaat += glob.glob(os.path.join(glob.escape(host_dir), f"{glob.escape(slug)}-[0-9]*.zip"))
+        loytyi = _uusin(ehdokkaat)
+        if loytyi:
+            return f"{kontti_dir}/{os.path.basename(loytyi)}"
+    return None
+
+
+def plugin_lahteet(plugins, kayta_paikallisia=None):
+    """Muunna plugin-lista WP-CLI:n asennuslähteiksi.
+
+    Palauttaa (lahteet, puuttuvat): lähde on paikallinen zip, versioitu lataus-URL tai slug.
+    Offline-tilassa puuttuvat ovat pluginit, joille ei löytynyt paikallista zipiä.
+    """
+    if kayta_paikallisia is None:
+        kayta_paikallisia = bool(PLUGIN_MIRROR_DIR) or PLUGIN_OFFLINE
+    lahteet, puuttuvat = [], []
+    for plugin in plugins:
+        slug, versio = _jaa_plugin(plugin)
+        if not slug:
+            continue
+        paikallinen = etsi_paikallinen_zip(slug, versio) if kayta_paikallisia else None
+        if paikallinen:
+            lahteet.append(paikallinen)
+        elif PLUGIN_OFFLINE:
+            puuttuvat.append(str(plugin))
+        elif versio:
+            lahteet.append(f"https://downloads.wordpress.org/plugin/{slug}.{versio}.zip")
+        else:
+            lahteet.append(slug)
+    return lahteet, puuttuvat
+
+
+async def asenna_pluginit(env_path: str, plugins) -> str:
+    """Asenna ja aktivoi kaikki pluginit yhdellä `wp plugin install` -kutsulla.
+
+    Yrittää ensin wpcli-palvelua ja vasta sen epäonnistuessa kerran wordpress-konttia.
+    Palauttaa lyhyen raportin LLM:lle.
+    """
+    import docker_api
+    lahteet, puuttuvat = plugin_lahteet(plugins)
+    raportti = []
+    if puuttuvat:
+        raportti.append(f"Offline-tila: ei paikallista zipiä pluginille: {', '.join(puuttuvat)}.")
+    if not lahteet:
+        return " ".join(raportti) or "Ei asennettavia plugineja."
+
+    wp_komento = ["wp", "plugin", "install", *lahteet, "--activate", "--allow-root"]
+    virheet = []
+    for palvelu in ("wpcli", "wordpress"):
+        try:
+            await docker_api.suorita(env_path, palvelu, wp_komento, rivi_callback=komentotuloste.get())
+            raportti.insert(0, f"Pluginit asennettu ja aktivoitu ({len(lahteet)} kpl, yksi WP-CLI-kutsu, palvelu: {palvelu}).")
+            return " ".join(raportti)
+        except Exception as e:
+            virheet.append(f"{palvelu}: {str(e)}")
+            # WP-CLI itse ajettiin (osa asennuksista epäonnistui) -> ei uusintaa toisessa kontissa
+            if "Error:" in getattr(e, "stderr", "") or "Warning:" in getattr(e, "stderr", ""):
+                break
+    print(f"WP-CLI ei ollut saatavilla tai plugin asennus epäonnistui: {'; '.join(virheet)}")
+    raportti.insert(0, f"Plugin-asennus epäonnistui osittain tai kokonaan (voi vaatia manuaalisen asennuksen): {'; '.join(virheet)}")
+    return " ".join(raportti)
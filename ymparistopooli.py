@@ -0,0 +1,233 @@
+# ymparistopooli.py
+# Pooli valmiiksi käynnistettyjä WordPress-ympäristöjä.
+# wp_luo_ymparisto lunastaa poolista ympäristön, jonka imaget on jo haettu, MySQL
+# alustettu ja WordPress-tiedostot kopioitu volyymiin. Lunastus siirtää hakemiston
+# uudelle nimelle ja portille; taustatehtävä täydentää poolin takaisin tavoitekokoon.
+#
+# Asetukset: WP_POOL_SIZE (0 = pois päältä), WP_POOL_READY_TIMEOUT, WP_POOL_REPLENISH_INTERVAL
+
+import os
+import json
+import time
+import shutil
+import asyncio
+import secrets
+from collections import deque, namedtuple
+from komennot import aja_komento
+import docker_api
+from compose_pohjat import wordpress_compose, volyymi_nimet, lue_meta, kirjoita_db_env
+from wp_pluginit import valmistele_hakemistot
+import jaettu_tietokanta
+
+POOL_SIZE = int(os.getenv("WP_POOL_SIZE", "0"))
+POOL_DIR = os.path.join(os.getenv("DOCKER_ENV_DIR", "./environments"), ".pool")
+POOL_READY_TIMEOUT = float(os.getenv("WP_POOL_READY_TIMEOUT", "300"))
+POOL_REPLENISH_INTERVAL = float(os.getenv("WP_POOL_REPLENISH_INTERVAL", "60"))
+
+# Merkkitiedostot poolin hakemistoissa
+VALMIS = ".valmis"
+VARATTU = ".varattu"
+
+PooliYmparisto = namedtuple("PooliYmparisto", ["polku", "volyymi_prefix", "jaettu_db"])
+
+
+class Ymparistopooli:
+    """Lunastettavat, valmiiksi käynnistetyt ympäristöt ja niiden täydentäjä."""
+
+    def __init__(self, koko: int = POOL_SIZE, hakemisto: str = POOL_DIR):
+        self.koko = koko
+        self.hakemisto = hakemisto
+        self._kesken = 0
+        self._tehtava = None
+        self._herate = None
+        # Mittarit
+        self.osumat = 0
+        self.ohitukset = 0
+        self.lunastusajat = deque(maxlen=500)
+
+    def valmiit(self) -> list:
+        """Lunastettavissa olevat poolin hakemistot vanhimmasta uusimpaan."""
+        if not os.path.isdir(self.hakemisto):
+            return []
+        polut = [os.path.join(self.hakemisto, d) for d in os.listdir(self.hakemisto)]
+        polut = [p for p in polut if os.path.exists(os.path.join(p, VALMIS))]
+        return sorted(polut, key=lambda p: os.path.getmtime(os.path.join(p, VALMIS)))
+
+    def kaynnista(self):
+        """Käynnistä täydentäjä taustalle (idempotentti, ei mitään jos pooli on pois päältä)."""
+        if self.koko <= 0:
+            return
+        if self._tehtava is None or self._tehtava.done():
+            self._herate = asyncio.Event()
+            self._tehtava = asyncio.get_running_loop().create_task(self._taydenna_jatkuvasti())
+
+    async def pysayta(self):
+        if self._tehtava is not None:
+            self._tehtava.cancel()
+            try:
+                await self._tehtava
+            except asyncio.CancelledError:
+                pass
+            self._tehtava = None
+
+    def _heratys(self):
+        if self._herate is not None:
+            self._herate.set()
+
+    async def _taydenna_jatkuvasti(self):
+        self._siivoa_keskeneraiset()
+        while True:
+            try:
+                await self.taydenna()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Varoitus: poolin täydennys epäonnistui: {e}")
+            try:
+                await asyncio.wait_for(self._herate.wait(), timeout=POOL_REPLENISH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._herate.clear()
+
+    def _siivoa_keskeneraiset(self):
+        """Edellisen prosessin kesken jääneet (ei valmis- tai varattu-merkkiä) poistetaan taustalla."""
+        if not os.path.isdir(self.hakemisto):
+            return
+        for d in os.listdir(self.hakemisto):
+            polku = os.path.join(self.hakemisto, d)
+            if not any(os.path.exists(os.path.join(polku, m)) for m in (VALMIS, VARATTU)):
+                asyncio.get_running_loop().create_task(self._poista(polku))
+
+    async def taydenna(self):
+        """Luo puuttuvat ympäristöt rinnakkain, kunnes valmiita + keskeneräisiä on tavoitekoko."""
+        puuttuu = self.koko - len(self.valmiit()) - self._kesken
+        if puuttuu > 0:
+            await asyncio.gather(*(self._luo_yksi() for _ in range(puuttuu)))
+
+    async def _luo_yksi(self):
+        self._kesken += 1
+        nimi = f"pool_{secrets.token_hex(4)}"
+        polku = os.path.join(self.hakemisto, nimi)
+        try:
+            os.makedirs(polku)
+            valmistele_hakemistot()
+            jaettu_db = None
+            if jaettu_tietokanta.SHARED_DB:
+                jaettu_db = await jaettu_tietokanta.luo_tietokanta(nimi)
+                with open(os.path.join(polku, "meta.json"), "w") as mf:
+                    json.dump({"shared_db": jaettu_tietokanta.ilman_salasanaa(jaettu_db)}, mf)
+            kirjoita_db_env(polku, jaettu_db)
+            with open(os.path.join(polku, "docker-compose.yml"), "w") as f:
+                f.write(wordpress_compose(None, volyymi_prefix=nimi, jaettu_db=jaettu_db))
+            await aja_komento(["docker", "compose", "-f", "docker-compose.yml", "up", "-d"], cwd=polku)
+            await self._odota_valmis(polku, oma_db=jaettu_db is None)
+            open(os.path.join(polku, VALMIS), "w").close()
+            print(f"Pooli: ympäristö {nimi} valmiina ({len(self.valmiit())}/{self.koko}).")
+        except asyncio.CancelledError:
+            await self._poista(polku)
+            raise
+        except Exception as e:
+            print(f"Varoitus: poolin ympäristön {nimi} luonti epäonnistui: {e}")
+            await self._poista(polku)
+        finally:
+            self._kesken -= 1
+
+    async def _odota_valmis(self, polku, oma_db=True):
+        """Odota, että MySQL vastaa ja WordPress-tiedostot on kopioitu volyymiin."""
+        tarkistukset = [("wordpress", ["test", "-f", "/var/www/html/wp-config.php"])]
+        if oma_db:
+            tarkistukset.insert(0, ("db", ["mysqladmin", "ping", "-h", "127.0.0.1", "-uwordpress", "-pwordpress", "--silent"]))
+        raja = time.monotonic() + POOL_READY_TIMEOUT
+        for palvelu, cmd in tarkistukset:
+            while True:
+                try:
+                    await docker_api.suorita(polku, palvelu, cmd, aikaraja=30)
+                    break
+                except Exception:
+                    if time.monotonic() > raja:
+                        raise TimeoutError(f"ympäristö ei valmistunut {POOL_READY_TIMEOUT:g} sekunnissa")
+                    await asyncio.sleep(2)
+
+    async def _poista(self, polku):
+        try:
+            await aja_komento(["docker", "compose", "-f", "docker-compose.yml", "down", "-v"], cwd=polku)
+        except Exception as e:
+            print(f"Varoitus: poolin ympäristön alasajo epäonnistui ({polku}): {e}")
+        jaettu_db = lue_meta(polku).get("shared_db")
+        if jaettu_db:
+            try:
+                await jaettu_tietokanta.poista_tietokanta(jaettu_db)
+            except Exception as e:
+                print(f"Varoitus: poolin tietokannan poisto epäonnistui ({polku}): {e}")
+        shutil.rmtree(polku, ignore_errors=True)
+
+    async def lunasta(self):
+        """Ota valmis ympäristö käyttöön. Palauttaa PooliYmparisto(polku, volyymi_prefix, jaettu_db) tai None (ohitus).
+
+        Poolin kontit ajetaan alas (volyymit säilyvät), jotta kutsuja voi siirtää
+        hakemiston uudelle nimelle ja käynnistää sen uudella portilla.
+        """
+        if self.koko <= 0:
+            return None
+        alku = time.monotonic()
+        try:
+            for polku in self.valmiit():
+                # Merkin uudelleennimeäminen on atomista: sama ympäristö ei lunastu kahdesti
+                try:
+                    os.rename(os.path.join(polku, VALMIS), os.path.join(polku, VARATTU))
+                except FileNotFoundError:
+                    continue
+                try:
+                    await aja_komento(["docker", "compose", "-f", "docker-compose.yml", "down"], cwd=polku)
+                except Exception as e:
+                    print(f"Varoitus: poolin ympäristön lunastus epäonnistui ({polku}): {e}")
+                    await self._poista(polku)
+                    continue
+                os.remove(os.path.join(polku, VARATTU))
+                self.osumat += 1
+                self.lunastusajat.append(time.monotonic() - alku)
+                return PooliYmparisto(polku, os.path.basename(polku), lue_meta(polku).get("shared_db"))
+            self.ohitukset += 1
+            return None
+        finally:
+            self._heratys()
+
+    async def hylkaa(self, ymparisto, polku=None):
+        """Lunastettu ympäristö jäi käyttämättä (luonti epäonnistui): volyymit, jaettu tietokanta ja hakemisto pois.
+
+        `polku` on hakemiston nykyinen sijainti, jos kutsuja ehti siirtää sen. Pooli täydentyy taustalla.
+        """
+        try:
+            await aja_komento(["docker", "volume", "rm", "-f", *volyymi_nimet(ymparisto.volyymi_prefix).values()])
+        except Exception as e:
+            print(f"Varoitus: poolin volyymien {ymparisto.volyymi_prefix}_* poisto epäonnistui: {e}")
+        if ymparisto.jaettu_db:
+            try:
+                await jaettu_tietokanta.poista_tietokanta(ymparisto.jaettu_db)
+            except Exception as e:
+                print(f"Varoitus: poolin tietokannan poisto epäonnistui ({ymparisto.polku}): {e}")
+        shutil.rmtree(polku or ymparisto.polku, ignore_errors=True)
+        self._heratys()
+
+    def kirjaa_lunastusaika(self, sekunnit: float):
+        """Korvaa viimeisin lunastusaika koko luontiajalla (lunastus + käynnistys uudella portilla)."""
+        if self.lunastusajat:
+            self.lunastusajat[-1] = sekunnit
+
+    def tilastot(self) -> dict:
+        ajat = sorted(self.lunastusajat)
+        yhteensa = self.osumat + self.ohitukset
+        return {
+            "koko": self.koko,
+            "valmiina": len(self.valmiit()),
+            "kesken": self._kesken,
+            "osumat": self.osumat,
+            "ohitukset": self.ohitukset,
+            "osumaprosentti": round(100.0 * self.osumat / yhteensa, 1) if yhteensa else None,
+            "lunastus_p50_s": round(ajat[len(ajat) // 2], 3) if ajat else None,
+            "lunastus_max_s": round(ajat[-1], 3) if ajat else None,
+        }
+
+
+# Prosessin yhteinen pooli
+pooli = Ymparistopooli()